@@ -0,0 +1,174 @@
+"""
+Congestion-driven video quality adaptation.
+
+Each peer gets an AdaptationController fed with the loss fraction from RTCP
+receiver reports and, where one is available, a REMB bandwidth estimate. It walks a
+fixed quality ladder one decision at a time: it steps down quickly when
+the link is lossy or the estimate falls below the current bitrate, and
+steps back up only after the link has been clean for a while. Separate
+thresholds and hold times in each direction keep it from oscillating.
+
+Run this file directly to replay a simulated lossy link through a
+controller and print its decisions.
+"""
+import asyncio
+import logging
+import time
+from collections import deque, namedtuple
+
+QualityStep = namedtuple("QualityStep", "width height fps bitrate")
+
+# Highest quality first
+QUALITY_LADDER = (
+    QualityStep(1280, 720, 30, 2_500_000),
+    QualityStep(960, 540, 30, 1_500_000),
+    QualityStep(640, 480, 30, 1_000_000),
+    QualityStep(640, 480, 20, 700_000),
+    QualityStep(480, 360, 15, 400_000),
+    QualityStep(320, 240, 10, 200_000),
+)
+
+DEGRADE_LOSS = 0.08       # Smoothed loss fraction above which we step down
+UPGRADE_LOSS = 0.02       # Smoothed loss fraction below which we may step up
+DEGRADE_REPORTS = 2       # Consecutive bad reports before stepping down
+UPGRADE_REPORTS = 8       # Consecutive good reports before stepping up
+DEGRADE_HOLD = 1.0        # Seconds after any change before stepping down again
+UPGRADE_HOLD = 8.0        # Seconds after any change before stepping up again
+REMB_HEADROOM = 1.25      # The estimate must exceed the next step's bitrate by this factor
+LOSS_SMOOTHING = 0.3      # EWMA weight of the newest loss report
+STATS_INTERVAL = 1.0      # Seconds between getStats() polls; browsers send a receiver report about once a second
+
+
+def step_index(ladder, width, height, fps):
+    """Index of the first ladder step at or below the given capture format."""
+    for i, step in enumerate(ladder):
+        if step.width <= width and step.height <= height and step.fps <= fps:
+            return i
+    return len(ladder) - 1
+
+
+class AdaptationController:
+    """
+    Decides the quality step for one peer. observe() takes whatever the
+    latest RTCP carried (loss, REMB, or both) and returns the new
+    QualityStep when it changes, else None. on_change, if given, is called
+    with each new step. Decisions are kept in `decisions` for inspection.
+    """
+
+    def __init__(self, ladder=QUALITY_LADDER, start_index=0, on_change=None, clock=time.monotonic):
+        self.ladder = ladder
+        self.index = start_index
+        self.on_change = on_change
+        self.clock = clock
+        self.loss = 0.0
+        self.remb = None
+        self.reports = 0
+        self.degrades = 0
+        self.upgrades = 0
+        self.decisions = deque(maxlen=50)
+        self._bad = 0
+        self._good = 0
+        self._changed_at = clock()
+
+    @property
+    def step(self):
+        return self.ladder[self.index]
+
+    def observe(self, loss=None, remb=None):
+        now = self.clock()
+        if loss is not None:
+            self.reports += 1
+            self.loss += (loss - self.loss) * LOSS_SMOOTHING
+        if remb is not None:
+            self.remb = remb
+        step = self.step
+
+        if self.loss > DEGRADE_LOSS or (self.remb is not None and self.remb < step.bitrate):
+            self._bad += 1
+            self._good = 0
+        elif self.loss < UPGRADE_LOSS:
+            self._good += 1
+            self._bad = 0
+        else:
+            self._bad = self._good = 0
+
+        since_change = now - self._changed_at
+        if self._bad >= DEGRADE_REPORTS and since_change >= DEGRADE_HOLD and self.index < len(self.ladder) - 1:
+            target = self.index + 1
+            if self.remb is not None:
+                # Jump straight to a step the estimate can carry.
+                while target < len(self.ladder) - 1 and self.ladder[target].bitrate > self.remb:
+                    target += 1
+            reason = f"loss={self.loss:.3f}" + (f" remb={self.remb}" if self.remb is not None else "")
+            return self._change(target, reason, now)
+        if self._good >= UPGRADE_REPORTS and since_change >= UPGRADE_HOLD and self.index > 0:
+            up = self.ladder[self.index - 1]
+            if self.remb is None or self.remb > up.bitrate * REMB_HEADROOM:
+                reason = f"loss={self.loss:.3f}" + (f" remb={self.remb}" if self.remb is not None else "")
+                return self._change(self.index - 1, reason, now)
+        return None
+
+    def _change(self, index, reason, now):
+        previous = self.step
+        if index > self.index:
+            self.degrades += 1
+        else:
+            self.upgrades += 1
+        self.index = index
+        self._bad = self._good = 0
+        self._changed_at = now
+        step = self.step
+        self.decisions.append({"time": now, "from": previous, "to": step, "reason": reason})
+        logging.info(f"Video quality {previous.width}x{previous.height}@{previous.fps} -> "
+                     f"{step.width}x{step.height}@{step.fps}, {step.bitrate // 1000} kbps ({reason})")
+        if self.on_change is not None:
+            self.on_change(step)
+        return step
+
+
+async def poll_feedback(sender, controller, is_active, interval=STATS_INTERVAL):
+    """
+    Feeds the loss the browser reports in RTCP receiver reports into the
+    controller while is_active() holds. aiortc publishes the latest report
+    about an RTCRtpSender's stream as its "remote-inbound-rtp" stats; each
+    report is observed once, when its timestamp first changes. aiortc does
+    not expose REMB, so the controller runs on loss alone here (in raw mode
+    aiortc applies REMB to its own encoder's bitrate itself).
+    """
+    last_report = None
+    while is_active():
+        report = await sender.getStats()
+        for stats in report.values():
+            if stats.type == "remote-inbound-rtp" and stats.timestamp != last_report:
+                last_report = stats.timestamp
+                controller.observe(loss=stats.fractionLost / 256)
+        await asyncio.sleep(interval)
+
+
+def simulate(link, ladder=QUALITY_LADDER, report_interval=1.0):
+    """
+    Replays `link`, a sequence of (seconds, loss_fraction, remb_bps or None)
+    segments, through a controller with one RTCP report per
+    report_interval. Returns the controller.
+    """
+    now = [0.0]
+    controller = AdaptationController(ladder, clock=lambda: now[0])
+    for seconds, loss, remb in link:
+        end = now[0] + seconds
+        while now[0] < end:
+            controller.observe(loss=loss, remb=remb)
+            now[0] += report_interval
+    return controller
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    # 640x480@30 capture: clean link, a Wi-Fi fade with heavy loss and a
+    # falling estimate, then recovery.
+    controller = simulate([
+        (10, 0.0, 3_000_000),
+        (6, 0.15, 900_000),
+        (6, 0.30, 350_000),
+        (40, 0.01, 3_000_000),
+    ], ladder=QUALITY_LADDER[step_index(QUALITY_LADDER, 640, 480, 30):])
+    print(f"{controller.degrades} step(s) down, {controller.upgrades} step(s) up, final {controller.step}")
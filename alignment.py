@@ -0,0 +1,92 @@
+import threading
+from collections import deque
+
+GPS_MAX_AGE_NS = 1_000_000_000  # A fix older than this (relative to the IMU sample) is stale
+
+
+class SampleHistory:
+    """
+    Short, time-ordered history of samples from one source, keyed by
+    time.monotonic_ns() at receipt. Writers and readers may be on
+    different threads.
+    """
+
+    def __init__(self, maxlen=32):
+        self._lock = threading.Lock()
+        self._samples = deque(maxlen=maxlen)
+
+    def append(self, t_ns, sample):
+        with self._lock:
+            if self._samples and t_ns < self._samples[-1][0]:
+                return  # Out-of-order; keep the history sorted
+            self._samples.append((t_ns, sample))
+
+    def latest(self):
+        with self._lock:
+            return self._samples[-1] if self._samples else (None, None)
+
+    def __len__(self):
+        return len(self._samples)
+
+    def at(self, t_ns, fields, max_age_ns):
+        """
+        Returns (sample, age_ns) for time t_ns. Numeric `fields` are linearly
+        interpolated when t_ns falls between two samples; otherwise the
+        nearest sample is used as-is. age_ns is the distance to the nearest
+        real sample. Returns (None, None) if that is more than max_age_ns.
+        """
+        with self._lock:
+            samples = list(self._samples)
+        if not samples:
+            return None, None
+
+        after = None
+        for t, sample in reversed(samples):
+            if t <= t_ns:
+                before = (t, sample)
+                break
+            after = (t, sample)
+        else:
+            before = None
+
+        if before is not None and after is not None:
+            t0, s0 = before
+            t1, s1 = after
+            age = min(t_ns - t0, t1 - t_ns)
+            if age > max_age_ns:
+                return None, None
+            w = (t_ns - t0) / (t1 - t0)
+            sample = dict(s0)
+            for key in fields:
+                sample[key] = s0[key] + (s1[key] - s0[key]) * w
+            return sample, age
+
+        t, sample = before if before is not None else after
+        age = abs(t_ns - t)
+        if age > max_age_ns:
+            return None, None
+        return sample, age
+
+    def estimate(self, t_ns, fields, max_age_ns):
+        """
+        Like at(), but for the live case where t_ns is newer than every
+        sample: numeric `fields` are extrapolated along the line through the
+        last two samples instead of repeating the newest one. Returns
+        (sample, age_ns, extrapolated); falls back to at() when there is
+        nothing to extrapolate from or the two samples are too far apart.
+        """
+        with self._lock:
+            last_two = list(self._samples)[-2:]
+        if len(last_two) == 2 and t_ns > last_two[1][0]:
+            (t0, s0), (t1, s1) = last_two
+            age = t_ns - t1
+            if age > max_age_ns:
+                return None, None, False
+            if t1 - t0 <= max_age_ns:
+                w = (t_ns - t0) / (t1 - t0)
+                sample = dict(s1)
+                for key in fields:
+                    sample[key] = s0[key] + (s1[key] - s0[key]) * w
+                return sample, age, True
+        sample, age = self.at(t_ns, fields, max_age_ns)
+        return sample, age, False
@@ -0,0 +1,188 @@
+"""
+In-memory cache for the handful of static files the dashboard loads.
+
+Each file is read once and compressed once, with gzip and (when the brotli
+module is installed) brotli. A request just picks the smallest encoding
+the browser accepts. ETag and Last-Modified let a reloading dashboard
+revalidate with a 304 instead of downloading the file again. An asset
+that names another (index_html.html loads client_direct.js, which loads
+robot_messages.proto) has that URL rewritten to carry the other file's
+version, "?v=<hash>". A request with the current version is served with
+a year-long immutable Cache-Control, so the browser does not even ask.
+
+With check_mtime on, a file edited on disk is picked up within
+MTIME_CHECK_INTERVAL, and so are the assets that link to it.
+"""
+import gzip
+import hashlib
+import logging
+import os
+import time
+from email.utils import formatdate, parsedate_to_datetime
+from aiohttp import web
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+MIN_COMPRESS_BYTES = 256  # Smaller bodies are not worth a Content-Encoding
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600  # Seconds a versioned URL may be cached
+MTIME_CHECK_INTERVAL = 1.0  # Seconds between stat() calls per asset when checking for edits
+
+
+def _accepted_encodings(header):
+    """Content codings an Accept-Encoding header allows (q > 0)."""
+    accepted = set()
+    for item in header.split(","):
+        coding, _, params = item.strip().partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if coding and q > 0:
+            accepted.add(coding.lower())
+    return accepted
+
+
+class Asset:
+    """One file as served: its body in every encoding worth keeping, plus validators."""
+
+    def __init__(self, name, path, content_type, body, mtime, dependencies):
+        self.name = name
+        self.path = path
+        self.content_type = content_type
+        self.mtime = mtime
+        self.file_mtime = mtime  # Of the file alone; mtime also covers what it links to
+        self.dependencies = dependencies  # name -> version this body links to
+        self.version = hashlib.sha1(body).hexdigest()[:16]
+        self.last_modified = formatdate(mtime, usegmt=True)
+        self.checked_at = time.monotonic()
+        self.bodies = {"identity": body}
+        if len(body) >= MIN_COMPRESS_BYTES:
+            self.bodies["gzip"] = gzip.compress(body, 9, mtime=0)
+            if brotli is not None:
+                self.bodies["br"] = brotli.compress(body, quality=11)
+        for encoding in [e for e in self.bodies if len(self.bodies[e]) >= len(body) and e != "identity"]:
+            del self.bodies[encoding]
+
+    def etag(self, encoding):
+        # Each encoding is a different representation, so it gets its own tag.
+        suffix = "" if encoding == "identity" else "-" + encoding
+        return f'"{self.version}{suffix}"'
+
+    def choose_encoding(self, accept_encoding):
+        accepted = _accepted_encodings(accept_encoding)
+        for encoding in ("br", "gzip"):
+            if encoding in accepted and encoding in self.bodies:
+                return encoding
+        return "identity"
+
+    def not_modified(self, request):
+        if_none_match = request.headers.get("If-None-Match")
+        if if_none_match is not None:
+            for tag in if_none_match.split(","):
+                tag = tag.strip()
+                if tag == "*":
+                    return True
+                if tag.startswith("W/"):
+                    tag = tag[2:]
+                if tag.strip('"').split("-")[0] == self.version:
+                    return True
+            return False
+        if_modified_since = request.headers.get("If-Modified-Since")
+        if if_modified_since is not None:
+            try:
+                return int(self.mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
+
+
+class AssetCache:
+    """
+    Named files under `root`, each served at a URL path. add() loads (and
+    compresses) a file right away; response() answers a request for it.
+    """
+
+    def __init__(self, root, check_mtime=True):
+        self.root = root
+        self.check_mtime = check_mtime
+        self._specs = {}
+        self._assets = {}
+
+    def add(self, name, path, content_type, depends=()):
+        """
+        Caches the file `name`, served at `path`. Every quoted occurrence of
+        a `depends` asset's path in it becomes that asset's versioned URL.
+        """
+        self._specs[name] = (path, content_type, tuple(depends))
+        self._assets[name] = self._load(name)
+        asset = self._assets[name]
+        sizes = ", ".join(f"{encoding}={len(body)}" for encoding, body in asset.bodies.items())
+        logging.info(f"Cached asset {name} ({sizes} bytes)")
+
+    def _load(self, name):
+        path, content_type, depends = self._specs[name]
+        filename = os.path.join(self.root, name)
+        file_mtime = mtime = os.stat(filename).st_mtime
+        with open(filename, "rb") as f:
+            body = f.read()
+        dependencies = {}
+        for dependency in depends:
+            linked = self.get(dependency)
+            body = body.replace(f'"{linked.path}"'.encode(), f'"{self.url(dependency)}"'.encode())
+            dependencies[dependency] = linked.version
+            mtime = max(mtime, linked.mtime)  # The body changes when what it links to does
+        asset = Asset(name, path, content_type, body, mtime, dependencies)
+        asset.file_mtime = file_mtime
+        return asset
+
+    def get(self, name):
+        """The current Asset; with check_mtime, reloaded if it or anything it links to changed."""
+        asset = self._assets[name]
+        if not self.check_mtime:
+            return asset
+        now = time.monotonic()
+        stale = any(self.get(dependency).version != version for dependency, version in asset.dependencies.items())
+        if not stale and now - asset.checked_at >= MTIME_CHECK_INTERVAL:
+            asset.checked_at = now
+            try:
+                stale = os.stat(os.path.join(self.root, name)).st_mtime != asset.file_mtime
+            except OSError:
+                pass  # Mid-save; keep serving what we have
+        if stale:
+            try:
+                asset = self._assets[name] = self._load(name)
+                logging.info(f"Reloaded asset {name} (version {asset.version})")
+            except OSError as e:
+                logging.warning(f"Could not reload asset {name}: {e}")
+        return asset
+
+    def url(self, name):
+        asset = self.get(name)
+        return f"{asset.path}?v={asset.version}"
+
+    def response(self, request, name):
+        asset = self.get(name)
+        encoding = asset.choose_encoding(request.headers.get("Accept-Encoding", ""))
+        if request.query.get("v") == asset.version:
+            cache_control = f"public, max-age={IMMUTABLE_MAX_AGE}, immutable"
+        else:
+            cache_control = "no-cache"  # Always revalidate; a 304 costs a few hundred bytes
+        headers = {
+            "ETag": asset.etag(encoding),
+            "Last-Modified": asset.last_modified,
+            "Cache-Control": cache_control,
+            "Vary": "Accept-Encoding",
+        }
+        if asset.not_modified(request):
+            return web.Response(status=304, headers=headers)
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        return web.Response(body=asset.bodies[encoding], content_type=asset.content_type,
+                            charset="utf-8", headers=headers)
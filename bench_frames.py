@@ -0,0 +1,92 @@
+"""
+Benchmarks the capture -> VideoFrame path per frame.
+
+  python bench_frames.py                 # synthetic capture, 640x480
+  python bench_frames.py --size 1280x720
+  python bench_frames.py --camera        # real libcamera pipeline (on the Pi)
+
+"allocating" is the old path: cap.read() returns a fresh array and
+VideoFrame.from_ndarray() builds a new frame from it. "pooled" reads into
+FramePool buffers and copies into one of two reused VideoFrames. Reports
+time per frame and the peak NumPy memory allocated in steady state
+(tracemalloc; a pooled path that allocates nothing reports ~0).
+"""
+import argparse
+import time
+import tracemalloc
+import numpy as np
+from av import VideoFrame
+from camera import CAMERA_PIPELINE, FramePool, copy_nv12
+
+
+class SyntheticCapture:
+    """Mimics cv2.VideoCapture.read(): fills `image` if given, else allocates."""
+
+    def __init__(self, width, height):
+        self.frame = np.random.randint(0, 256, (height * 3 // 2, width), dtype=np.uint8)
+
+    def read(self, image=None):
+        if image is None:
+            return True, self.frame.copy()
+        np.copyto(image, self.frame)
+        return True, image
+
+
+def allocating(cap):
+    def step():
+        _, image = cap.read()
+        VideoFrame.from_ndarray(image, format="nv12")
+    return step
+
+
+def pooled(cap):
+    _, first = cap.read()
+    pool = FramePool(first.shape, first.dtype)
+    height, width = first.shape[0] * 2 // 3, first.shape[1]
+    video_frames = [VideoFrame(width, height, "nv12"), VideoFrame(width, height, "nv12")]
+
+    def step():
+        buffer = pool.acquire()
+        cap.read(image=buffer.array)
+        video_frames.reverse()
+        copy_nv12(buffer.array, video_frames[0])
+        buffer.release()
+    return step
+
+
+def measure(name, make_step, cap, frames):
+    step = make_step(cap)
+    for _ in range(10):  # Warm up outside the measurement
+        step()
+    tracemalloc.start()
+    start = time.perf_counter()
+    for _ in range(frames):
+        step()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:>10}: {elapsed / frames * 1000:.3f} ms/frame, peak NumPy allocation {peak / 1024:.0f} KiB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", default="640x480", help="WIDTHxHEIGHT for the synthetic capture")
+    parser.add_argument("--frames", type=int, default=500)
+    parser.add_argument("--camera", action="store_true", help="read from the libcamera pipeline instead")
+    args = parser.parse_args()
+
+    if args.camera:
+        import cv2
+        cap = cv2.VideoCapture(CAMERA_PIPELINE, cv2.CAP_GSTREAMER)
+        if not cap.isOpened():
+            raise SystemExit("Camera failed to open.")
+    else:
+        width, height = (int(v) for v in args.size.split("x"))
+        cap = SyntheticCapture(width, height)
+
+    measure("allocating", allocating, cap, args.frames)
+    measure("pooled", pooled, cap, args.frames)
+
+
+if __name__ == "__main__":
+    main()
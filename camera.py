@@ -0,0 +1,529 @@
+import asyncio
+import logging
+import threading
+import time
+from fractions import Fraction
+from aiortc.contrib.media import MediaStreamTrack, MediaStreamError
+from av import VideoFrame
+import cv2
+import numpy as np
+from tracing import LatencyHistogram
+from logutil import AggregatedLog
+
+CAPTURE_WIDTH = 640
+CAPTURE_HEIGHT = 480
+CAPTURE_FPS = 30
+CAMERA_PIPELINE = (f"libcamerasrc ! video/x-raw,format=NV12,width={CAPTURE_WIDTH},height={CAPTURE_HEIGHT},"
+                   f"framerate={CAPTURE_FPS}/1 ! appsink drop=true")
+FRAME_TIMEOUT = 1.0  # Seconds recv() waits for a capture before falling back to a black frame
+FRAME_POOL_SIZE = 4  # Capture buffers preallocated up front; the pool grows if peers hold more
+READ_FAILURE_LIMIT = 30  # Consecutive failed reads before the camera is closed and reopened
+REOPEN_BACKOFF_MIN = 0.5  # Seconds; doubles after each failed reopen
+REOPEN_BACKOFF_MAX = 30.0
+STOP_TIMEOUT = 1.0  # Seconds stop() waits for the capture thread by default
+VIDEO_CLOCK_RATE = 90000
+JITTER_SMOOTHING = 1 / 16  # RFC 3550 jitter gain
+PLACEHOLDER_TEXT = "CAMERA OFFLINE - RECONNECTING"  # Drawn on the placeholder frame; empty for plain black
+
+
+class PooledFrame:
+    """A reusable capture buffer. It returns to its pool when the last holder releases it."""
+    __slots__ = ("array", "captured_ns", "_pool", "_refs")
+
+    def __init__(self, pool, array):
+        self.array = array
+        self.captured_ns = 0  # time.monotonic_ns() when the capture completed
+        self._pool = pool
+        self._refs = 0
+
+    def retain(self, count=1):
+        with self._pool._lock:
+            self._refs += count
+
+    def release(self):
+        self._pool._release(self)
+
+
+class FramePool:
+    """
+    Fixed-shape capture buffers recycled between the reader thread and the
+    relay tracks, so steady-state capture allocates nothing. Each buffer is
+    reference counted: one reference per mailbox it was delivered to, plus
+    one while it is the source's latest frame.
+    """
+
+    def __init__(self, shape, dtype=np.uint8, size=FRAME_POOL_SIZE):
+        self.shape = shape
+        self.dtype = dtype
+        self._lock = threading.Lock()
+        self._free = [PooledFrame(self, np.empty(shape, dtype)) for _ in range(size)]
+        self.allocations = size
+
+    def acquire(self):
+        """Returns a free buffer holding one reference, allocating only if none is free."""
+        with self._lock:
+            pooled = self._free.pop() if self._free else None
+        if pooled is None:
+            pooled = PooledFrame(self, np.empty(self.shape, self.dtype))
+            self.allocations += 1
+        pooled._refs = 1
+        return pooled
+
+    def _release(self, pooled):
+        with self._lock:
+            pooled._refs -= 1
+            if pooled._refs == 0:
+                self._free.append(pooled)
+
+
+def copy_nv12(src, frame):
+    """
+    Copies an OpenCV NV12 image (height * 3/2 rows of width bytes) into the
+    planes of an existing nv12 VideoFrame, honouring libav's line padding.
+    One memcpy per plane and no allocation.
+    """
+    height = frame.height
+    for plane, rows in ((frame.planes[0], src[:height]), (frame.planes[1], src[height:])):
+        dst = np.frombuffer(plane, np.uint8).reshape(-1, plane.line_size)
+        np.copyto(dst[:rows.shape[0], :rows.shape[1]], rows)
+
+
+class FrameMailbox:
+    """
+    Single-slot handoff from a capture thread to an asyncio consumer.
+    A newer frame overwrites an unread one, and the overwrite is counted
+    as a drop so the consumer knows how many captures it skipped.
+    There is one consumer at a time: a get() replaces any earlier one
+    still waiting, which returns as if it had timed out.
+    """
+
+    def __init__(self, on_discard=None):
+        self._lock = threading.Lock()
+        self._on_discard = on_discard
+        self._item = None
+        self._dropped = 0
+        self._waiter = None
+        self._closed = False
+
+    def put(self, item):
+        """
+        Called from the capture thread. Never blocks. An item that is never
+        handed to the consumer is passed to on_discard.
+        """
+        with self._lock:
+            if self._closed:
+                discarded, waiter = item, None
+            else:
+                discarded = self._item
+                if discarded is not None:
+                    self._dropped += 1
+                self._item = item
+                waiter, self._waiter = self._waiter, None
+        if discarded is not None and self._on_discard is not None:
+            self._on_discard(discarded)
+        if waiter is not None:
+            waiter.get_loop().call_soon_threadsafe(self._wake, waiter)
+
+    def close(self):
+        """Wakes any pending get() so it can observe the closed state."""
+        with self._lock:
+            self._closed = True
+            discarded, self._item = self._item, None
+            waiter, self._waiter = self._waiter, None
+        if discarded is not None and self._on_discard is not None:
+            self._on_discard(discarded)
+        if waiter is not None:
+            waiter.get_loop().call_soon_threadsafe(self._wake, waiter)
+
+    @property
+    def closed(self):
+        return self._closed
+
+    @staticmethod
+    def _wake(waiter, delivered=True):
+        if not waiter.done():
+            waiter.set_result(delivered)
+
+    async def get(self, timeout=None):
+        """
+        Returns (item, dropped) as soon as a new item is available.
+        Returns (None, 0) on timeout, once the mailbox is closed, or when a
+        newer get() takes over.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        while True:
+            with self._lock:
+                if self._item is not None:
+                    item, dropped = self._item, self._dropped
+                    self._item = None
+                    self._dropped = 0
+                    return item, dropped
+                if self._closed:
+                    return None, 0
+                previous, waiter = self._waiter, loop.create_future()
+                self._waiter = waiter
+            if previous is not None:
+                self._wake(previous, delivered=False)
+            remaining = None if deadline is None else deadline - loop.time()
+            if remaining is not None and remaining <= 0:
+                return None, 0
+            try:
+                if not await asyncio.wait_for(waiter, remaining):
+                    return None, 0
+            except asyncio.TimeoutError:
+                return None, 0
+
+
+class PiCameraSource:
+    """
+    Process-wide camera capture fanned out to any number of relay tracks.
+    The libcamera pipeline is opened when the first track subscribes and
+    released when the last one stops, so N viewers share one capture.
+    After warm() it is opened immediately and kept open with no
+    subscribers, so a new viewer skips the open and health check.
+    """
+
+    def __init__(self, pipeline=CAMERA_PIPELINE, width=CAPTURE_WIDTH, height=CAPTURE_HEIGHT, fps=CAPTURE_FPS):
+        self.pipeline = pipeline
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.cap = None
+        self.pool = None
+        self._lock = threading.Lock()
+        self._subscribers = ()
+        self._latest = None
+        self._is_stopped = threading.Event()
+        self._thread = None
+        self._placeholders = {}
+        self.keep_warm = False
+        self.is_healthy = False
+        self.frames_captured = 0
+        self.reopen_attempts = 0
+        self.failures = 0
+        self._last_capture_ns = 0
+        self.interval_jitter = 0.0
+        self.interval_histogram = LatencyHistogram()
+
+    @property
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+    def subscribe(self):
+        """Returns a new relay track; starts the capture for the first subscriber."""
+        track = RobustPiCameraTrack(self)
+        with self._lock:
+            self._subscribers = self._subscribers + (track._mailbox,)
+            first = len(self._subscribers) == 1
+            latest = self._latest
+            if latest is not None:
+                latest.retain()  # Handed to the new mailbox below
+        if latest is not None:
+            # New subscribers of a running capture get its most recent frame right away.
+            track._mailbox.put(latest)
+        if first:
+            self.start()
+        logging.info(f"ROBUST: Camera subscriber added ({self.subscriber_count} active).")
+        return track
+
+    def unsubscribe(self, track):
+        """Detaches a relay track; stops the capture once nobody is left."""
+        with self._lock:
+            if track._mailbox not in self._subscribers:
+                return
+            self._subscribers = tuple(m for m in self._subscribers if m is not track._mailbox)
+            last = not self._subscribers
+        logging.info(f"ROBUST: Camera subscriber removed ({self.subscriber_count} active).")
+        if last and not self.keep_warm:
+            self.stop(timeout=0)
+
+    def warm(self):
+        """Opens the capture now and keeps it running between viewers."""
+        self.keep_warm = True
+        self.start()
+
+    def start(self):
+        """
+        Starts the capture thread, which opens the camera and keeps it open.
+        A thread that was told to stop but has not exited yet just carries on.
+        """
+        with self._lock:
+            self._is_stopped.clear()
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _open(self):
+        """Opens the pipeline and reads one frame to confirm it works. Returns True on success."""
+        logging.info("ROBUST: Attempting to open camera...")
+        self.reopen_attempts += 1
+        cap = cv2.VideoCapture(self.pipeline, cv2.CAP_GSTREAMER)
+
+        if not cap.isOpened():
+            logging.error("ROBUST: Camera failed to open at cv2.VideoCapture.")
+            return False
+
+        # --- Health Check ---
+        # Try to read the first frame to confirm the pipeline is actually working.
+        ret, frame = cap.read()
+        if not ret or frame is None:
+            logging.error("ROBUST: Health check FAILED. Could not read the first frame.")
+            cap.release()
+            return False
+
+        logging.info("ROBUST: Health check PASSED. First frame read successfully.")
+        self.cap = cap
+        if self.pool is None or self.pool.shape != frame.shape:
+            self.pool = FramePool(frame.shape, frame.dtype)
+        pooled = self.pool.acquire()
+        pooled.captured_ns = time.monotonic_ns()
+        np.copyto(pooled.array, frame)
+        self._publish(pooled)
+        self.is_healthy = True
+        return True
+
+    def _close(self):
+        self.is_healthy = False
+        self._last_capture_ns = 0  # The gap until the reopen is not jitter
+        if self.cap:
+            self.cap.release()
+            self.cap = None
+
+    def _run(self):
+        """
+        Capture thread: opens the camera, reads until it fails, then reopens
+        with exponential backoff for as long as anyone is subscribed. Tracks
+        send the placeholder frame in the meantime.
+        """
+        backoff = REOPEN_BACKOFF_MIN
+        while True:
+            if self._is_stopped.is_set():
+                # Only this thread touches the camera, so it is released here.
+                self._close()
+                with self._lock:
+                    if self._is_stopped.is_set():
+                        self._thread = None
+                        latest, self._latest = self._latest, None
+                        break
+                continue  # start() was called again while stopping
+            if self.cap is None and not self._open():
+                logging.warning(f"ROBUST: Camera unavailable, retrying in {backoff:.1f}s.")
+                self._is_stopped.wait(backoff)
+                backoff = min(backoff * 2, REOPEN_BACKOFF_MAX)
+                continue
+            backoff = REOPEN_BACKOFF_MIN
+            self._read_frames()
+            self._close()
+            if not self._is_stopped.is_set():
+                self.failures += 1
+                logging.error("ROBUST: Camera capture failed; reopening.")
+        if latest is not None:
+            latest.release()
+        logging.info("ROBUST: Capture thread has stopped and released the camera.")
+
+    def _publish(self, pooled):
+        """Delivers a captured buffer; takes over the caller's reference as the latest frame."""
+        self.frames_captured += 1
+        if self._last_capture_ns:
+            # Deviation of the capture interval from the nominal frame period.
+            deviation = abs((pooled.captured_ns - self._last_capture_ns) / 1e9 - 1 / self.fps)
+            self.interval_jitter += (deviation - self.interval_jitter) * JITTER_SMOOTHING
+            self.interval_histogram.observe(deviation)
+        self._last_capture_ns = pooled.captured_ns
+        with self._lock:
+            subscribers = self._subscribers
+            pooled.retain(len(subscribers))
+            previous, self._latest = self._latest, pooled
+        if previous is not None:
+            previous.release()
+        for mailbox in subscribers:
+            mailbox.put(pooled)
+
+    def _read_frames(self):
+        """Reads until stopped or until READ_FAILURE_LIMIT consecutive reads fail."""
+        pool = self.pool
+        failures = 0
+        while not self._is_stopped.is_set() and self.cap.isOpened():
+            pooled = pool.acquire()
+            ret, image = self.cap.read(image=pooled.array)
+            if ret:
+                # appsink drops stale buffers, so read() returns as the frame lands.
+                pooled.captured_ns = time.monotonic_ns()
+                failures = 0
+                if image is not pooled.array:
+                    # OpenCV reallocated (format changed); keep its buffer.
+                    pooled.array = image
+                    pool.allocations += 1
+                self._publish(pooled)
+            else:
+                pooled.release()
+                failures += 1
+                if failures >= READ_FAILURE_LIMIT:
+                    return
+                # Allow a small sleep to prevent busy-looping on error
+                self._is_stopped.wait(0.01)
+
+    def placeholder_image(self, width, height):
+        """
+        The NV12 image sent while the camera is down: black with a status
+        line, rendered once per size.
+        """
+        image = self._placeholders.get((width, height))
+        if image is None:
+            image = np.empty((height * 3 // 2, width), np.uint8)
+            image[:height] = 16    # Video-range black
+            image[height:] = 128   # Neutral chroma
+            if PLACEHOLDER_TEXT:
+                scale = height / 480
+                cv2.putText(image[:height], PLACEHOLDER_TEXT, (int(20 * scale), height // 2),
+                            cv2.FONT_HERSHEY_SIMPLEX, scale, 200, max(int(2 * scale), 1), cv2.LINE_AA)
+            self._placeholders[(width, height)] = image
+        return image
+
+    def stop(self, timeout=STOP_TIMEOUT):
+        """
+        Signals the capture thread to stop; the thread releases the camera on
+        its way out. Waits up to `timeout` seconds for that (0 returns at once,
+        as unsubscribe() does on the event loop).
+        """
+        logging.info("ROBUST: Stopping camera capture...")
+        self._is_stopped.set()
+        thread = self._thread
+        if thread is not None and timeout:
+            thread.join(timeout)
+            if thread.is_alive():
+                logging.warning("ROBUST: Capture thread is still finishing a read; it will release the camera.")
+
+
+class RobustPiCameraTrack(MediaStreamTrack):
+    """
+    Lightweight per-peer video track relaying frames from a shared
+    PiCameraSource. Obtain one with PiCameraSource.subscribe().
+    """
+    kind = "video"
+
+    def __init__(self, source):
+        super().__init__()
+        self.source = source
+        self._mailbox = FrameMailbox(on_discard=PooledFrame.release)
+        self._frames = None  # Two reusable VideoFrames; aiortc encodes one before asking for the next
+        self._next_frame = 0
+        self._pts_origin_ns = None
+        self.pts_clamps = 0
+        self.capture_delay = LatencyHistogram()
+        self.frames_sent = 0
+        self.frames_dropped = 0
+        # aiortc encodes and packetizes a frame before asking for the next
+        # one, so the gap between recv() returning and being called again
+        # is the per-frame encode cost seen from here.
+        self.encode_time = LatencyHistogram()
+        self._returned_at = None
+        self.quality = None
+        self.frames_skipped = 0
+        self._min_interval = 0.0
+        self._last_sent_at = 0.0
+        self._last_pts = -1
+        self._placeholder = None
+        self.placeholders_sent = 0
+        self._placeholder_log = AggregatedLog("camera_placeholder_frames", level=logging.WARNING)
+
+    def set_quality(self, step):
+        """
+        Scales and thins this peer's frames to an adaptation.QualityStep.
+        The shared capture is untouched, so other peers are unaffected.
+        """
+        self.quality = step
+        # A little slack so capture jitter does not halve the frame rate.
+        self._min_interval = 0.9 / step.fps if step.fps < self.source.fps else 0.0
+
+    async def recv(self):
+        """Called by aiortc; returns as soon as the source delivers a new frame."""
+        if self._returned_at is not None:
+            self.encode_time.observe(time.monotonic() - self._returned_at)
+            self._returned_at = None
+        if self._mailbox.closed:
+            raise MediaStreamError
+
+        while True:
+            # While the camera is down, wake at the frame rate to send the
+            # placeholder; the first real frame after a reopen wakes us at once.
+            timeout = FRAME_TIMEOUT if self.source.is_healthy else 1 / self.source.fps
+            pooled, dropped = await self._mailbox.get(timeout=timeout)
+            if self._mailbox.closed:
+                if pooled is not None:
+                    pooled.release()
+                raise MediaStreamError
+            if pooled is None:
+                return self._send_placeholder()
+            if dropped:
+                self.frames_dropped += dropped
+                logging.debug("ROBUST: %d frame(s) dropped since last recv().", dropped)
+            if time.monotonic() - self._last_sent_at >= self._min_interval:
+                break
+            pooled.release()
+            self.frames_skipped += 1
+
+        frame = self._frame_for(pooled.array)
+        copy_nv12(pooled.array, frame)
+        captured_ns = pooled.captured_ns
+        pooled.release()
+        quality = self.quality
+        if quality is not None and quality.width < frame.width:
+            frame = frame.reformat(width=quality.width, height=quality.height)
+
+        self.frames_sent += 1
+        self._last_sent_at = time.monotonic()
+        self.capture_delay.observe((time.monotonic_ns() - captured_ns) / 1e9)
+        return self._stamp(frame, captured_ns)
+
+    def _stamp(self, frame, captured_ns):
+        """
+        Sets the PTS from the monotonic capture time, so frame spacing on
+        the wire matches capture spacing rather than when aiortc happened to
+        pull. Real and placeholder frames share one timeline, and a PTS that
+        would not advance (a late joiner's cached frame, the first real frame
+        after placeholders) is nudged forward.
+        """
+        if self._pts_origin_ns is None:
+            self._pts_origin_ns = captured_ns
+        pts = (captured_ns - self._pts_origin_ns) * VIDEO_CLOCK_RATE // 1_000_000_000
+        if pts <= self._last_pts:
+            pts = self._last_pts + 1
+            self.pts_clamps += 1
+        self._last_pts = pts
+        frame.pts = pts
+        frame.time_base = Fraction(1, VIDEO_CLOCK_RATE)
+        self._returned_at = time.monotonic()
+        return frame
+
+    def _send_placeholder(self):
+        quality = self.quality
+        if quality is not None and quality.width < self.source.width:
+            size = (quality.width, quality.height)
+        else:
+            size = (self.source.width, self.source.height)
+        if self._placeholder is None or self._placeholder[0] != size:
+            image = self.source.placeholder_image(*size)
+            self._placeholder = (size, VideoFrame.from_ndarray(image, format="nv12"))
+        self.placeholders_sent += 1
+        self._placeholder_log.count(camera_healthy=self.source.is_healthy,
+                                    reopen_attempts=self.source.reopen_attempts)
+        return self._stamp(self._placeholder[1], time.monotonic_ns())
+
+    def _frame_for(self, image):
+        """Returns the next of two preallocated nv12 VideoFrames sized for `image`."""
+        height, width = image.shape[0] * 2 // 3, image.shape[1]
+        frames = self._frames
+        if frames is None or frames[0].width != width or frames[0].height != height:
+            frames = self._frames = (VideoFrame(width, height, "nv12"), VideoFrame(width, height, "nv12"))
+        self._next_frame ^= 1
+        return frames[self._next_frame]
+
+    def stop(self):
+        """Detaches this track from the shared source."""
+        if not self._mailbox.closed:
+            self._mailbox.close()
+            self.source.unsubscribe(self)
+        super().stop()
@@ -1,3 +1,73 @@
+// Tracks one sequence-numbered stream arriving over the unordered,
+// unreliable data channel: counts gaps as loss and late arrivals as reordering.
+class SequenceTracker {
+    constructor() {
+        this.expected = null;
+        this.received = 0;
+        this.lost = 0;
+        this.late = 0;
+    }
+
+    // Returns false for a late (reordered) message that is older than one already seen.
+    observe(seq) {
+        this.received++;
+        if (this.expected === null || seq === this.expected) {
+            this.expected = seq + 1;
+            return true;
+        }
+        if (seq > this.expected) {
+            this.lost += seq - this.expected;
+            this.expected = seq + 1;
+            return true;
+        }
+        // Counted as lost when the gap opened; it turned up after all.
+        this.late++;
+        if (this.lost > 0) this.lost--;
+        return false;
+    }
+
+    get lossRate() {
+        const total = this.received + this.lost;
+        return total ? this.lost / total : 0;
+    }
+}
+
+// Estimates the offset from performance.now() to the server's monotonic clock
+// with NTP-style ClockSync pings, keeping the sample with the smallest round trip.
+class ClockOffset {
+    constructor() {
+        this.offsetUs = null;
+        this.bestRttUs = Infinity;
+    }
+
+    static nowUs() {
+        return Math.round(performance.now() * 1000);
+    }
+
+    observe(sync, receivedUs) {
+        const t0 = toNumber(sync.clientSendUs);
+        const t1 = toNumber(sync.serverReceiveUs);
+        const t2 = toNumber(sync.serverSendUs);
+        const rtt = (receivedUs - t0) - (t2 - t1);
+        if (rtt < this.bestRttUs) {
+            this.bestRttUs = rtt;
+            this.offsetUs = ((t1 - t0) + (t2 - receivedUs)) / 2;
+        }
+    }
+
+    toServerUs(clientUs) {
+        return this.offsetUs === null ? null : Math.round(clientUs + this.offsetUs);
+    }
+}
+
+function toNumber(value) {
+    return protobuf.util.LongBits.from(value).toNumber(true);
+}
+
+const CLOCK_SYNC_INTERVAL_MS = 2000;
+const RESUME_DELAY_MS = 1000;  // Grace period for a 'disconnected' connection to recover by itself
+const SIGNALING_RETRY_MS = [250, 500, 1000, 2000, 5000];
+
 document.addEventListener('DOMContentLoaded', () => {
       const startButton = document.getElementById('startBtn');
       const stopButton = document.getElementById('stopBtn');
@@ -9,16 +79,43 @@ document.addEventListener('DOMContentLoaded', () => {
       const statusDisplay = document.getElementById('status');
       const sensorDataDisplay = document.getElementById('sensor-data');
       const robotStatusDisplay = document.getElementById('robot-data');
+      const linkStatsDisplay = document.getElementById('link-stats');
       let pc = null;
       let dc = null;
       let proto = null;
+      let trackers = null;
+      let clock = null;
+      let clockSyncTimer = null;
+      let ws = null;
+      let signalQueue = Promise.resolve();
+      let signalingRetries = 0;
+      let sessionId = null;  // Server-side session; survives ICE restarts
+      let resumeTimer = null;
+      let active = false;  // Between Start and Stop
+
+      function resetTrackers() {
+          trackers = {
+              envelope: new SequenceTracker(),
+              sensor: new SequenceTracker(),
+              status: new SequenceTracker()
+          };
+      }
+
+      function showLinkStats() {
+          const t = trackers.envelope;
+          linkStatsDisplay.textContent = `Link: received=${t.received}, lost=${t.lost}, late=${t.late}, ` +
+                                         `loss=${(t.lossRate * 100).toFixed(1)}%, ` +
+                                         `sensor lost=${trackers.sensor.lost}, status lost=${trackers.status.lost}`;
+      }
 
       async function initProtoBuf() {
           const root = await protobuf.load("/public/robot_messages.proto");
           proto = {
               SensorData: root.lookupType("SensorData"),
               RobotStatus: root.lookupType("RobotStatus"),
-              Command: root.lookupType("Command")
+              Command: root.lookupType("Command"),
+              Telemetry: root.lookupType("Telemetry"),
+              ClientMessage: root.lookupType("ClientMessage")
           };
       }
 
@@ -37,74 +134,194 @@ document.addEventListener('DOMContentLoaded', () => {
           rightButton.disabled = !isConnected;
       }
 
+      function sendClientMessage(fields) {
+          if (!dc || dc.readyState !== 'open') return false;
+          dc.send(proto.ClientMessage.encode(proto.ClientMessage.create(fields)).finish());
+          return true;
+      }
+
+      function sendClockSync() {
+          sendClientMessage({ clockSync: { clientSendUs: ClockOffset.nowUs() } });
+      }
+
       function sendCommand(steer, throttle) {
-          if (dc && dc.readyState === 'open') {
-              const cmd = proto.Command.create({
-                  steering: steer,
-                  throttle: throttle,
-              });
-              const buffer = proto.Command.encode(cmd).finish();
-              dc.send(buffer);
+          if (sendClientMessage({ command: { steering: steer, throttle: throttle } })) {
               logStatus(`Sent Command: ${steer}, ${throttle}s`);
           } else {
               console.warn('Data channel not open.');
           }
       }
 
-      async function startStream() {
-          await initProtoBuf();
-          setUIState('connecting');
-          logStatus('Starting connection...');
-          pc = new RTCPeerConnection();
-          const outgoing = pc.createDataChannel("protobuf", {
+      function sendSignal(msg) {
+          if (!ws || ws.readyState !== WebSocket.OPEN) return false;
+          ws.send(JSON.stringify(msg));
+          return true;
+      }
+
+      // One WebSocket carries the offer/answer and our trickled candidates
+      // (the server's are all in its answer). The server keeps the session
+      // (video, telemetry subscription) when the socket or the peer
+      // connection drops, so either can be replaced without starting over.
+      function openSignaling() {
+          return new Promise((resolve, reject) => {
+              const scheme = location.protocol === 'https:' ? 'wss' : 'ws';
+              const socket = new WebSocket(`${scheme}://${location.host}/ws`);
+              socket.onopen = () => {
+                  ws = socket;
+                  signalingRetries = 0;
+                  resolve();
+              };
+              socket.onerror = () => reject(new Error('Signaling connection failed'));
+              socket.onmessage = (event) => {
+                  // Messages must be applied in the order they arrive.
+                  const msg = JSON.parse(event.data);
+                  signalQueue = signalQueue.then(() => handleSignal(msg));
+              };
+              socket.onclose = () => {
+                  if (ws === socket) {
+                      ws = null;
+                      scheduleSignalingReconnect();
+                  }
+              };
+          });
+      }
+
+      function scheduleSignalingReconnect() {
+          if (!active) return;
+          const delay = SIGNALING_RETRY_MS[Math.min(signalingRetries++, SIGNALING_RETRY_MS.length - 1)];
+          setTimeout(async () => {
+              if (!active || ws) return;
+              try {
+                  await openSignaling();
+              } catch (err) {
+                  scheduleSignalingReconnect();
+                  return;
+              }
+              if (!pc || pc.connectionState !== 'connected') resume();
+          }, delay);
+      }
+
+      async function handleSignal(msg) {
+          try {
+              switch (msg.type) {
+                  case 'answer':
+                      if (!pc || pc.signalingState !== 'have-local-offer') return;
+                      logStatus('Answer received. Setting remote description...');
+                      await pc.setRemoteDescription({ sdp: msg.sdp, type: 'answer' });
+                      sessionId = msg.pc_id;
+                      break;
+                  case 'error':
+                      logStatus(`Signaling error: ${msg.error}`);
+                      break;
+              }
+          } catch (err) {
+              console.warn(`Signaling message ${msg.type}: ${err.message}`);
+          }
+      }
+
+      function handleTelemetry(data) {
+          const receivedUs = ClockOffset.nowUs();
+          let envelope;
+          try {
+              envelope = proto.Telemetry.decode(data);
+          } catch (e) {
+              console.error("Failed to decode telemetry:", e);
+              return;
+          }
+          if (envelope.payload === 'clockSync') {
+              clock.observe(envelope.clockSync, receivedUs);
+              return;
+          }
+          if (envelope.traced) {
+              const receiveUs = clock.toServerUs(receivedUs);
+              if (receiveUs !== null) {
+                  sendClientMessage({ traceReport: { sequence: envelope.sequence, receiveUs: receiveUs } });
+              }
+          }
+          trackers.envelope.observe(envelope.sequence);
+          showLinkStats();
+          switch (envelope.payload) {
+              case 'sensor': {
+                  const msg = envelope.sensor;
+                  if (!trackers.sensor.observe(msg.sequence)) break; // Never move the display backwards
+                  const gps = msg.gps
+                      ? `Lat=${msg.gps.lat.toFixed(4)}, Lon=${msg.gps.lon.toFixed(4)}, Alt=${msg.gps.alt.toFixed(1)}, GPS age=${msg.gpsAgeMs.toFixed(0)}ms${msg.gpsExtrapolated ? ' (extrapolated)' : ''}`
+                      : 'GPS=stale';
+                  const timestamp = protobuf.util.LongBits.from(msg.timestampNs).toNumber(true) / 1e9;
+                  sensorDataDisplay.textContent = `Sensor Data: Sequence=${msg.sequence}, Timestamp=${timestamp.toFixed(3)}, ${gps}, ` +
+                                                  `Latency=${msg.latencyMs.toFixed(1)}ms`;
+                  console.log("SensorData:", msg); // For programmatic access
+                  break;
+              }
+              case 'status': {
+                  const msg = envelope.status;
+                  if (!trackers.status.observe(msg.sequence)) break;
+                  robotStatusDisplay.textContent = `Robot Status: Sequence=${msg.sequence}, Uptime=${(msg.uptimeMs / 1000).toFixed(3)}s, ` +
+                                                   `Steering=${msg.steering}, Throttle=${msg.throttle}`;
+                  console.log("RobotStatus:", msg);
+                  break;
+              }
+              default:
+                  // Newer server message type this page does not know yet.
+                  console.debug("Ignoring telemetry of unknown type");
+          }
+      }
+
+      function createPeer() {
+          const conn = pc = new RTCPeerConnection();
+          conn.onicecandidate = (event) => {
+              if (pc !== conn) return;
+              sendSignal({ type: 'candidate', ...(event.candidate ? event.candidate.toJSON() : { candidate: '' }) });
+          };
+          const outgoing = conn.createDataChannel("protobuf", {
                     ordered: false,
                     maxRetransmits: 0
                 });
 
           outgoing.onopen  = () => logStatus("Client: outgoing DC open");
           outgoing.onclose = () => logStatus("Client: outgoing DC closed");
-          pc.ondatachannel = (event) => {
+          conn.ondatachannel = (event) => {
               logStatus('Data channel created.');
               dc = event.channel;
-              dc.onopen = () => logStatus('Data channel open.');
+              dc.onopen = () => {
+                  logStatus('Data channel open.');
+                  sendClockSync();
+                  if (!clockSyncTimer) clockSyncTimer = setInterval(sendClockSync, CLOCK_SYNC_INTERVAL_MS);
+              };
               dc.onclose = () => logStatus('Data channel closed.');
               dc.onmessage = (event) => {
-                  const data = new Uint8Array(event.data);
-                  try{
-                  const msg = proto.SensorData.decode(data);
-                  sensorDataDisplay.textContent = `Sensor Data: Sequence=${msg.sequence}, Timestamp=${msg.timestamp.toFixed(3)}, ` +
-                                                  `Lat=${msg.gps.lat.toFixed(4)}, Lon=${msg.gps.lon.toFixed(4)}, Alt=${msg.gps.alt.toFixed(1)}`;
-                  console.log("SensorData:", msg); // For programmatic access
-                  } catch (e) {
-                      try{
-                        const msg = proto.RobotStatus.decode(data);
-                        robotStatusDisplay.textContent = `Robot Status: Sequence=${msg.sequence}, Timestamp=${msg.timestamp}, ` +
-                                                `Steering=${msg.steering}, Throttle=${msg.throttle}`;
-                        console.log("RobotStatus:", msg);
-                      } catch(e){
-                          console.error("Failed to decode message:", e);
-
-                      }
+                  // Each data channel message is a batch of varint length-delimited protobufs.
+                  const reader = protobuf.Reader.create(new Uint8Array(event.data));
+                  while (reader.pos < reader.len) {
+                      const length = reader.uint32();
+                      handleTelemetry(reader.buf.subarray(reader.pos, reader.pos + length));
+                      reader.skip(length);
                   }
               };
           };
-          pc.onconnectionstatechange = () => {
-              logStatus(`Connection state: ${pc.connectionState}`);
-              if (pc.connectionState === 'connected') {
+          conn.onconnectionstatechange = () => {
+              if (pc !== conn) return;
+              logStatus(`Connection state: ${conn.connectionState}`);
+              if (conn.connectionState === 'connected') {
+                  clearTimeout(resumeTimer);
+                  resumeTimer = null;
                   setUIState('connected');
-              } else if (['disconnected', 'failed', 'closed'].includes(pc.connectionState)) {
-                  stopStream();
+              } else if (conn.connectionState === 'disconnected') {
+                  // Often recovers by itself; resume only if it does not.
+                  scheduleResume(RESUME_DELAY_MS);
+              } else if (conn.connectionState === 'failed') {
+                  scheduleResume(0);
               }
           };
 
-          pc.ontrack = (event) => {
+          conn.ontrack = (event) => {
               logStatus('Video track received!');
               if (event.track.kind === 'video' && event.streams[0]) {
                   videoElement.srcObject = event.streams[0];
               }
           };
 
-          pc.addTransceiver('video', { direction: 'recvonly' });
+          conn.addTransceiver('video', { direction: 'recvonly' });
 
         //   pc.ondatachannel = (event) => {
         //       logStatus('Data channel created.');
@@ -119,20 +336,59 @@ document.addEventListener('DOMContentLoaded', () => {
         //       };
         //   };
 
+          return conn;
+      }
+
+      // Sends an offer for the current peer connection. With a sessionId the
+      // server moves that session onto this connection instead of making a new one.
+      async function negotiate() {
+          const conn = pc;
+          const offer = await conn.createOffer();
+          await conn.setLocalDescription(offer);
+          console.log("===== Client Offer SDP =====\n", conn.localDescription.sdp);
+          logStatus('Offer created. Sending to server...');
+          if (!sendSignal({ type: 'offer', sdp: conn.localDescription.sdp, pc_id: sessionId })) {
+              throw new Error('Signaling connection is down');
+          }
+      }
+
+      function scheduleResume(delay) {
+          if (resumeTimer) return;
+          resumeTimer = setTimeout(() => {
+              resumeTimer = null;
+              resume();
+          }, delay);
+      }
+
+      // ICE restart. The server cannot restart ICE on its side of an existing
+      // connection, so a new RTCPeerConnection takes over the same session;
+      // the trackers and clock estimate carry on.
+      async function resume() {
+          if (!active || !ws) return; // The signaling reconnect resumes once it is back
+          logStatus('Connection lost. Resuming session...');
+          setUIState('connecting');
+          if (pc) pc.close();
+          dc = null;
+          createPeer();
+          try {
+              await negotiate();
+          } catch (err) {
+              logStatus(`Resume failed: ${err.message}`);
+          }
+      }
+
+      async function startStream() {
+          active = true;
+          await initProtoBuf();
+          resetTrackers();
+          clock = new ClockOffset();
+          sessionId = null;
+          setUIState('connecting');
+          logStatus('Starting connection...');
           try {
-              const offer = await pc.createOffer();
-              await pc.setLocalDescription(offer);
-              console.log("===== Client Offer SDP =====\n", pc.localDescription.sdp);
-              logStatus('Offer created. Sending to server...');
-              const response = await fetch('/offer', {
-                  method: 'POST',
-                  headers: {'Content-Type': 'application/json'},
-                  body: JSON.stringify({ sdp: pc.localDescription.sdp, type: pc.localDescription.type })
-              });
-              if (!response.ok) throw new Error(`Server error: ${response.status}`);
-              const answer = await response.json();
-              logStatus('Answer received. Setting remote description...');
-              await pc.setRemoteDescription(answer);
+              await openSignaling();
+              createPeer();
+              await negotiate();
           } catch (err) {
               logStatus(`Error: ${err.message}`);
               stopStream();
@@ -140,13 +396,27 @@ document.addEventListener('DOMContentLoaded', () => {
       }
 
       function stopStream() {
+          active = false;
+          clearTimeout(resumeTimer);
+          resumeTimer = null;
+          if (ws) {
+              const socket = ws;
+              ws = null;
+              socket.send(JSON.stringify({ type: 'bye' }));
+              socket.close();
+          }
           if (pc) {
               pc.close();
               pc = null;
           }
+          sessionId = null;
           if (dc) {
               dc = null;
           }
+          if (clockSyncTimer) {
+              clearInterval(clockSyncTimer);
+              clockSyncTimer = null;
+          }
           videoElement.srcObject = null;
           sensorDataDisplay.textContent = 'Sensor Data: Waiting...';
           logStatus('Disconnected. Ready.');
@@ -0,0 +1,376 @@
+"""
+Hardware H.264 passthrough for the camera.
+
+The capture pipeline ends in the Pi's V4L2 M2M encoder (v4l2h264enc) and an
+appsink, so frames arrive already encoded. H264PassthroughTrack hands them
+to aiortc as av.Packet objects, which the RTP sender packetizes without
+decoding or re-encoding. Keyframes are produced on request: when the
+browser sends PLI/FIR, or when a relay had to skip a frame, a
+force-key-unit event is pushed upstream to the encoder.
+
+Needs GStreamer's Python bindings (python3-gi, gir1.2-gst-plugins-base-1.0).
+Set H264_ENCODER to SOFTWARE_H264_ENCODER and the source to TEST_SOURCE to
+exercise the same path on a Linux box without a Pi camera.
+"""
+import logging
+import threading
+import time
+from fractions import Fraction
+from aiortc import RTCRtpSender
+from aiortc.contrib.media import MediaStreamTrack, MediaStreamError
+from aiortc.rtp import RtcpPsfbPacket
+import av
+from camera import FrameMailbox, FRAME_TIMEOUT, REOPEN_BACKOFF_MIN, REOPEN_BACKOFF_MAX, STOP_TIMEOUT
+from signaling import add_rtcp_listener
+from tracing import LatencyHistogram
+
+try:
+    import gi
+    gi.require_version("Gst", "1.0")
+    gi.require_version("GstVideo", "1.0")
+    from gi.repository import Gst, GstVideo
+except (ImportError, ValueError):
+    Gst = None
+
+CAMERA_SOURCE = "libcamerasrc"
+TEST_SOURCE = "videotestsrc is-live=true pattern=ball"
+H264_ENCODER = ('v4l2h264enc extra-controls="controls,repeat_sequence_header=1,'
+                'video_bitrate=2500000,h264_i_frame_period=60"')
+SOFTWARE_H264_ENCODER = "x264enc tune=zerolatency speed-preset=ultrafast key-int-max=60 bitrate=2500"
+H264_PIPELINE = ("{source} ! video/x-raw,format=NV12,width={width},height={height},framerate={fps}/1 ! "
+                 "{encoder} name=encoder ! video/x-h264,profile=constrained-baseline ! "
+                 "h264parse config-interval=-1 ! video/x-h264,stream-format=byte-stream,alignment=au ! "
+                 "appsink name=sink sync=false max-buffers=4 drop=false")
+
+KEYFRAME_MIN_INTERVAL = 0.5  # Seconds; browsers send PLI in bursts while waiting for one
+PSFB_PLI = 1
+PSFB_FIR = 4
+VIDEO_CLOCK_RATE = 90000
+
+
+def h264_pipeline(source=CAMERA_SOURCE, encoder=H264_ENCODER, width=1280, height=720, fps=30):
+    return H264_PIPELINE.format(source=source, encoder=encoder, width=width, height=height, fps=fps)
+
+
+class H264CameraSource:
+    """
+    Process-wide encoded capture fanned out to relay tracks, with the same
+    subscribe()/unsubscribe() lifecycle, warm() option and reopen backoff as
+    camera.PiCameraSource. Each published item is
+    (access_unit_bytes, pts_ns, is_keyframe).
+    """
+
+    def __init__(self, pipeline=None, width=1280, height=720, fps=30):
+        self.pipeline = pipeline or h264_pipeline(width=width, height=height, fps=fps)
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.bitrate = None
+        self._gst = None
+        self._sink = None
+        self._lock = threading.Lock()
+        self._subscribers = ()  # H264PassthroughTrack
+        self._is_stopped = threading.Event()
+        self._thread = None
+        self._last_keyframe_request = 0.0
+        self.keep_warm = False
+        self.is_healthy = False
+        self.frames_captured = 0
+        self.keyframes_captured = 0
+        self.keyframe_requests = 0
+        self.reopen_attempts = 0
+        self.failures = 0
+
+    @property
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+    def subscribe(self):
+        """Returns a new relay track; starts the capture for the first subscriber."""
+        track = H264PassthroughTrack(self)
+        with self._lock:
+            self._subscribers = self._subscribers + (track,)
+            first = len(self._subscribers) == 1
+        if first:
+            self.start()
+        # A late joiner can only start decoding at a keyframe.
+        self.request_keyframe()
+        logging.info(f"H264: Camera subscriber added ({self.subscriber_count} active).")
+        return track
+
+    def unsubscribe(self, track):
+        with self._lock:
+            if track not in self._subscribers:
+                return
+            self._subscribers = tuple(t for t in self._subscribers if t is not track)
+            last = not self._subscribers
+        logging.info(f"H264: Camera subscriber removed ({self.subscriber_count} active).")
+        if last and not self.keep_warm:
+            self.stop(timeout=0)
+        else:
+            self.update_bitrate()
+
+    def warm(self):
+        """Starts the pipeline now and keeps it running between viewers."""
+        self.keep_warm = True
+        self.start()
+
+    def start(self):
+        """
+        Starts the reader thread, which builds the pipeline and rebuilds it
+        whenever it fails. A thread that was told to stop but has not exited
+        yet just carries on.
+        """
+        if Gst is None:
+            logging.error("H264: GStreamer Python bindings (gi) are not installed.")
+            return
+        Gst.init(None)
+        with self._lock:
+            self._is_stopped.clear()
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _open(self):
+        """Builds the pipeline and sets it playing. Returns True on success."""
+        logging.info(f"H264: Starting pipeline: {self.pipeline}")
+        self.reopen_attempts += 1
+        try:
+            gst = Gst.parse_launch(self.pipeline)
+        except Exception as e:
+            logging.error(f"H264: Could not build pipeline: {e}")
+            return False
+        if gst.set_state(Gst.State.PLAYING) == Gst.StateChangeReturn.FAILURE:
+            logging.error("H264: Pipeline failed to start.")
+            gst.set_state(Gst.State.NULL)
+            return False
+        self._gst = gst
+        self._sink = gst.get_by_name("sink")
+        self.bitrate = None  # A new encoder starts at the pipeline's bitrate
+        self.update_bitrate()
+        self.is_healthy = True
+        return True
+
+    def _close(self):
+        self.is_healthy = False
+        gst, self._gst, self._sink = self._gst, None, None
+        if gst is not None:
+            gst.set_state(Gst.State.NULL)
+
+    def _run(self):
+        """
+        Reader thread: builds the pipeline, reads until end of stream, then
+        rebuilds it with exponential backoff for as long as anyone is
+        subscribed. Only this thread builds or tears down the pipeline.
+        """
+        backoff = REOPEN_BACKOFF_MIN
+        while True:
+            if self._is_stopped.is_set():
+                self._close()
+                with self._lock:
+                    if self._is_stopped.is_set():
+                        self._thread = None
+                        break
+                continue  # start() was called again while stopping
+            if self._gst is None and not self._open():
+                logging.warning(f"H264: Pipeline unavailable, retrying in {backoff:.1f}s.")
+                self._is_stopped.wait(backoff)
+                backoff = min(backoff * 2, REOPEN_BACKOFF_MAX)
+                continue
+            read = self._read_packets()
+            self._close()
+            if self._is_stopped.is_set():
+                continue
+            self.failures += 1
+            if read:
+                backoff = REOPEN_BACKOFF_MIN
+                logging.error("H264: Pipeline failed; rebuilding.")
+            else:
+                # It played but never produced a frame; do not spin rebuilding it.
+                logging.error(f"H264: Pipeline produced nothing; rebuilding in {backoff:.1f}s.")
+                self._is_stopped.wait(backoff)
+                backoff = min(backoff * 2, REOPEN_BACKOFF_MAX)
+        logging.info("H264: Reader thread has stopped and released the pipeline.")
+
+    def _read_packets(self):
+        """
+        Pulls access units until stopped or until the pipeline reaches end of
+        stream. Returns how many it read.
+        """
+        sink = self._sink
+        read = 0
+        while not self._is_stopped.is_set():
+            sample = sink.emit("try-pull-sample", Gst.SECOND)
+            if sample is None:
+                if sink.get_property("eos"):
+                    logging.error("H264: Pipeline reached end of stream.")
+                    break
+                continue
+            buffer = sample.get_buffer()
+            ok, info = buffer.map(Gst.MapFlags.READ)
+            if not ok:
+                continue
+            try:
+                data = bytes(info.data)
+            finally:
+                buffer.unmap(info)
+            is_keyframe = not buffer.has_flags(Gst.BufferFlags.DELTA_UNIT)
+            pts_ns = buffer.pts if buffer.pts != Gst.CLOCK_TIME_NONE else time.monotonic_ns()
+            self.frames_captured += 1
+            read += 1
+            if is_keyframe:
+                self.keyframes_captured += 1
+            item = (data, pts_ns, is_keyframe)
+            for track in self._subscribers:
+                track._mailbox.put(item)
+        return read
+
+    def request_keyframe(self):
+        """Asks the encoder for an IDR frame; repeated requests are coalesced."""
+        now = time.monotonic()
+        sink = self._sink
+        if sink is None or now - self._last_keyframe_request < KEYFRAME_MIN_INTERVAL:
+            return
+        self._last_keyframe_request = now
+        self.keyframe_requests += 1
+        event = GstVideo.video_event_new_upstream_force_key_unit(Gst.CLOCK_TIME_NONE, True, 0)
+        sink.send_event(event)
+        logging.debug("H264: Keyframe requested.")
+
+    def update_bitrate(self):
+        """
+        Retunes the shared encoder to the lowest bitrate any peer asked for;
+        one encode serves every peer, so the weakest link sets the rate.
+        """
+        wanted = [t.quality.bitrate for t in self._subscribers if t.quality is not None]
+        gst = self._gst
+        if not wanted or gst is None:
+            return
+        bitrate = min(wanted)
+        if bitrate == self.bitrate:
+            return
+        encoder = gst.get_by_name("encoder")
+        if encoder.find_property("bitrate") is not None:
+            encoder.set_property("bitrate", bitrate // 1000)  # x264enc: kbit/s
+        else:
+            encoder.set_property("extra-controls", Gst.Structure.new_from_string(
+                f"controls,video_bitrate={bitrate}"))
+        self.bitrate = bitrate
+        logging.info(f"H264: Encoder bitrate set to {bitrate // 1000} kbps.")
+
+    def stop(self, timeout=STOP_TIMEOUT):
+        """
+        Signals the reader thread to stop; the thread tears the pipeline down
+        on its way out. Waits up to `timeout` seconds for that (0 returns at
+        once, as unsubscribe() does on the event loop).
+        """
+        logging.info("H264: Stopping camera capture...")
+        self._is_stopped.set()
+        thread = self._thread
+        if thread is not None and timeout:
+            thread.join(timeout)
+            if thread.is_alive():
+                logging.warning("H264: Reader thread is still finishing; it will release the pipeline.")
+
+
+class H264PassthroughTrack(MediaStreamTrack):
+    """
+    Per-peer relay of encoded access units. A P-frame is useless without
+    everything since the last keyframe, so once the mailbox reports a skipped
+    frame the track discards deltas and asks for a keyframe to resume from.
+    """
+    kind = "video"
+
+    def __init__(self, source):
+        super().__init__()
+        self.source = source
+        self._mailbox = FrameMailbox()
+        self.quality = None
+        self._waiting_for_keyframe = True
+        self._first_pts_ns = None
+        self._last_pts = -1
+        self.frames_sent = 0
+        self.frames_dropped = 0
+        self.encode_time = LatencyHistogram()  # Packetization only; there is no encode step here
+        self._returned_at = None
+
+    def request_keyframe(self):
+        self.source.request_keyframe()
+
+    def resync(self):
+        """Skips ahead to the next keyframe, for a new receiver taking over this track."""
+        self._waiting_for_keyframe = True
+        self.source.request_keyframe()
+
+    def set_quality(self, step):
+        """Only the bitrate applies: resolution and rate are fixed by the shared encode."""
+        self.quality = step
+        self.source.update_bitrate()
+
+    async def recv(self):
+        if self._returned_at is not None:
+            self.encode_time.observe(time.monotonic() - self._returned_at)
+            self._returned_at = None
+        while True:
+            if self._mailbox.closed:
+                raise MediaStreamError
+            item, dropped = await self._mailbox.get(timeout=FRAME_TIMEOUT)
+            if self._mailbox.closed:
+                raise MediaStreamError
+            if item is None:
+                logging.warning("H264: No access unit within %.1fs.", FRAME_TIMEOUT)
+                continue
+            if dropped:
+                self.frames_dropped += dropped
+                self._waiting_for_keyframe = True
+            data, pts_ns, is_keyframe = item
+            if self._waiting_for_keyframe:
+                if not is_keyframe:
+                    self.frames_dropped += 1
+                    self.source.request_keyframe()
+                    continue
+                self._waiting_for_keyframe = False
+            break
+
+        if self._first_pts_ns is None:
+            self._first_pts_ns = pts_ns
+        pts = max((pts_ns - self._first_pts_ns) * VIDEO_CLOCK_RATE // 1_000_000_000, self._last_pts + 1)
+        self._last_pts = pts
+        packet = av.Packet(data)
+        packet.pts = pts
+        packet.time_base = Fraction(1, VIDEO_CLOCK_RATE)
+        self.frames_sent += 1
+        self._returned_at = time.monotonic()
+        return packet
+
+    def stop(self):
+        if not self._mailbox.closed:
+            self._mailbox.close()
+            self.source.unsubscribe(self)
+        super().stop()
+
+
+def prefer_h264(pc):
+    """
+    Restricts the video transceivers to H.264 so the negotiated codec matches
+    what the encoder produces. Call after addTrack, before setRemoteDescription.
+    """
+    codecs = [c for c in RTCRtpSender.getCapabilities("video").codecs
+              if c.mimeType in ("video/H264", "video/rtx")]
+    for transceiver in pc.getTransceivers():
+        if transceiver.kind == "video":
+            transceiver.setCodecPreferences(codecs)
+
+
+def forward_keyframe_requests(sender, track):
+    """
+    Routes PLI and FIR received by an RTCRtpSender to the track's encoder.
+    aiortc only reacts by flagging its own software encoder, which a
+    passthrough track bypasses.
+    """
+    def on_rtcp(packet):
+        if isinstance(packet, RtcpPsfbPacket) and packet.fmt in (PSFB_PLI, PSFB_FIR):
+            track.request_keyframe()
+
+    add_rtcp_listener(sender, on_rtcp)
@@ -0,0 +1,158 @@
+"""
+Logging setup for the streaming servers.
+
+Records are handed to a QueueHandler and written by a QueueListener
+thread, so a slow SD card never stalls a serial reader or the event loop.
+Hot paths do not log per message: they count events in an
+AggregatedLog, which emits one key=value summary line per interval.
+"""
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+import weakref
+
+LOG_LEVEL_ENV = "ROBOT_LOG_LEVEL"
+LOG_FORMAT = "%(asctime)s %(levelname)s %(threadName)s %(name)s: %(message)s"
+LOG_QUEUE_SIZE = 10000  # Records beyond this are dropped rather than blocking the caller
+SUMMARY_INTERVAL = 5.0  # Seconds between AggregatedLog summary lines
+
+_listener = None
+_aggregated_logs = weakref.WeakSet()  # Every live AggregatedLog, for flush_aggregated_logs()
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that counts and discards records when the queue is full."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class KeyValueFormatter(logging.Formatter):
+    """Appends the `fields` dict passed through `extra` as key=value pairs."""
+
+    def format(self, record):
+        message = super().format(record)
+        fields = getattr(record, "fields", None)
+        if fields:
+            message += " " + " ".join(f"{key}={value}" for key, value in fields.items())
+        return message
+
+
+def setup_logging(level=None):
+    """
+    Routes the root logger through a non-blocking queue. The level comes
+    from `level`, else the ROBOT_LOG_LEVEL environment variable, else INFO.
+    Safe to call more than once; later calls only change the level.
+    """
+    global _listener
+    root = logging.getLogger()
+    set_level(level or os.environ.get(LOG_LEVEL_ENV, "INFO"))
+    if _listener is not None:
+        return _listener
+    output = logging.StreamHandler()
+    output.setFormatter(KeyValueFormatter(LOG_FORMAT))
+    log_queue = queue.Queue(LOG_QUEUE_SIZE)
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_DroppingQueueHandler(log_queue))
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def flush_aggregated_logs():
+    """Emits the partial window of every AggregatedLog that has counted something since its last summary."""
+    for aggregated_log in list(_aggregated_logs):
+        aggregated_log.flush()
+
+
+def stop_logging():
+    """Flushes AggregatedLog windows and queued records; call on shutdown."""
+    global _listener
+    flush_aggregated_logs()
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def set_level(level):
+    """Changes the root level at runtime. Accepts a name ("DEBUG") or a number."""
+    if isinstance(level, str):
+        name = level.upper()
+        level = logging.getLevelName(name)
+        if not isinstance(level, int):
+            raise ValueError(f"Unknown log level: {name}")
+    logging.getLogger().setLevel(level)
+    return logging.getLevelName(level)
+
+
+def get_level():
+    return logging.getLevelName(logging.getLogger().getEffectiveLevel())
+
+
+class AggregatedLog:
+    """
+    Counts events on a hot path and logs one summary line per interval
+    instead of one line per event. count() is a lock, an increment and a
+    clock read; nothing is formatted unless a summary is actually due and
+    the level is enabled. Fields passed to count() are kept from the most
+    recent event and included in the summary. A window is only closed by
+    the next event, so flush() reports a burst that was followed by silence.
+    """
+
+    def __init__(self, name, logger=None, level=logging.INFO, interval=SUMMARY_INTERVAL):
+        self.name = name
+        self.logger = logger or logging.getLogger()
+        self.level = level
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._count = 0
+        self._total = 0
+        self._fields = None
+        self._window_start = time.monotonic()
+        _aggregated_logs.add(self)
+
+    def count(self, **fields):
+        now = time.monotonic()
+        with self._lock:
+            self._count += 1
+            self._total += 1
+            if fields:
+                self._fields = fields
+            elapsed = now - self._window_start
+            if elapsed < self.interval:
+                return
+            count, total, last = self._count, self._total, self._fields
+            self._count = 0
+            self._window_start = now
+        self._emit(count, total, last, elapsed)
+
+    def flush(self):
+        """Logs the current window now if it has counted anything, and starts a new one."""
+        now = time.monotonic()
+        with self._lock:
+            if not self._count:
+                return
+            count, total, last = self._count, self._total, self._fields
+            elapsed = now - self._window_start
+            self._count = 0
+            self._window_start = now
+        self._emit(count, total, last, elapsed)
+
+    def _emit(self, count, total, last, elapsed):
+        if self.logger.isEnabledFor(self.level):
+            rate = count / elapsed if elapsed > 0 else 0.0
+            summary = {"event": self.name, "count": count, "total": total, "rate_hz": f"{rate:.2f}"}
+            if last:
+                summary.update(last)
+            self.logger.log(self.level, "%s summary", self.name, extra={"fields": summary})
@@ -0,0 +1,254 @@
+import asyncio
+import logging
+import time
+from tracing import LatencyHistogram
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+LOOP_LAG_INTERVAL = 0.25  # Seconds between event-loop lag probes
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    parts = []
+    for key, value in labels.items():
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        parts.append(f'{key}="{value}"')
+    return "{" + ",".join(parts) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(int(value))
+
+
+class MetricFamily:
+    """One named metric and its labelled samples, rendered in the Prometheus text format."""
+
+    def __init__(self, name, kind, help_text):
+        self.name = name
+        self.kind = kind
+        self.help = help_text
+        self.samples = []
+
+    def add(self, value, **labels):
+        self.samples.append((self.name, labels, value))
+        return self
+
+    def add_histogram(self, histogram, **labels):
+        """Adds a tracing.LatencyHistogram as _bucket/_sum/_count series."""
+        running = 0
+        for bound, count in zip(histogram.buckets, histogram.counts):
+            running += count
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            self.samples.append((f"{self.name}_bucket", dict(labels, le=le), running))
+        self.samples.append((f"{self.name}_sum", labels, histogram.sum))
+        self.samples.append((f"{self.name}_count", labels, histogram.count))
+        return self
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for name, labels, value in self.samples:
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines)
+
+
+def counter(name, help_text):
+    return MetricFamily(name, "counter", help_text)
+
+
+def gauge(name, help_text):
+    return MetricFamily(name, "gauge", help_text)
+
+
+def histogram(name, help_text):
+    return MetricFamily(name, "histogram", help_text)
+
+
+class MetricsRegistry:
+    """
+    Collects metrics at scrape time. Each collector is a callable returning
+    MetricFamily objects read straight from the counters the components
+    already keep, so nothing is updated on the hot paths for the sake of
+    metrics. Families with the same name from different collectors are
+    merged so each HELP/TYPE header appears once.
+    """
+
+    def __init__(self):
+        self._collectors = []
+
+    def register(self, collector):
+        self._collectors.append(collector)
+        return collector
+
+    def render(self):
+        families = {}
+        for collector in self._collectors:
+            try:
+                collected = list(collector())
+            except Exception as e:
+                logging.warning(f"Metrics collector {getattr(collector, '__name__', collector)} failed: {e}")
+                continue
+            for family in collected:
+                existing = families.get(family.name)
+                if existing is None:
+                    families[family.name] = family
+                else:
+                    existing.samples.extend(family.samples)
+        return "\n".join(f.render() for f in families.values() if f.samples) + "\n"
+
+
+class EventLoopLagMonitor:
+    """
+    Measures how late the event loop wakes a sleeping task. Sustained lag
+    means something is blocking the loop and every peer's video and
+    telemetry is late by the same amount.
+    """
+
+    def __init__(self, interval=LOOP_LAG_INTERVAL):
+        self.interval = interval
+        self.histogram = LatencyHistogram()
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(time.monotonic() - expected, 0.0)
+            self.last_lag = lag
+            if lag > self.max_lag:
+                self.max_lag = lag
+            self.histogram.observe(lag)
+
+    def collect(self):
+        yield gauge("robot_event_loop_lag_last_seconds", "Most recent event loop wakeup delay.").add(self.last_lag)
+        yield histogram("robot_event_loop_lag_seconds",
+                        "Event loop wakeup delay.").add_histogram(self.histogram)
+
+
+def camera_metrics(source):
+    """Families for a camera.PiCameraSource."""
+    yield counter("robot_camera_frames_captured_total", "Frames read from the capture pipeline.").add(source.frames_captured)
+    yield gauge("robot_camera_healthy", "1 while the capture pipeline delivers frames.").add(1 if source.is_healthy else 0)
+    yield gauge("robot_camera_subscribers", "Video tracks relaying the shared capture.").add(source.subscriber_count)
+    if hasattr(source, "interval_histogram"):
+        yield gauge("robot_camera_interval_jitter_seconds",
+                    "Smoothed deviation of the capture interval from the nominal frame period.").add(source.interval_jitter)
+        yield histogram("robot_camera_interval_deviation_seconds",
+                        "Deviation of each capture interval from the nominal frame period.").add_histogram(
+            source.interval_histogram)
+    yield counter("robot_camera_reopen_attempts_total", "Attempts to open the capture pipeline.").add(
+        getattr(source, "reopen_attempts", 0))
+    yield counter("robot_camera_failures_total", "Times a running capture failed and was closed.").add(
+        getattr(source, "failures", 0))
+
+
+def video_track_metrics(track, peer):
+    """Families for one camera.RobustPiCameraTrack."""
+    yield counter("robot_video_frames_sent_total", "Frames handed to the RTP sender.").add(track.frames_sent, peer=peer)
+    yield counter("robot_video_frames_dropped_total", "Captures overwritten before the sender asked for them.").add(
+        track.frames_dropped, peer=peer)
+    if hasattr(track, "capture_delay"):
+        yield histogram("robot_video_capture_to_send_seconds",
+                        "Time from frame capture to handing it to the RTP sender.").add_histogram(track.capture_delay, peer=peer)
+        yield counter("robot_video_pts_clamps_total", "Frames whose PTS had to be nudged forward to stay monotonic.").add(
+            track.pts_clamps, peer=peer)
+    yield counter("robot_video_placeholder_frames_total", "Placeholder frames sent while the camera was down.").add(
+        getattr(track, "placeholders_sent", 0), peer=peer)
+    yield histogram("robot_video_encode_seconds",
+                    "Time from handing a frame to the RTP sender until it asks for the next one (encode + packetize).").add_histogram(
+        track.encode_time, peer=peer)
+
+
+def telemetry_sender_metrics(sender, peer):
+    """Families for one telemetry.TelemetrySender and its subscriber."""
+    subscriber = sender.subscriber
+    yield counter("robot_datachannel_messages_total", "Telemetry records sent on the data channel.").add(sender.messages_sent, peer=peer)
+    yield counter("robot_datachannel_batches_total", "Data channel messages (coalesced batches) sent.").add(sender.batches_sent, peer=peer)
+    yield counter("robot_datachannel_bytes_total", "Bytes sent on the data channel.").add(sender.bytes_sent, peer=peer)
+    yield gauge("robot_datachannel_buffered_bytes", "Bytes queued in the data channel's send buffer.").add(
+        getattr(sender.data_channel, "bufferedAmount", 0), peer=peer)
+    yield gauge("robot_telemetry_queue_depth", "Messages waiting in the peer's telemetry ring.").add(len(subscriber), peer=peer)
+    dropped = counter("robot_telemetry_dropped_total", "Messages evicted from the peer's telemetry ring.")
+    for msg_type, count in subscriber.dropped_by_type.items():
+        dropped.add(count, peer=peer, type=msg_type)
+    yield dropped
+
+
+def serial_metrics(device, bytes_received, frames, checksum_errors):
+    """Families for one serial device, whatever its framing."""
+    yield counter("robot_serial_bytes_total", "Bytes read from the serial device.").add(bytes_received, device=device)
+    yield counter("robot_serial_frames_total", "Valid frames/sentences decoded from the serial device.").add(frames, device=device)
+    yield counter("robot_serial_checksum_errors_total", "Frames rejected by their checksum/CRC.").add(checksum_errors, device=device)
+
+
+def serial_writer_metrics(writer, device):
+    """Families for one serial_link.SerialWriter."""
+    yield counter("robot_serial_writes_total", "Frames written to the serial device.").add(writer.writes, device=device)
+    yield counter("robot_serial_superseded_total",
+                  "Frames replaced by a newer one before they were written.").add(writer.superseded, device=device)
+    yield counter("robot_serial_write_errors_total", "Failed writes to the serial device.").add(writer.errors, device=device)
+    yield histogram("robot_serial_write_latency_seconds",
+                    "Time from submitting a frame until it was written to the serial device.").add_histogram(
+        writer.latency, device=device)
+
+
+def adaptation_metrics(controller, peer):
+    """Families for one adaptation.AdaptationController."""
+    step = controller.step
+    yield gauge("robot_video_target_bitrate_bps", "Bitrate of the peer's current quality step.").add(step.bitrate, peer=peer)
+    yield gauge("robot_video_target_height", "Frame height of the peer's current quality step.").add(step.height, peer=peer)
+    yield gauge("robot_video_target_fps", "Frame rate of the peer's current quality step.").add(step.fps, peer=peer)
+    yield gauge("robot_video_loss_fraction", "Smoothed loss fraction from RTCP receiver reports.").add(controller.loss, peer=peer)
+    if controller.remb is not None:
+        yield gauge("robot_video_remb_bps", "Latest REMB bandwidth estimate from the browser.").add(controller.remb, peer=peer)
+    changes = counter("robot_video_quality_changes_total", "Quality ladder steps taken.")
+    changes.add(controller.degrades, peer=peer, direction="down")
+    changes.add(controller.upgrades, peer=peer, direction="up")
+    yield changes
+
+
+def tracer_metrics(tracer):
+    """Families for a tracing.LatencyTracer."""
+    family = histogram("robot_telemetry_latency_seconds", "Sampled telemetry latency per pipeline stage.")
+    for stage, stage_histogram in tracer.histograms.items():
+        family.add_histogram(stage_histogram, stage=stage)
+    yield family
+
+
+def setup_metrics(stats, prewarmer=None):
+    """Families for a signaling.SetupStats and, if given, its PeerPrewarmer."""
+    family = histogram("robot_webrtc_setup_seconds", "Time spent in each phase of WebRTC connection setup.")
+    for phase, phase_histogram in stats.histograms.items():
+        family.add_histogram(phase_histogram, phase=phase)
+    yield family
+    if prewarmer is not None:
+        taken = counter("robot_webrtc_peers_taken_total", "Offers served by a pre-warmed peer connection, or a cold one.")
+        taken.add(prewarmer.taken_warm, warm="true")
+        taken.add(prewarmer.taken_cold, warm="false")
+        yield taken
+
+
+def session_metrics(manager):
+    """Families for a session.SessionManager."""
+    yield gauge("robot_webrtc_sessions", "Viewer sessions, connected or waiting to be resumed.").add(len(manager))
+    yield counter("robot_webrtc_session_resumes_total",
+                  "Sessions moved onto a new peer connection after an ICE restart.").add(manager.resumed)
+    yield counter("robot_webrtc_sessions_expired_total",
+                  "Sessions closed because no new offer arrived in time.").add(manager.expired)
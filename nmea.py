@@ -0,0 +1,148 @@
+import time
+from datetime import datetime, timezone
+
+# Sentence ids we use; everything else is dropped before any parsing
+WANTED_SENTENCES = (b'GGA', b'RMC', b'VTG')
+MAX_LINE = 120  # NMEA 0183 caps sentences at 82 chars; leave slack for vendor extensions
+
+KNOTS_TO_MPS = 0.514444
+KMH_TO_MPS = 1 / 3.6
+
+
+def _checksum_ok(line, star):
+    """line[1:star] XORed must equal the two hex digits after '*'."""
+    if len(line) < star + 3:
+        return False
+    calculated = 0
+    for byte in line[1:star]:
+        calculated ^= byte
+    try:
+        return calculated == int(line[star + 1:star + 3], 16)
+    except ValueError:
+        return False
+
+
+def _degrees(value, hemisphere):
+    """Converts NMEA ddmm.mmmm / dddmm.mmmm plus N/S/E/W into signed decimal degrees."""
+    if not value:
+        return None
+    dot = value.find(b'.')
+    if dot < 0:
+        dot = len(value)
+    degrees = int(value[:dot - 2]) + float(value[dot - 2:]) / 60.0
+    return -degrees if hemisphere in (b'S', b'W') else degrees
+
+
+def _seconds_of_day(value):
+    """hhmmss.ss -> seconds since midnight UTC, or None."""
+    if len(value) < 6:
+        return None
+    return int(value[0:2]) * 3600 + int(value[2:4]) * 60 + float(value[4:])
+
+
+def _float(value):
+    return float(value) if value else None
+
+
+class NmeaReader:
+    """
+    Streaming NMEA reader. Lines are split out of a reusable buffer,
+    filtered on their sentence id, checksum-verified, and only then
+    parsed by a small dedicated routine for GGA, RMC or VTG. Each call to
+    feed() returns the updates it produced as plain dicts, stamped with the
+    monotonic receive time of the chunk they completed in.
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._midnight = None  # UTC epoch of the last date seen in RMC
+        self.bytes_received = 0
+        self.sentences = 0
+        self.parsed = 0
+        self.checksum_errors = 0
+        self.parse_errors = 0
+
+    def _utc_to_epoch(self, seconds):
+        midnight = self._midnight
+        if midnight is None:
+            today = datetime.now(timezone.utc).date()
+            midnight = datetime(today.year, today.month, today.day, tzinfo=timezone.utc).timestamp()
+        return midnight + seconds
+
+    def feed(self, data):
+        received_ns = time.monotonic_ns()
+        buffer = self._buffer
+        buffer += data
+        self.bytes_received += len(data)
+        updates = []
+        start = 0
+        while True:
+            end = buffer.find(b'\n', start)
+            if end < 0:
+                break
+            line = bytes(buffer[start:end]).rstrip(b'\r')
+            start = end + 1
+            self.sentences += 1
+            # "$GPGGA,..." / "$GNRMC,...": talker is 2 chars, sentence id the next 3
+            if len(line) < 7 or line[0] != 0x24 or line[3:6] not in WANTED_SENTENCES:
+                continue
+            star = line.rfind(b'*')
+            if star < 0 or not _checksum_ok(line, star):
+                self.checksum_errors += 1
+                continue
+            try:
+                update = self._parse(line[3:6], line[7:star].split(b','))
+            except (ValueError, IndexError):
+                self.parse_errors += 1
+                continue
+            if update is not None:
+                self.parsed += 1
+                update["received_ns"] = received_ns
+                updates.append(update)
+        del buffer[:start]
+        if len(buffer) > MAX_LINE:
+            # A line this long is noise; keep only what could be the start of the next one.
+            dollar = buffer.rfind(b'$')
+            del buffer[:dollar if dollar > 0 else len(buffer)]
+        return updates
+
+    def _parse(self, sentence, fields):
+        if sentence == b'GGA':
+            # time, lat, N/S, lon, E/W, quality, sats, hdop, alt, M, ...
+            quality = int(fields[5] or 0)
+            if quality == 0:
+                return None
+            seconds = _seconds_of_day(fields[0])
+            return {
+                "type": "GGA",
+                "lat": _degrees(fields[1], fields[2]) or 0.0,
+                "lon": _degrees(fields[3], fields[4]) or 0.0,
+                "alt": _float(fields[8]) or 0.0,
+                "fix_quality": quality,
+                "num_sats": int(fields[6] or 0),
+                "hdop": _float(fields[7]),
+                "timestamp": self._utc_to_epoch(seconds) if seconds is not None else time.time(),
+            }
+        if sentence == b'RMC':
+            # time, status, lat, N/S, lon, E/W, speed kn, course, ddmmyy, ...
+            date = fields[8]
+            if len(date) == 6:
+                self._midnight = datetime(2000 + int(date[4:6]), int(date[2:4]), int(date[0:2]),
+                                          tzinfo=timezone.utc).timestamp()
+            if fields[1] != b'A':
+                return None
+            speed = _float(fields[6])
+            return {
+                "type": "RMC",
+                "lat": _degrees(fields[2], fields[3]) or 0.0,
+                "lon": _degrees(fields[4], fields[5]) or 0.0,
+                "speed": speed * KNOTS_TO_MPS if speed is not None else None,
+                "course": _float(fields[7]),
+            }
+        # VTG: course true, T, course mag, M, speed kn, N, speed km/h, K, mode
+        speed_kmh = _float(fields[6])
+        return {
+            "type": "VTG",
+            "course": _float(fields[0]),
+            "speed": speed_kmh * KMH_TO_MPS if speed_kmh is not None else None,
+        }
@@ -13,7 +13,7 @@ _sym_db = _symbol_database.Default()
 
 
 
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x14robot_messages.proto\"\x85\x02\n\nSensorData\x12\x10\n\x08sequence\x18\x01 \x01(\r\x12\x11\n\ttimestamp\x18\x02 \x01(\x02\x12\x1c\n\x03imu\x18\x03 \x01(\x0b\x32\x0f.SensorData.IMU\x12\x1c\n\x03gps\x18\x04 \x01(\x0b\x32\x0f.SensorData.GPS\x1ah\n\x03IMU\x12\x0f\n\x07\x61\x63\x63\x65l_x\x18\x01 \x01(\x02\x12\x0f\n\x07\x61\x63\x63\x65l_y\x18\x02 \x01(\x02\x12\x0f\n\x07\x61\x63\x63\x65l_z\x18\x03 \x01(\x02\x12\x0e\n\x06gyro_x\x18\x04 \x01(\x02\x12\x0e\n\x06gyro_y\x18\x05 \x01(\x02\x12\x0e\n\x06gyro_z\x18\x06 \x01(\x02\x1a,\n\x03GPS\x12\x0b\n\x03lat\x18\x01 \x01(\x02\x12\x0b\n\x03lon\x18\x02 \x01(\x02\x12\x0b\n\x03\x61lt\x18\x03 \x01(\x02\"V\n\x0bRobotStatus\x12\x10\n\x08sequence\x18\x01 \x01(\r\x12\x10\n\x08steering\x18\x02 \x01(\x02\x12\x10\n\x08throttle\x18\x03 \x01(\x02\x12\x11\n\ttimestamp\x18\x04 \x01(\x02\"-\n\x07\x43ommand\x12\x10\n\x08steering\x18\x01 \x01(\x02\x12\x10\n\x08throttle\x18\x02 \x01(\x02\x62\x06proto3')
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x14robot_messages.proto\"\xd0\x02\n\nSensorData\x12\x10\n\x08sequence\x18\x01 \x01(\r\x12\x14\n\x0ctimestamp_ns\x18\x07 \x01(\x04\x12\x1c\n\x03imu\x18\x03 \x01(\x0b\x32\x0f.SensorData.IMU\x12\x1c\n\x03gps\x18\x04 \x01(\x0b\x32\x0f.SensorData.GPS\x12\x12\n\ngps_age_ms\x18\x05 \x01(\x02\x12\x12\n\nlatency_ms\x18\x06 \x01(\x02\x12\x18\n\x10gps_extrapolated\x18\x08 \x01(\x08\x1ah\n\x03IMU\x12\x0f\n\x07\x61\x63\x63\x65l_x\x18\x01 \x01(\x02\x12\x0f\n\x07\x61\x63\x63\x65l_y\x18\x02 \x01(\x02\x12\x0f\n\x07\x61\x63\x63\x65l_z\x18\x03 \x01(\x02\x12\x0e\n\x06gyro_x\x18\x04 \x01(\x02\x12\x0e\n\x06gyro_y\x18\x05 \x01(\x02\x12\x0e\n\x06gyro_z\x18\x06 \x01(\x02\x1a,\n\x03GPS\x12\x0b\n\x03lat\x18\x01 \x01(\x02\x12\x0b\n\x03lon\x18\x02 \x01(\x02\x12\x0b\n\x03\x61lt\x18\x03 \x01(\x02J\x04\x08\x02\x10\x03\"\\\n\x0bRobotStatus\x12\x10\n\x08sequence\x18\x01 \x01(\r\x12\x10\n\x08steering\x18\x02 \x01(\x02\x12\x10\n\x08throttle\x18\x03 \x01(\x02\x12\x11\n\tuptime_ms\x18\x05 \x01(\rJ\x04\x08\x04\x10\x05\"-\n\x07\x43ommand\x12\x10\n\x08steering\x18\x01 \x01(\x02\x12\x10\n\x08throttle\x18\x02 \x01(\x02\"V\n\tClockSync\x12\x16\n\x0e\x63lient_send_us\x18\x01 \x01(\x04\x12\x19\n\x11server_receive_us\x18\x02 \x01(\x04\x12\x16\n\x0eserver_send_us\x18\x03 \x01(\x04\"3\n\x0bTraceReport\x12\x10\n\x08sequence\x18\x01 \x01(\r\x12\x12\n\nreceive_us\x18\x02 \x01(\x04\"\x7f\n\rClientMessage\x12\x1b\n\x07\x63ommand\x18\x01 \x01(\x0b\x32\x08.CommandH\x00\x12 \n\nclock_sync\x18\x02 \x01(\x0b\x32\n.ClockSyncH\x00\x12$\n\x0ctrace_report\x18\x03 \x01(\x0b\x32\x0c.TraceReportH\x00\x42\t\n\x07payload\"\xaf\x01\n\tTelemetry\x12\x10\n\x08sequence\x18\x01 \x01(\r\x12\x14\n\x0cmonotonic_us\x18\x02 \x01(\x04\x12\x0e\n\x06traced\x18\x05 \x01(\x08\x12\x1d\n\x06sensor\x18\x03 \x01(\x0b\x32\x0b.SensorDataH\x00\x12\x1e\n\x06status\x18\x04 \x01(\x0b\x32\x0c.RobotStatusH\x00\x12 \n\nclock_sync\x18\x06 \x01(\x0b\x32\n.ClockSyncH\x00\x42\t\n\x07payloadb\x06proto3')
 
 _builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, globals())
 _builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'robot_messages_pb2', globals())
@@ -21,13 +21,21 @@ if _descriptor._USE_C_DESCRIPTORS == False:
 
   DESCRIPTOR._options = None
   _SENSORDATA._serialized_start=25
-  _SENSORDATA._serialized_end=286
-  _SENSORDATA_IMU._serialized_start=136
-  _SENSORDATA_IMU._serialized_end=240
-  _SENSORDATA_GPS._serialized_start=242
-  _SENSORDATA_GPS._serialized_end=286
-  _ROBOTSTATUS._serialized_start=288
-  _ROBOTSTATUS._serialized_end=374
-  _COMMAND._serialized_start=376
-  _COMMAND._serialized_end=421
+  _SENSORDATA._serialized_end=361
+  _SENSORDATA_IMU._serialized_start=205
+  _SENSORDATA_IMU._serialized_end=309
+  _SENSORDATA_GPS._serialized_start=311
+  _SENSORDATA_GPS._serialized_end=355
+  _ROBOTSTATUS._serialized_start=363
+  _ROBOTSTATUS._serialized_end=455
+  _COMMAND._serialized_start=457
+  _COMMAND._serialized_end=502
+  _CLOCKSYNC._serialized_start=504
+  _CLOCKSYNC._serialized_end=590
+  _TRACEREPORT._serialized_start=592
+  _TRACEREPORT._serialized_end=643
+  _CLIENTMESSAGE._serialized_start=645
+  _CLIENTMESSAGE._serialized_end=772
+  _TELEMETRY._serialized_start=775
+  _TELEMETRY._serialized_end=950
 # @@protoc_insertion_point(module_scope)
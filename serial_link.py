@@ -0,0 +1,226 @@
+"""
+Framing for the Pi <-> Arduino serial link.
+
+Each protobuf payload is followed by a big-endian CRC16-CCITT (poly 0x1021,
+init 0xFFFF), COBS-encoded so the frame contains no zero bytes, and
+terminated with a single 0x00. A receiver that loses or corrupts a byte is
+back in sync at the next 0x00, i.e. within one frame. The firmware side
+lives in src/proto_comms.cpp and must stay byte-compatible with this file.
+"""
+import logging
+import threading
+import time
+from tracing import LatencyHistogram
+
+FRAME_DELIMITER = 0x00
+MAX_PAYLOAD = 128  # Matches proto_comms::buffer on the Arduino
+
+
+def _make_crc16_table():
+    table = []
+    for byte in range(256):
+        crc = byte << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x1021) if crc & 0x8000 else (crc << 1)
+        table.append(crc & 0xFFFF)
+    return tuple(table)
+
+
+_CRC16_TABLE = _make_crc16_table()
+
+
+def crc16(data):
+    crc = 0xFFFF
+    table = _CRC16_TABLE
+    for byte in data:
+        crc = ((crc << 8) & 0xFFFF) ^ table[(crc >> 8) ^ byte]
+    return crc
+
+
+def cobs_encode(data):
+    out = bytearray(len(data) + len(data) // 254 + 2)
+    code_pos = 0
+    write = 1
+    code = 1
+    for byte in data:
+        if byte == 0:
+            out[code_pos] = code
+            code = 1
+            code_pos = write
+            write += 1
+        else:
+            out[write] = byte
+            write += 1
+            code += 1
+            if code == 0xFF:
+                out[code_pos] = code
+                code = 1
+                code_pos = write
+                write += 1
+    out[code_pos] = code
+    return bytes(out[:write])
+
+
+def cobs_decode(data):
+    """Decodes one COBS block (without delimiter). Raises ValueError if malformed."""
+    out = bytearray()
+    read = 0
+    length = len(data)
+    while read < length:
+        code = data[read]
+        read += 1
+        if code == 0 or read + code - 1 > length:
+            raise ValueError("Malformed COBS frame")
+        out += data[read:read + code - 1]
+        read += code - 1
+        if code != 0xFF and read < length:
+            out.append(0)
+    return bytes(out)
+
+
+def encode_frame(payload):
+    """Wraps a serialized protobuf for the wire: COBS(payload + CRC16) + 0x00."""
+    body = bytes(payload) + crc16(payload).to_bytes(2, 'big')
+    return cobs_encode(body) + b'\x00'
+
+
+class FrameDecoder:
+    """
+    Incremental decoder for the framed serial protocol. Feed it whatever
+    bytes arrive; it returns the payloads of every complete, CRC-valid
+    frame. Bad frames are counted and skipped, never fatal.
+    """
+
+    def __init__(self, max_payload=MAX_PAYLOAD):
+        # COBS adds one byte per 254 plus one; the CRC adds two.
+        self.max_frame = max_payload + 2 + (max_payload + 2) // 254 + 1
+        self._pending = bytearray()
+        self._overflow = False
+        self.bytes_received = 0
+        self.frames = 0
+        self.crc_errors = 0
+        self.resyncs = 0
+        self.bytes_discarded = 0
+
+    def feed(self, data):
+        payloads = []
+        pending = self._pending
+        self.bytes_received += len(data)
+        start = 0
+        while True:
+            end = data.find(FRAME_DELIMITER, start)
+            if end < 0:
+                self._append(data[start:])
+                break
+            self._append(data[start:end])
+            if self._overflow:
+                self._resync(len(pending))
+            elif pending:
+                payload = self._decode(pending)
+                if payload is not None:
+                    payloads.append(payload)
+            pending.clear()
+            self._overflow = False
+            start = end + 1
+        return payloads
+
+    def _append(self, chunk):
+        if self._overflow:
+            self.bytes_discarded += len(chunk)
+            return
+        self._pending += chunk
+        if len(self._pending) > self.max_frame:
+            # No delimiter where one must have been: drop until the next 0x00.
+            self._overflow = True
+            self.bytes_discarded += len(self._pending)
+            self._pending.clear()
+
+    def _resync(self, discarded):
+        self.resyncs += 1
+        self.bytes_discarded += discarded
+        logging.debug("Serial link resync (%d resyncs so far).", self.resyncs)
+
+    def _decode(self, frame):
+        try:
+            body = cobs_decode(frame)
+        except ValueError:
+            self._resync(len(frame))
+            return None
+        if len(body) < 3:
+            self._resync(len(frame))
+            return None
+        payload, received_crc = body[:-2], int.from_bytes(body[-2:], 'big')
+        if crc16(payload) != received_crc:
+            self.crc_errors += 1
+            self.bytes_discarded += len(frame)
+            return None
+        self.frames += 1
+        return payload
+
+
+class SerialWriter:
+    """
+    Writes frames to a serial port from a dedicated thread so a stalled
+    USB-CDC port never blocks the caller. There is a single pending slot:
+    submitting a new frame supersedes an older one that has not been
+    written yet, which is what we want for steering/throttle setpoints.
+    """
+
+    def __init__(self, ser, name="serial"):
+        self.ser = ser
+        self.name = name
+        self._cond = threading.Condition()
+        self._pending = None
+        self._is_stopped = False
+        self.writes = 0
+        self.superseded = 0
+        self.errors = 0
+        self.last_latency = 0.0
+        self.max_latency = 0.0
+        self._total_latency = 0.0
+        self.latency = LatencyHistogram()  # Submit to write() returning, per written frame
+        self._thread = threading.Thread(target=self._run, name=f"{name}-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, frame):
+        """Queues a frame for writing and returns immediately."""
+        with self._cond:
+            if self._pending is not None:
+                self.superseded += 1
+            self._pending = (frame, time.monotonic())
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._pending is None and not self._is_stopped:
+                    self._cond.wait()
+                if self._is_stopped:
+                    return
+                frame, submitted = self._pending
+                self._pending = None
+            try:
+                self.ser.write(frame)
+            except Exception as e:
+                self.errors += 1
+                logging.error(f"{self.name} serial write error: {e}")
+                continue
+            latency = time.monotonic() - submitted
+            self.writes += 1
+            self.last_latency = latency
+            self._total_latency += latency
+            self.latency.observe(latency)
+            if latency > self.max_latency:
+                self.max_latency = latency
+
+    @property
+    def mean_latency(self):
+        return self._total_latency / self.writes if self.writes else 0.0
+
+    def stop(self):
+        with self._cond:
+            self._is_stopped = True
+            self._cond.notify()
+        self._thread.join(timeout=1)
+        logging.info(f"{self.name} writer stopped. Writes: {self.writes}, superseded: {self.superseded}, "
+                     f"errors: {self.errors}, latency mean/max: {self.mean_latency * 1000:.1f}/{self.max_latency * 1000:.1f} ms")
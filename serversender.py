@@ -1,89 +1,54 @@
-import asyncio
-import json
 import logging
-import os
 import time
-import uuid
-from fractions import Fraction
-from aiortc import RTCPeerConnection, RTCSessionDescription, RTCDataChannel
-from aiortc.contrib.media import MediaStreamTrack, MediaStreamError
-from av import VideoFrame
-from aiohttp import web
-import cv2
 import threading
 import serial
 import robot_messages_pb2
-from collections import deque
-import struct
-import pynmea2
-from datetime import datetime, date
-
-ROOT = os.path.dirname(__file__)
-HOST = "0.0.0.0"
-PORT = 8080
-logging.basicConfig(level=logging.INFO)
-connections = {}
-serial_queue = deque(maxlen=100)
+from serial_link import FrameDecoder, SerialWriter, encode_frame
+from nmea import NmeaReader
+from alignment import SampleHistory, GPS_MAX_AGE_NS
+from witmotion import WitMotionParser, ACCELERATION, ANGULAR_VELOCITY
+from telemetry import MSG_SENSOR, MSG_STATUS
+from logutil import setup_logging, AggregatedLog
+from metrics import serial_metrics, serial_writer_metrics
+from webapp import RobotServer
+
+GPS_PORT = '/dev/ttyACM1'
+ARDUINO_PORT = '/dev/ttyACM0'
+WITMOTION_PORT = '/dev/ttyUSB0'
+setup_logging()
 
 class GpsHandler:
-    def __init__(self):
-        self.ser = serial.Serial('/dev/ttyACM1', 115200, timeout=0.5)  # Adjust port/baudrate
+    """
+    Reads NMEA from the GPS receiver. GGA supplies position and altitude,
+    RMC/VTG supply speed and course; each fix carries the monotonic time
+    (received_ns) at which it came off the wire.
+    """
+    def __init__(self, port=GPS_PORT):
+        self.ser = serial.Serial(port, 115200, timeout=0.5)  # Adjust port/baudrate
         self.ser.reset_input_buffer()
-        self.latest_gps = {"lat": 0.0, "lon": 0.0, "alt": 0.0, "timestamp": 0.0}
+        self.latest_gps = {"lat": 0.0, "lon": 0.0, "alt": 0.0, "timestamp": 0.0, "received_ns": 0}
+        self.reader = NmeaReader()
+        self.history = SampleHistory()
         self.lock = threading.Lock()
         self._is_stopped = threading.Event()
         self._thread = threading.Thread(target=self._read_gps, daemon=True)
-        self._packet_count = 0
-        self._start_time = time.time()
-        self._last_rate_log = self._start_time
+        self._fix_log = AggregatedLog("gps_fix")
         self._thread.start()
 
-    def _utc_to_epoch(self, utc_time, date_source=None):
-        if utc_time is None:
-            return time.time()
-        current_date = date_source or date.today()
-        try:
-            dt = datetime.combine(current_date, utc_time)
-            return dt.timestamp()
-        except Exception as e:
-            logging.warning(f"Failed to convert UTC to epoch: {e}, using system time")
-            return time.time()
-
     def _read_gps(self):
         logging.info("GPS reader thread started.")
-        buffer = b''
-        last_date = None
         while not self._is_stopped.is_set():
             try:
-                buffer += self.ser.read(self.ser.in_waiting or 1)
-                lines = buffer.split(b'\n')
-                buffer = lines[-1] if lines else b''
-                for line in lines[:-1]:
-                    line = line.decode('ascii', errors='ignore').strip()
-                    if line.startswith('$'):
-                        try:
-                            msg = pynmea2.parse(line)
-                            if isinstance(msg, pynmea2.types.GGA):
-                                with self.lock:
-                                    self.latest_gps = {
-                                        "lat": msg.latitude if msg.latitude else 0.0,
-                                        "lon": msg.longitude if msg.longitude else 0.0,
-                                        "alt": msg.altitude if msg.altitude else 0.0,
-                                        "timestamp": self._utc_to_epoch(msg.timestamp, last_date)
-                                    }
-                                    self._packet_count += 1
-                                    logging.info(f"GPS Data: Epoch={self.latest_gps['timestamp']:.3f}s, "
-                                                f"Lat={self.latest_gps['lat']:.6f}, Lon={self.latest_gps['lon']:.6f}, "
-                                                f"Alt={self.latest_gps['alt']:.1f}m, Satellites={msg.num_sats}")
-                            elif isinstance(msg, pynmea2.types.RMC):
-                                last_date = msg.datestamp
-                        except pynmea2.ParseError:
-                            logging.warning(f"Failed to parse NMEA sentence: {line}")
-                current_time = time.time()
-                if current_time - self._last_rate_log >= 5:
-                    rate = self._packet_count / (current_time - self._start_time) if (current_time - self._start_time) > 0 else 0
-                    logging.info(f"Average GPS data rate: {rate:.2f} Hz, Packets: {self._packet_count}")
-                    self._last_rate_log = current_time
+                for update in self.reader.feed(self.ser.read(self.ser.in_waiting or 1)):
+                    with self.lock:
+                        is_position = update.pop("type") == "GGA"
+                        self.latest_gps.update(update)
+                        if is_position:
+                            self.history.append(update["received_ns"], self.latest_gps.copy())
+                    if is_position:
+                        self._fix_log.count(sats=update["num_sats"], checksum_errors=self.reader.checksum_errors,
+                                            parse_errors=self.reader.parse_errors)
+                    logging.debug("GPS update: %s", update)
             except Exception as e:
                 logging.warning(f"GPS serial read error: {e}")
                 time.sleep(0.1)
@@ -98,42 +63,29 @@ class GpsHandler:
         self.ser.close()
         logging.info("GPS handler stopped")
 
-def parse_data(frame):
-    """Parses a 11-byte data frame from the WitMotion sensor."""
-    if len(frame) != 11 or frame[0] != 0x55:
-        return None
-    checksum_calculated = sum(frame[0:10]) & 0xff
-    if checksum_calculated != frame[10]:
-        return None # Checksum failed
-    data_type = frame[1]
-    raw_data = struct.unpack('<hhhh', frame[2:10])
-    if data_type == 0x51:
-        acc_x = (raw_data[0] / 32768.0) * 16
-        acc_y = (raw_data[1] / 32768.0) * 16
-        acc_z = (raw_data[2] / 32768.0) * 16
-        return "Acceleration", {"accel_x": acc_x, "accel_y": acc_y, "accel_z": acc_z}
-    elif data_type == 0x52:
-        gyro_x = (raw_data[0] / 32768.0) * 2000
-        gyro_y = (raw_data[1] / 32768.0) * 2000
-        gyro_z = (raw_data[2] / 32768.0) * 2000
-        return "Angular Velocity", {"gyro_x": gyro_x, "gyro_y": gyro_y, "gyro_z": gyro_z}
-    elif data_type == 0x53:
-        roll = (raw_data[0] / 32768.0) * 180
-        pitch = (raw_data[1] / 32768.0) * 180
-        yaw = (raw_data[2] / 32768.0) * 180
-        return "Angle", {"roll": roll, "pitch": pitch, "yaw": yaw}
-    return None
-
 # =======================================================
 #    CORRECTED ARDUINO HANDLER (Use this in your Python)
 # =======================================================
 class ArduinoHandler:
-    """A dedicated handler using efficient blocking reads."""
-    def __init__(self, data_queue):
+    """
+    A dedicated handler using efficient blocking reads. RobotStatus payloads
+    are forwarded to the telemetry hub as received (the link CRC already
+    guarantees integrity); set validate=True to also reject payloads that do
+    not parse as RobotStatus. Fields are only decoded on demand through
+    get_latest_status().
+    """
+    def __init__(self, telemetry_hub, validate=False, port=ARDUINO_PORT):
         # IMPORTANT: Double-check this device name!
-        self.ser = serial.Serial('/dev/ttyACM0', 115200, timeout=.2)
+        self.ser = serial.Serial(port, 115200, timeout=.2, write_timeout=.5)
         self.ser.flushInput()
-        self.data_queue = data_queue
+        self.telemetry_hub = telemetry_hub
+        self.decoder = FrameDecoder()
+        self.writer = SerialWriter(self.ser, name="Arduino")
+        self.validate = validate
+        self.invalid_payloads = 0
+        self._status_log = AggregatedLog("robot_status")
+        self._latest_status = None
+        self._latest_decoded = None
         self._is_stopped = threading.Event()
         self._thread = threading.Thread(target=self._read_serial, daemon=True)
         self._thread.start()
@@ -143,26 +95,22 @@ class ArduinoHandler:
         logging.info("Arduino reader thread started (using blocking reads).")
         while not self._is_stopped.is_set():
             try:
-                # This is the key change. self.ser.read(2) will now WAIT
-                # for 2 bytes to arrive, using almost no CPU.
-                length_bytes = self.ser.read(2)
-                
-                # If read(2) returns after the timeout, it will be empty.
-                if len(length_bytes) == 2:
-                    length = int.from_bytes(length_bytes, 'big')
-                    if 0 < length <= 128:
-                        # Now read the full message payload
-                        data = self.ser.read(length)
-                        if len(data) == length:
-                            msg = robot_messages_pb2.RobotStatus()
-                            msg.ParseFromString(data)
-                            self.data_queue.append(msg.SerializeToString())
-                            logging.info(f"Queued RobotStatus message. Queue size: {len(self.data_queue)}")
-                        else:
-                            logging.warning("Arduino incomplete data read (timeout).")
-                    else:
-                        logging.warning(f"Arduino invalid length received: {length}")
-                
+                # Blocks for at least one byte (up to the port timeout), then
+                # takes whatever else has already arrived.
+                chunk = self.ser.read(self.ser.in_waiting or 1)
+                if not chunk:
+                    continue
+                read_ns = time.monotonic_ns()
+                payloads = self.decoder.feed(chunk)
+                parse_ns = time.monotonic_ns()
+                for data in payloads:
+                    if self.validate and not self._is_valid_status(data):
+                        self.invalid_payloads += 1
+                        continue
+                    self._latest_status = data
+                    self.telemetry_hub.publish(MSG_STATUS, data, read_ns, parse_ns)
+                    self._status_log.count(subscribers=self.telemetry_hub.subscriber_count,
+                                           crc_errors=self.decoder.crc_errors)
             except serial.SerialException as e:
                 logging.error(f"Arduino serial port error: {e}")
                 time.sleep(2) # Wait before trying to read again
@@ -170,31 +118,48 @@ class ArduinoHandler:
                 logging.warning(f"Arduino read thread error: {e}")
                 time.sleep(1)
 
-    def send_command(self, cmd):
-        """Sends a command protobuf to the Arduino."""
+    @staticmethod
+    def _is_valid_status(data):
         try:
-            encoded = cmd.SerializeToString()
-            length = len(encoded)
-            self.ser.write(length.to_bytes(2, 'big') + encoded)
-        except Exception as e:
-            logging.error(f"Arduino serial write error: {e}")
+            robot_messages_pb2.RobotStatus.FromString(data)
+        except Exception:
+            return False
+        return True
+
+    def get_latest_status(self):
+        """Decodes the most recent RobotStatus on demand. Returns None until one arrives."""
+        data = self._latest_status
+        if data is None:
+            return None
+        decoded = self._latest_decoded
+        if decoded is None or decoded[0] is not data:
+            decoded = (data, robot_messages_pb2.RobotStatus.FromString(data))
+            self._latest_decoded = decoded
+        return decoded[1]
+
+    def send_command(self, cmd):
+        """Hands a command protobuf to the writer thread; never blocks the event loop."""
+        self.writer.submit(encode_frame(cmd.SerializeToString()))
 
     def stop(self):
-        """Cleanly stops the thread and closes the serial port."""
+        """Cleanly stops the threads and closes the serial port."""
         self._is_stopped.set()
         self._thread.join(timeout=1)
+        self.writer.stop()
         self.ser.close()
-        logging.info("Arduino handler stopped.")
+        logging.info(f"Arduino handler stopped. Frames: {self.decoder.frames}, CRC errors: {self.decoder.crc_errors}, resyncs: {self.decoder.resyncs}")
 
 class SensorHandler:
-    def __init__(self, data_queue, gps_handler):
-        self.witmotion_ser = serial.Serial('/dev/ttyUSB0', 115200, timeout=.2)
+    def __init__(self, telemetry_hub, gps_history, port=WITMOTION_PORT):
+        self.witmotion_ser = serial.Serial(port, 115200, timeout=.2)
         self.witmotion_ser.reset_input_buffer()
-        self.data_queue = data_queue
+        self.telemetry_hub = telemetry_hub
         self.current_sequence_state = {}
-        self.gps_handler = gps_handler
+        self.gps_history = gps_history
         self.packet_timestamps = {}
-        self.received_since_last_send = set()
+        self.parser = WitMotionParser()
+        self.sequence = 0
+        self.stale_gps_samples = 0
         self.lock = threading.Lock()
         self._is_stopped = threading.Event()
         self._sensor_thread = threading.Thread(target=self._read_witwotion_serial, daemon=True)
@@ -203,260 +168,109 @@ class SensorHandler:
     def _read_witwotion_serial(self):
         """Producer thread: Reads 11-byte packets from the WitMotion sensor."""
         logging.info("WitMotion reader thread started.")
-        buffer = b''
+        parser = self.parser
         while not self._is_stopped.is_set():
             try:
-                buffer += self.witmotion_ser.read(self.witmotion_ser.in_waiting or 1)
-                start_index = buffer.find(b'\x55')
-                
-                if start_index != -1 and len(buffer) >= start_index + 11:
-                    frame = buffer[start_index : start_index + 11]
-                    buffer = buffer[start_index + 11:]
-                    
-                    parsed_result = parse_data(frame) 
-                    if parsed_result:
-                        data_type_name, values = parsed_result
-                        # logging.info(f"Received WitMotion packet: {data_type_name}, values={values}")
-                        # sensor_pb = robot_messages_pb2.SensorData()
-                        with self.lock:
-                            self.current_sequence_state.update(values)
-                            self.packet_timestamps[data_type_name] = time.time()
-                            self.received_since_last_send.add(data_type_name)
-                            if len(self.received_since_last_send) == 3:
-                                sensor_pb = robot_messages_pb2.SensorData()
-                                avg_timestamp = sum(self.packet_timestamps.values()) / 3.0
-                                sensor_pb.sequence = 1 
-                                sensor_pb.timestamp = avg_timestamp
-                                state = self.current_sequence_state
-                                sensor_pb.imu.accel_x = state.get('accel_x', 0.0)
-                                sensor_pb.imu.accel_y = state.get('accel_y', 0.0)
-                                sensor_pb.imu.accel_z = state.get('accel_z', 0.0)
-                                sensor_pb.imu.gyro_x = state.get('gyro_x', 0.0)
-                                sensor_pb.imu.gyro_y = state.get('gyro_y', 0.0)
-                                sensor_pb.imu.gyro_z = state.get('gyro_z', 0.0)
-                                gps_data = self.gps_handler.get_latest_gps()
-                                sensor_pb.gps.lat = gps_data['lat']
-                                sensor_pb.gps.lon = gps_data['lon']
-                                sensor_pb.gps.alt = gps_data['alt']
-                                # sensor_pb.gps.timestamp = gps_data['timestamp']
-                                # sensor_pb.gps.alt = state.get('yaw', 0.0)
-                                self.data_queue.append(sensor_pb.SerializeToString())
-                                self.received_since_last_send.clear()
-                                self.packet_timestamps.clear()
-                                # logging.info(f"Added to serial_queue, size: {len(self.data_queue)}")
+                parser.read_from(self.witmotion_ser)
+                received_ns = time.monotonic_ns()
+                for data_type, x, y, z in parser.frames():
+                    with self.lock:
+                        self.current_sequence_state[data_type] = (x, y, z)
+                        self.packet_timestamps[data_type] = received_ns
+                        if len(self.packet_timestamps) == 3:
+                            self._publish_sample()
             except Exception as e:
                 logging.warning(f"WitMotion serial read error: {e}")
                 time.sleep(1)
+
+    def _publish_sample(self):
+        """
+        Combines the latest acceleration/gyro/angle frames into one SensorData,
+        with GPS estimated at the IMU sample time. Called under lock.
+        """
+        sensor_pb = robot_messages_pb2.SensorData()
+        sample_ns = sum(self.packet_timestamps.values()) // 3
+        self.sequence += 1
+        sensor_pb.sequence = self.sequence & 0xFFFFFFFF
+        sensor_pb.timestamp_ns = sample_ns + time.time_ns() - time.monotonic_ns()
+        state = self.current_sequence_state
+        sensor_pb.imu.accel_x, sensor_pb.imu.accel_y, sensor_pb.imu.accel_z = state[ACCELERATION]
+        sensor_pb.imu.gyro_x, sensor_pb.imu.gyro_y, sensor_pb.imu.gyro_z = state[ANGULAR_VELOCITY]
+        # Samples go out as they are read, so the next fix has not arrived yet:
+        # GPS is extrapolated from the last two fixes rather than held back.
+        gps_data, gps_age_ns, extrapolated = self.gps_history.estimate(sample_ns, ("lat", "lon", "alt"),
+                                                                       GPS_MAX_AGE_NS)
+        if gps_data is not None:
+            sensor_pb.gps.lat = gps_data['lat']
+            sensor_pb.gps.lon = gps_data['lon']
+            sensor_pb.gps.alt = gps_data['alt']
+            sensor_pb.gps_age_ms = gps_age_ns / 1e6
+            sensor_pb.gps_extrapolated = extrapolated
+        else:
+            self.stale_gps_samples += 1
+        parse_ns = time.monotonic_ns()
+        sensor_pb.latency_ms = (parse_ns - sample_ns) / 1e6
+        read_ns = max(self.packet_timestamps.values())
+        self.telemetry_hub.publish(MSG_SENSOR, sensor_pb.SerializeToString(), read_ns, parse_ns)
+        self.packet_timestamps.clear()
+
     def stop(self):
         self._is_stopped.set()
         self._sensor_thread.join(timeout=1)
         self.witmotion_ser.close()
-    
-    def send_command(self, cmd):
-        """Sends a command protobuf to the Arduino."""
-        try:
-            encoded = cmd.SerializeToString()
-            length = len(encoded)
-            # self.ser.write(length.to_bytes(2, 'big') + encoded)
-        except Exception as e:
-            logging.error(f"Arduino serial write error: {e}")
-class RobustPiCameraTrack(MediaStreamTrack):
+
+class DeviceManager:
     """
-    A more robust video track that includes a startup health check
-    and dedicated thread management for frame reading.
+    Owns the serial devices and their reader threads for the life of the
+    process. Created once at startup; peers only attach to the telemetry
+    hub and send commands through `arduino`. A device that fails to open is
+    logged and left as None so the others keep working.
     """
-    kind = "video"
-
-    def __init__(self):
-        super().__init__()
-        self.cap = None
-        self._frame = None
-        self._is_stopped = threading.Event()
-        self._thread = None
-        self.is_healthy = False
-        self._start_time = time.time()
+    def __init__(self, telemetry_hub):
+        self.telemetry_hub = telemetry_hub
+        self.gps = None
+        self.arduino = None
+        self.sensors = None
 
     def start(self):
-        """Initializes the camera and starts the background reading thread."""
-        logging.info("ROBUST: Attempting to open camera...")
-        pipeline = ("libcamerasrc ! video/x-raw,format=NV12,width=640,height=480,framerate=30/1 ! appsink drop=true")
-        self.cap = cv2.VideoCapture(pipeline, cv2.CAP_GSTREAMER)
-        
-        if not self.cap.isOpened():
-            logging.error("ROBUST: Camera failed to open at cv2.VideoCapture.")
-            return
-
-        # --- Health Check ---
-        # Try to read the first frame to confirm the pipeline is actually working.
-        ret, frame = self.cap.read()
-        if not ret or frame is None:
-            logging.error("ROBUST: Health check FAILED. Could not read the first frame.")
-            self.cap.release()
-            self.cap = None
-            return
-
-        logging.info("ROBUST: Health check PASSED. First frame read successfully.")
-        self._frame = frame
-        self.is_healthy = True
-        
-        # Start the dedicated reader thread
-        self._thread = threading.Thread(target=self._read_frames, daemon=True)
-        self._thread.start()
-
-    def _read_frames(self):
-        """The function that runs in the background to continuously read frames."""
-        while not self._is_stopped.is_set():
-            if self.cap.isOpened():
-                ret, frame = self.cap.read()
-                if ret:
-                    self._frame = frame
-                else:
-                    logging.warning("ROBUST: Reader thread failed to read frame.")
-                    # Allow a small sleep to prevent busy-looping on error
-                    time.sleep(0.01)
-            else:
-                break
-        logging.info("ROBUST: Reader thread has stopped.")
-    
-    async def recv(self):
-        """Called by aiortc to get the next frame."""
-        if self._is_stopped.is_set():
-            raise MediaStreamError
-
-        # If the camera isn't healthy, send black frames
-        if not self.is_healthy or self._frame is None:
-            logging.warning("ROBUST: Sending black frame because camera is not healthy.")
-            black_frame = VideoFrame(width=640, height=480)
-            await asyncio.sleep(1/30) # Maintain framerate
-            return black_frame
-
-        # Wait for a new frame from the reader thread
-        # This is a simplified approach; a more complex one would use an asyncio.Queue
-        # but for now we'll just use the latest available frame.
-        current_frame = self._frame
-
-        frame = VideoFrame.from_ndarray(current_frame, format="nv12")
-        
-        # This PTS logic is simple but effective for this test
-        pts = int((time.time() - self._start_time) * 90000)
-        frame.pts = pts
-        frame.time_base = Fraction(1, 90000)
-
-        await asyncio.sleep(1 / 30) # Regulate framerate
-        return frame
-
-    def stop(self):
-        """Signals the reader thread to stop and releases resources."""
-        if not self._is_stopped.is_set():
-            logging.info("ROBUST: Stopping camera track...")
-            self._is_stopped.set()
-            if self._thread:
-                self._thread.join(timeout=1) # Wait for the thread to exit
-            if self.cap:
-                self.cap.release()
-            logging.info("ROBUST: Camera track fully stopped.")
-
-async def index(request):
-    content = open(os.path.join(ROOT, "index_html.html"), "r").read()
-    return web.Response(content_type="text/html", text=content)
-
-
-async def javascript(request):
-    content = open(os.path.join(ROOT, "client_direct.js"), "r").read()
-    return web.Response(content_type="application/javascript", text=content)
-
-
-async def offer(request):
-    params = await request.json()
-    offer = RTCSessionDescription(sdp=params["sdp"], type=params["type"])
-    pc = RTCPeerConnection()
-    pc_id = f"pc-{uuid.uuid4()}"
-    video_track = RobustPiCameraTrack()
-    video_track.start()
-    gps_handler = GpsHandler()
-    arduino_handler = ArduinoHandler(serial_queue)
-    serial_handler = SensorHandler(serial_queue, gps_handler)
-    data_channel = pc.createDataChannel("protobuf", ordered=False, maxRetransmits=0)
-    connections[pc_id] = (pc, video_track, serial_handler, arduino_handler)
-
-    @data_channel.on("message")
-    def on_message(message):
-        try:
-            cmd = robot_messages_pb2.Command()
-            cmd.ParseFromString(message)
-            arduino_handler.send_command(cmd)
-            # serial_handler.send_command(cmd)
-            logging.info(f"Received Command: type={cmd.steering}, value={cmd.throttle:.2f}")
-        except Exception as e:
-            logging.error(f"Data channel error on message receive: {e}")
-
-    @pc.on("connectionstatechange")
-    async def on_connectionstatechange():
-        logging.info(f"Connection state is {pc.connectionState}")
-        if pc.connectionState in ("failed", "closed", "disconnected"):
-            if pc_id in connections:
-                pc_ref, track_ref, serial_ref, arduino_ref = connections.pop(pc_id)
-                track_ref.stop()
-                serial_ref.stop()
-                arduino_ref.stop()
-                await pc_ref.close()
-                logging.info(f"Closed and cleaned up connection {pc_id}")
-
-    async def send_sensor_data_after_open():
-        logging.info("Waiting for data channel to open...")
-        opened = asyncio.Future()
-
-        @data_channel.on("open")
-        def on_open():
-            logging.info("Data channel opened!")
-            if not opened.done():
-                opened.set_result(True)
-
+        """Opens every device. Blocking; run it off the event loop."""
+        self.gps = self._open("GPS", GpsHandler)
+        self.arduino = self._open("Arduino", ArduinoHandler, self.telemetry_hub)
+        # Without a GPS the IMU samples go out with no fix attached.
+        gps_history = self.gps.history if self.gps is not None else SampleHistory()
+        self.sensors = self._open("WitMotion", SensorHandler, self.telemetry_hub, gps_history)
+
+    @staticmethod
+    def _open(name, handler_class, *args):
         try:
-            await asyncio.wait_for(opened, timeout=15.0)
-        except asyncio.TimeoutError:
-            logging.error("Data channel did not open within 15 seconds")
-            return
+            return handler_class(*args)
+        except (serial.SerialException, OSError) as e:
+            logging.error(f"{name} device unavailable: {e}")
+            return None
 
-        logging.info("Sending sensor data...")
-        while pc.connectionState == "connected":
-            if serial_queue:
-                data = serial_queue.popleft()
-                try:
-                    data_channel.send(data)
-                    # logging.info(f"Sent SensorData to data channel, queue size: {len(serial_queue)}")
-                except Exception as e:
-                    logging.warning(f"Data channel send error: {e}")
-                    break
-            else:
-                logging.debug("serial_queue empty")
-            await asyncio.sleep(0.001)
-
-    start_time = time.time()
-    pc.addTrack(video_track)
-    await pc.setRemoteDescription(offer)
-    answer = await pc.createAnswer()
-    await pc.setLocalDescription(answer)
-    logging.info(f"WebRTC setup took {time.time() - start_time:.2f}s")
-    asyncio.create_task(send_sensor_data_after_open())
-
-    return web.Response(
-        content_type="application/json",
-        text=json.dumps({"sdp": pc.localDescription.sdp, "type": pc.localDescription.type})
-    )
-
-async def on_shutdown(app):
-    for pc, track, serial_handler in list(connections.values()):
-        track.stop()
-        serial_handler.stop()
-        arduino_handler.stop()
-        await pc.close()
-    connections.clear()
+    def send_command(self, cmd):
+        if self.arduino is not None:
+            self.arduino.send_command(cmd)
 
-app = web.Application()
-app.on_shutdown.append(on_shutdown)
-app.router.add_get("/", index)
-app.router.add_get("/client_direct.js", javascript)
-app.router.add_post("/offer", offer)
-app.router.add_static("/public", ROOT)
-web.run_app(app, host=HOST, port=PORT)
\ No newline at end of file
+    def stop(self):
+        for handler in (self.sensors, self.arduino, self.gps):
+            if handler is not None:
+                handler.stop()
+
+    def collect(self):
+        """Metric families for every open device."""
+        if self.arduino is not None:
+            decoder = self.arduino.decoder
+            yield from serial_metrics(self.arduino.ser.port, decoder.bytes_received, decoder.frames, decoder.crc_errors)
+            yield from serial_writer_metrics(self.arduino.writer, self.arduino.ser.port)
+        if self.sensors is not None:
+            parser = self.sensors.parser
+            yield from serial_metrics(self.sensors.witmotion_ser.port, parser.bytes_received,
+                                      parser.frames_parsed, parser.checksum_errors)
+        if self.gps is not None:
+            reader = self.gps.reader
+            yield from serial_metrics(self.gps.ser.port, reader.bytes_received, reader.parsed, reader.checksum_errors)
+
+server = RobotServer()
+server.set_devices(DeviceManager(server.telemetry_hub))
+server.run()
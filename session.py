@@ -0,0 +1,310 @@
+"""
+Viewer sessions that outlive their peer connections.
+
+A Session owns what a viewer builds up over time: its camera relay track,
+its telemetry subscription and sender, and its quality adaptation. The
+RTCPeerConnection that carries them can be replaced. After a Wi-Fi roam
+breaks ICE, the browser sends a new offer for the same session (usually
+over the signaling WebSocket). The session then moves onto a fresh,
+pre-warmed connection instead of being torn down and rebuilt.
+
+aiortc cannot restart ICE on an existing connection, so an ICE restart
+here means a new connection that carries the same state. An offer from
+the connection the session already has (same ICE ufrag) is renegotiated
+in place.
+"""
+import asyncio
+import logging
+import time
+import uuid
+from aiortc import RTCSessionDescription
+from aiortc.contrib.media import MediaStreamTrack, MediaStreamError
+from aiortc.sdp import SessionDescription
+import robot_messages_pb2
+from adaptation import poll_feedback
+from h264 import prefer_h264, forward_keyframe_requests
+from signaling import end_of_candidates, parse_candidate
+
+SESSION_RESUME_TIMEOUT = 30.0  # Seconds a session without a working connection waits to be resumed
+ICE_FAILURE_TIMEOUT = 5.0  # Seconds after the browser's end-of-candidates for ICE to connect before giving up
+
+
+def _ice_ufrag(sdp):
+    for media in SessionDescription.parse(sdp).media:
+        if media.ice is not None and media.ice.usernameFragment:
+            return media.ice.usernameFragment
+    return None
+
+
+class ConnectionTrack(MediaStreamTrack):
+    """
+    What one connection's RTP sender pulls frames from. aiortc stops a
+    sender's track when the connection fails or closes; stopping this one
+    only detaches that connection and leaves the session's track running
+    for the next one. The connections of a session take turns through
+    `lock`, so while one replaces another the session's track still has
+    a single consumer.
+    """
+    kind = "video"
+
+    def __init__(self, track, lock):
+        super().__init__()
+        self.track = track
+        self.lock = lock
+
+    async def recv(self):
+        async with self.lock:
+            if self.readyState != "live":
+                raise MediaStreamError
+            return await self.track.recv()
+
+
+class Session:
+    """
+    One viewer's state, independent of the connection carrying it. Created
+    by SessionManager; `id` is the pc_id the signaling endpoints take.
+    """
+
+    def __init__(self, session_id, video_track, telemetry_sender, adaptation, on_command=None, video_mode="raw"):
+        self.id = session_id
+        self.video_track = video_track
+        self.telemetry_sender = telemetry_sender
+        self.adaptation = adaptation
+        adaptation.on_change = self._apply_quality
+        self.on_command = on_command
+        self.video_mode = video_mode
+        self.manager = None
+        self.pc = None
+        self.video_sender = None
+        self._connection_track = None
+        self._recv_lock = asyncio.Lock()
+        self.closed = False
+        self._remote_ufrag = None
+        self._timer = None
+        self._expiry = None
+        self._ice_deadline = None
+
+    def _apply_quality(self, step):
+        # The track scales its frames, or retunes the passthrough encoder.
+        self.video_track.set_quality(step)
+
+    async def negotiate(self, offer, timer):
+        """
+        Applies a browser offer and returns our local description, which
+        carries all of our candidates. Any offer from a connection other
+        than the current one moves the session onto a new connection.
+        """
+        self._timer = timer
+        ufrag = _ice_ufrag(offer.sdp)
+        warm_peer = None
+        if self.pc is None or ufrag != self._remote_ufrag:
+            warm_peer = self.manager.prewarmer.take()
+            self._attach(warm_peer)
+            self._remote_ufrag = ufrag
+        timer.mark("peer")
+        pc = self.pc
+        await pc.setRemoteDescription(offer)
+        timer.mark("remote_description")
+        answer = await pc.createAnswer()
+        timer.mark("create_answer")
+        if warm_peer is not None:
+            await warm_peer.gathered()
+            timer.mark("gather")
+        await pc.setLocalDescription(answer)
+        timer.mark("local_description")
+        return pc.localDescription
+
+    def _attach(self, warm_peer):
+        previous = self.pc
+        self._cancel_ice_deadline()
+        pc = self.pc = warm_peer.pc
+        self.video_sender = warm_peer.video_sender
+        if self._connection_track is not None:
+            self._connection_track.stop()  # The previous connection gets no more frames
+        self._connection_track = ConnectionTrack(self.video_track, self._recv_lock)
+        self.video_sender.replaceTrack(self._connection_track)
+        if self.video_mode == "h264":
+            prefer_h264(pc)
+            forward_keyframe_requests(self.video_sender, self.video_track)
+        self._apply_quality(self.adaptation.step)
+        asyncio.ensure_future(self._poll_feedback(pc, self.video_sender))
+
+        channel = warm_peer.data_channel
+        channel.on("message", self._on_message)
+
+        @channel.on("open")
+        def on_open():
+            self.telemetry_sender.data_channel = channel
+            asyncio.ensure_future(self._send_telemetry(pc))
+
+        @pc.on("connectionstatechange")
+        async def on_connectionstatechange():
+            await self._on_connection_state(pc)
+
+        if previous is not None:
+            self.manager.resumed += 1
+            logging.info(f"Session {self.id} moving to a new connection.")
+            if self.video_mode == "h264":
+                # The new receiver can only start decoding at a keyframe.
+                self.video_track.resync()
+            asyncio.ensure_future(previous.close())
+
+    async def _on_connection_state(self, pc):
+        if pc is not self.pc:
+            return
+        state = pc.connectionState
+        logging.info(f"Session {self.id}: connection state is {state}")
+        if state == "connected":
+            self._cancel_expiry()
+            self._cancel_ice_deadline()
+            timer, self._timer = self._timer, None
+            if timer is not None:
+                self.manager.setup_stats.observe("connect", timer.mark("connect"))
+                logging.info(f"Peer {self.id} connected {timer.total:.2f}s after its offer ({timer.summary()})")
+        elif state in ("failed", "disconnected", "closed"):
+            # Keep everything for a while; the browser may come back with a new offer.
+            self.schedule_expiry()
+
+    def _on_message(self, message):
+        received_us = time.monotonic_ns() // 1000
+        try:
+            client_msg = robot_messages_pb2.ClientMessage.FromString(message)
+            kind = client_msg.WhichOneof("payload")
+            if kind == "clock_sync":
+                self.telemetry_sender.reply_clock_sync(client_msg.clock_sync, received_us)
+            elif kind == "trace_report":
+                self.telemetry_sender.handle_trace_report(client_msg.trace_report)
+            elif kind == "command":
+                cmd = client_msg.command
+                if self.on_command is not None:
+                    self.on_command(cmd)
+                logging.debug("Received Command: steering=%.2f, throttle=%.2f", cmd.steering, cmd.throttle)
+        except Exception as e:
+            logging.error(f"Data channel error on message receive: {e}")
+
+    async def _send_telemetry(self, pc):
+        logging.info(f"Session {self.id}: data channel open, sending telemetry.")
+        await self.telemetry_sender.run(lambda: self.pc is pc and pc.connectionState == "connected")
+
+    async def _poll_feedback(self, pc, sender):
+        await poll_feedback(sender, self.adaptation,
+                            lambda: self.pc is pc and pc.connectionState not in ("failed", "closed"))
+
+    async def add_candidate(self, params):
+        """
+        Adds a trickled browser candidate to the current connection. After
+        the end-of-candidates marker, a connection that has not connected
+        within ICE_FAILURE_TIMEOUT is closed, which starts the wait for a
+        resume at once instead of after checks that cannot succeed.
+        """
+        pc = self.pc
+        if pc is None:
+            return
+        candidate = parse_candidate(params)
+        if candidate is not None:
+            await pc.addIceCandidate(candidate)
+            return
+        await end_of_candidates(pc)
+        if self._ice_deadline is None and pc is self.pc:
+            self._ice_deadline = asyncio.get_running_loop().call_later(ICE_FAILURE_TIMEOUT, self._ice_timed_out, pc)
+
+    def _cancel_ice_deadline(self):
+        if self._ice_deadline is not None:
+            self._ice_deadline.cancel()
+            self._ice_deadline = None
+
+    def _ice_timed_out(self, pc):
+        self._ice_deadline = None
+        if pc is self.pc and pc.iceConnectionState not in ("connected", "completed"):
+            logging.warning(f"Session {self.id}: ICE did not connect within {ICE_FAILURE_TIMEOUT:.0f}s "
+                            f"of the last browser candidate; closing the connection.")
+            asyncio.ensure_future(pc.close())
+
+    def schedule_expiry(self):
+        if self._expiry is None and not self.closed:
+            self._expiry = asyncio.get_running_loop().call_later(self.manager.resume_timeout, self._expire)
+
+    def _cancel_expiry(self):
+        if self._expiry is not None:
+            self._expiry.cancel()
+            self._expiry = None
+
+    def _expire(self):
+        self._expiry = None
+        self.manager.expired += 1
+        logging.info(f"Session {self.id} was not resumed within {self.manager.resume_timeout:.0f}s.")
+        asyncio.ensure_future(self.close())
+
+    async def close(self):
+        """Releases the track and telemetry subscription and closes the connection."""
+        if self.closed:
+            return
+        self.closed = True
+        self._cancel_expiry()
+        self._cancel_ice_deadline()
+        self.manager.sessions.pop(self.id, None)
+        self.video_track.stop()
+        sender = self.telemetry_sender
+        sender.subscriber.close()
+        if self.pc is not None:
+            await self.pc.close()
+        tracer = sender.subscriber.hub.tracer
+        if tracer is not None:
+            logging.info(tracer.summary())
+        logging.info(f"Closed session {self.id}: messages={sender.messages_sent}, batches={sender.batches_sent}, "
+                     f"bytes={sender.bytes_sent}, dropped={sender.subscriber.dropped}")
+
+
+class SessionManager:
+    """
+    Every signaling path (POST /offer, the WebSocket) goes through this.
+    It creates sessions with `new_session(session_id)`, finds them again
+    when an offer names an existing pc_id, and forgets them when they close.
+    """
+
+    def __init__(self, new_session, prewarmer, setup_stats, resume_timeout=SESSION_RESUME_TIMEOUT):
+        self.new_session = new_session
+        self.prewarmer = prewarmer
+        self.setup_stats = setup_stats
+        self.resume_timeout = resume_timeout
+        self.sessions = {}
+        self.resumed = 0
+        self.expired = 0
+
+    def get(self, session_id):
+        return self.sessions.get(session_id)
+
+    def __iter__(self):
+        return iter(list(self.sessions.values()))
+
+    def __len__(self):
+        return len(self.sessions)
+
+    async def offer(self, params, timer):
+        """
+        Answers an offer ({"sdp", "type"}, optionally "pc_id" to resume).
+        An unknown or expired pc_id starts a new session.
+        Returns (session, answer dict).
+        """
+        session = self.sessions.get(params.get("pc_id"))
+        created = session is None
+        if created:
+            session = self.new_session(f"pc-{uuid.uuid4()}")
+            session.manager = self
+            self.sessions[session.id] = session
+            session.schedule_expiry()  # Until it first connects
+        timer.mark("session")
+        offer = RTCSessionDescription(sdp=params["sdp"], type=params["type"])
+        try:
+            description = await session.negotiate(offer, timer)
+        except Exception:
+            if created:
+                await session.close()
+            raise
+        self.setup_stats.observe_timer(timer)
+        logging.info(f"WebRTC setup took {timer.total:.2f}s ({timer.summary()})")
+        return session, {"sdp": description.sdp, "type": description.type, "pc_id": session.id}
+
+    async def close(self):
+        for session in self:
+            await session.close()
@@ -0,0 +1,240 @@
+"""
+WebRTC connection setup helpers shared by the streaming servers.
+
+Most of a connect used to be spent before any SDP was exchanged: opening
+the camera, opening serial ports and gathering ICE candidates, one after
+the other inside the /offer request. The capture and devices are now
+opened at startup, and PeerPrewarmer keeps a peer connection with its
+candidates already gathered, so an offer only pays for SDP negotiation.
+SetupTimer splits each connect into phases for the log and /metrics.
+
+Trickle ICE only runs from the browser to us: it sends its offer at once
+and its candidates as it finds them. Our answer waits for the WarmPeer to
+finish gathering, which it has usually done long before the offer, so it
+carries every candidate (and end-of-candidates) itself. When no warm peer
+is ready, the one made on the spot gathers host candidates only, which
+takes milliseconds rather than a STUN round trip or timeout. aiortc only starts
+connectivity checks from setLocalDescription(), for transports that have
+candidates by then, so an answer sent before gathering ends could never
+connect without reaching into aiortc's private API.
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from aiortc import RTCConfiguration, RTCPeerConnection
+from aiortc.sdp import candidate_from_sdp
+from tracing import LatencyHistogram
+
+SPARE_MAX_AGE = 60.0  # Seconds before an unused spare is replaced; NAT bindings behind srflx candidates expire
+
+
+def _ice_transports(pc):
+    # RTCRtpSender.transport / RTCSctpTransport.transport -> RTCDtlsTransport,
+    # whose .transport is the RTCIceTransport; all public.
+    transports = {t.sender.transport.transport for t in pc.getTransceivers()}
+    if pc.sctp is not None:
+        transports.add(pc.sctp.transport.transport)
+    return transports
+
+
+def _ice_gatherers(pc):
+    return {transport.iceGatherer for transport in _ice_transports(pc)}
+
+
+def _log_gather_failure(task):
+    if not task.cancelled() and task.exception() is not None:
+        logging.warning(f"ICE gathering failed: {task.exception()}")
+
+
+def parse_candidate(params):
+    """
+    Builds an RTCIceCandidate from a browser's RTCIceCandidate JSON
+    ({"candidate", "sdpMid", "sdpMLineIndex"}). Returns None for the
+    end-of-candidates marker (an empty candidate string).
+    """
+    sdp = params.get("candidate") or ""
+    if not sdp:
+        return None
+    if sdp.startswith("candidate:"):
+        sdp = sdp[len("candidate:"):]
+    candidate = candidate_from_sdp(sdp)
+    candidate.sdpMid = params.get("sdpMid")
+    candidate.sdpMLineIndex = params.get("sdpMLineIndex")
+    return candidate
+
+
+async def end_of_candidates(pc):
+    """
+    Tells the ICE transports still in use that the browser has sent all of
+    its candidates, so checks that have run out fail instead of waiting
+    for more. addIceCandidate() has no form for this; the transports do.
+    """
+    for transport in _ice_transports(pc):
+        await transport.addRemoteCandidate(None)
+
+
+def add_rtcp_listener(sender, listener):
+    """
+    Calls listener(packet) for each RTCP packet an RTCRtpSender receives,
+    before aiortc handles it. aiortc has no public hook for this, so its
+    private packet handler is wrapped, once per sender, and every listener
+    shares that wrapper. This is the only place that depends on it.
+    Returns False, and logs why, if the installed aiortc has no such handler.
+    """
+    listeners = getattr(sender, "_rtcp_listeners", None)
+    if listeners is None:
+        handle_rtcp_packet = getattr(sender, "_handle_rtcp_packet", None)
+        if handle_rtcp_packet is None:
+            logging.warning("RTCRtpSender has no _handle_rtcp_packet in this aiortc version; "
+                            "RTCP feedback such as keyframe requests is ignored.")
+            return False
+        listeners = sender._rtcp_listeners = []
+
+        async def _handle_rtcp_packet(packet):
+            for notify in listeners:
+                notify(packet)
+            await handle_rtcp_packet(packet)
+
+        sender._handle_rtcp_packet = _handle_rtcp_packet
+    listeners.append(listener)
+    return True
+
+
+class WarmPeer:
+    """
+    A peer connection whose video transceiver and data channel exist, and
+    whose ICE gathering is under way, before any offer arrives. Each starts
+    on its own transport; applying the offer bundles them onto whichever
+    one the offer lists first and discards the other. A host_only peer
+    uses no STUN server, so it gathers only local addresses, in milliseconds.
+    """
+
+    def __init__(self, data_channel_label, host_only=False, **data_channel_options):
+        self.pc = RTCPeerConnection(RTCConfiguration(iceServers=[]) if host_only else None)
+        self.video_sender = self.pc.addTransceiver("video", direction="sendonly").sender
+        self.data_channel = self.pc.createDataChannel(data_channel_label, **data_channel_options)
+        self._gathering = {}
+        for gatherer in _ice_gatherers(self.pc):
+            task = asyncio.ensure_future(gatherer.gather())
+            task.add_done_callback(_log_gather_failure)
+            self._gathering[gatherer] = task
+
+    def _tasks(self):
+        """Gathering tasks of the transports still in use."""
+        return [self._gathering[g] for g in _ice_gatherers(self.pc)]
+
+    @property
+    def usable(self):
+        return not any(task.done() and (task.cancelled() or task.exception() is not None)
+                       for task in self._gathering.values())
+
+    async def gathered(self):
+        """
+        Waits for the transports still in use to finish gathering. Await it
+        before setLocalDescription(): aiortc runs connectivity checks only
+        for the candidates a transport has at that point.
+        """
+        await asyncio.gather(*self._tasks())
+
+
+class PeerPrewarmer:
+    """
+    Keeps one WarmPeer ready for the next offer. take() hands it out and
+    starts warming the next one; if none is ready (two connects in a row)
+    a fresh host-only one is made, so the answer does not wait on the STUN
+    server: a viewer on the robot's network reaches a host candidate, and
+    one behind NAT still connects through its own reflexive candidates.
+    An unused spare is replaced every max_age seconds.
+    """
+
+    def __init__(self, data_channel_label, max_age=SPARE_MAX_AGE, **data_channel_options):
+        self.data_channel_label = data_channel_label
+        self.data_channel_options = data_channel_options
+        self.max_age = max_age
+        self._spare = None
+        self._refresh_handle = None
+        self.taken_warm = 0
+        self.taken_cold = 0
+
+    def start(self):
+        self._replenish()
+
+    def take(self):
+        spare, self._spare = self._spare, None
+        if spare is not None and spare.usable:
+            self.taken_warm += 1
+        else:
+            if spare is not None:
+                asyncio.ensure_future(spare.pc.close())
+            spare = self._warm_peer(host_only=True)
+            self.taken_cold += 1
+        self._replenish()
+        return spare
+
+    def _warm_peer(self, host_only=False):
+        return WarmPeer(self.data_channel_label, host_only, **self.data_channel_options)
+
+    def _replenish(self):
+        if self._refresh_handle is not None:
+            self._refresh_handle.cancel()
+        self._spare = self._warm_peer()
+        self._refresh_handle = asyncio.get_running_loop().call_later(self.max_age, self._refresh)
+
+    def _refresh(self):
+        self._refresh_handle = None
+        stale, self._spare = self._spare, None
+        if stale is not None:
+            asyncio.ensure_future(stale.pc.close())
+        self._replenish()
+        logging.debug("Replaced idle spare peer connection.")
+
+    async def stop(self):
+        if self._refresh_handle is not None:
+            self._refresh_handle.cancel()
+            self._refresh_handle = None
+        spare, self._spare = self._spare, None
+        if spare is not None:
+            await spare.pc.close()
+
+
+class SetupTimer:
+    """Splits one connection setup into consecutive named phases."""
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.started = self._last = clock()
+        self.phases = []
+
+    def mark(self, phase):
+        """Ends the current phase; returns its duration in seconds."""
+        now = self.clock()
+        seconds = now - self._last
+        self.phases.append((phase, seconds))
+        self._last = now
+        return seconds
+
+    @property
+    def total(self):
+        return self._last - self.started
+
+    def summary(self):
+        return " ".join(f"{phase}={seconds * 1000:.1f}ms" for phase, seconds in self.phases)
+
+
+class SetupStats:
+    """Latency histogram per setup phase, across all connections."""
+
+    def __init__(self):
+        self.histograms = OrderedDict()
+
+    def observe(self, phase, seconds):
+        histogram = self.histograms.get(phase)
+        if histogram is None:
+            histogram = self.histograms[phase] = LatencyHistogram()
+        histogram.observe(seconds)
+
+    def observe_timer(self, timer):
+        for phase, seconds in timer.phases:
+            self.observe(phase, seconds)
+        self.observe("answer_total", timer.total)
@@ -15,6 +15,97 @@ namespace proto_comms {
   static uint32_t command_start_time = 0;
   const uint32_t command_duration = 100; // 100ms
 
+  uint16_t crc_failures = 0;
+  uint16_t resyncs = 0;
+  uint16_t decode_failures = 0;
+
+  // Payload + 2 CRC bytes, plus COBS overhead (one code byte per 254, plus one)
+  static const size_t max_frame = sizeof(buffer) + 2 + (sizeof(buffer) + 2) / 254 + 1;
+  static uint8_t tx_frame[max_frame];
+  static uint8_t rx_frame[max_frame];
+
+  // CRC16-CCITT (poly 0x1021, init 0xFFFF)
+  static uint16_t crc16(const uint8_t *data, size_t len) {
+    uint16_t crc = 0xFFFF;
+    while (len--) {
+      crc ^= (uint16_t)(*data++) << 8;
+      for (uint8_t i = 0; i < 8; i++) {
+        crc = (crc & 0x8000) ? (crc << 1) ^ 0x1021 : (crc << 1);
+      }
+    }
+    return crc;
+  }
+
+  static size_t cobs_encode(const uint8_t *src, size_t len, uint8_t *dst) {
+    size_t read = 0;
+    size_t write = 1;
+    size_t code_pos = 0;
+    uint8_t code = 1;
+    while (read < len) {
+      if (src[read] == 0) {
+        dst[code_pos] = code;
+        code = 1;
+        code_pos = write++;
+        read++;
+      } else {
+        dst[write++] = src[read++];
+        code++;
+        if (code == 0xFF) {
+          dst[code_pos] = code;
+          code = 1;
+          code_pos = write++;
+        }
+      }
+    }
+    dst[code_pos] = code;
+    return write;
+  }
+
+  // Decodes in place; returns the decoded length, or 0 if the frame is malformed.
+  static size_t cobs_decode(uint8_t *buf, size_t len) {
+    size_t read = 0;
+    size_t write = 0;
+    while (read < len) {
+      uint8_t code = buf[read++];
+      if (code == 0 || read + code - 1 > len) {
+        return 0;
+      }
+      for (uint8_t i = 1; i < code; i++) {
+        buf[write++] = buf[read++];
+      }
+      if (code != 0xFF && read < len) {
+        buf[write++] = 0;
+      }
+    }
+    return write;
+  }
+
+  static void handle_frame(uint8_t *frame, size_t len) {
+    size_t n = cobs_decode(frame, len);
+    if (n < 3) {
+      resyncs++;
+      return;
+    }
+    n -= 2;
+    uint16_t received_crc = ((uint16_t)frame[n] << 8) | frame[n + 1];
+    if (crc16(frame, n) != received_crc) {
+      crc_failures++;
+      return;
+    }
+
+    Command cmd = Command_init_zero;
+    pb_istream_t stream = pb_istream_from_buffer(frame, n);
+    if (pb_decode(&stream, Command_fields, &cmd)) {
+      controller::lastMsgTime = micros();
+      controller::cmdSteering = fmap(clip(cmd.steering, -1.0, 1.0), -1.0, 1.0, Motor::minStr, Motor::maxStr);
+      controller::cmdThrottle = fmap(clip(cmd.throttle, -1.0, 1.0), -1.0, 1.0, Motor::minThr, Motor::maxThr);
+      command_start_time = millis(); // Reset 100ms timer
+    } else {
+      // Printing here would corrupt the binary link; count it instead.
+      decode_failures++;
+    }
+  }
+
   void init() {
     Serial.begin(115200); // For Protobuf
     while (!Serial) {}
@@ -25,27 +116,23 @@ namespace proto_comms {
     status.sequence = controller::sequence++;
     status.steering = fmap(Motor::servoValues[0], Motor::minStr, Motor::maxStr, -1.0, 1.0);
     status.throttle = fmap(Motor::servoValues[1], Motor::minThr, Motor::maxThr, -1.0, 1.0);
-    status.timestamp = millis() / 1000.0;
+    status.uptime_ms = millis();
 
-    pb_ostream_t stream = pb_ostream_from_buffer(buffer, sizeof(buffer));
+    pb_ostream_t stream = pb_ostream_from_buffer(buffer, sizeof(buffer) - 2); // Leave room for the CRC
     if (pb_encode(&stream, RobotStatus_fields, &status)) {
-      uint16_t len = stream.bytes_written;
-      Serial.write((uint8_t)(len >> 8));
-      Serial.write((uint8_t)(len & 0xFF));
-      Serial.write(buffer, len);
-    } 
+      size_t len = stream.bytes_written;
+      uint16_t crc = crc16(buffer, len);
+      buffer[len] = (uint8_t)(crc >> 8);
+      buffer[len + 1] = (uint8_t)(crc & 0xFF);
+      size_t frame_len = cobs_encode(buffer, len + 2, tx_frame);
+      Serial.write(tx_frame, frame_len);
+      Serial.write((uint8_t)0x00);
+    }
   }
 
   void receive_command() {
-    static enum {
-      STATE_WAITING_FOR_LEN_1,
-      STATE_WAITING_FOR_LEN_2,
-      STATE_READING_PAYLOAD
-    } state = STATE_WAITING_FOR_LEN_1;
-
-    static uint16_t expected_len = 0;
-    static uint16_t bytes_received = 0;
-    static uint8_t len_buf[2];
+    static size_t rx_len = 0;
+    static bool overflow = false;
 
     // Check if current command has expired (100ms)
     if (command_start_time > 0 && (millis() - command_start_time >= command_duration)) {
@@ -54,63 +141,26 @@ namespace proto_comms {
       command_start_time = 0; // Reset timer
     }
 
-    // Process new commands
+    // Process new commands. Bytes accumulate until the 0x00 delimiter, so a
+    // lost or corrupted byte costs at most the frame it landed in.
     while (Serial.available() > 0) {
       uint8_t incoming_byte = Serial.read();
-      // Serial.println("Received byte: ");
-      switch (state) {
-        case STATE_WAITING_FOR_LEN_1:
-          // Serial.print("Waiting for length byte 1, received: ");
-          len_buf[0] = incoming_byte;
-          state = STATE_WAITING_FOR_LEN_2;
-          break;
-
-        case STATE_WAITING_FOR_LEN_2:
-          // Serial.print("Received length byte: ");
-          len_buf[1] = incoming_byte;
-          expected_len = (len_buf[0] << 8) | len_buf[1];
-          if (expected_len == 0 || expected_len > sizeof(buffer)) {
-            // Serial.print("Error: Invalid length received: ");
-            // Serial.println(expected_len);
-            state = STATE_WAITING_FOR_LEN_1;
-          } else {
-            bytes_received = 0;
-            state = STATE_READING_PAYLOAD;
-          }
-          break;
-
-        case STATE_READING_PAYLOAD:
-          // Serial.print("Reading payload, expected length: ");
-          if (bytes_received < sizeof(buffer)) {
-            buffer[bytes_received] = incoming_byte;
-          }
-          bytes_received++;
-
-          if (bytes_received >= expected_len) {
-            Command cmd = Command_init_zero;
-
-
-            // Serial.print(cmd.throttle);
-            // Serial.print(" bytes received, expected: ");
-
-            pb_istream_t stream = pb_istream_from_buffer(buffer, expected_len);
-            if (pb_decode(&stream, Command_fields, &cmd)) {
-              // Serial.print("DEBUG: DECODE SUCCESS! Steering: ");
-              // Serial.print(cmd.steering);
-              // Serial.print(", Throttle: ");
-              // Serial.println(cmd.throttle); 
-              controller::lastMsgTime = micros();
-              controller::cmdSteering = fmap(clip(cmd.steering, -1.0, 1.0), -1.0, 1.0, Motor::minStr, Motor::maxStr);
-              controller::cmdThrottle = fmap(clip(cmd.throttle, -1.0, 1.0), -1.0, 1.0, Motor::minThr, Motor::maxThr);
-              command_start_time = millis(); // Reset 100ms timer
-            } else {
-              Serial.print("Failed to decode command: ");
-              Serial1.println(PB_GET_ERROR(&stream));
-            }
-            state = STATE_WAITING_FOR_LEN_1;
-          }
-          break;
+      if (incoming_byte != 0x00) {
+        if (rx_len < sizeof(rx_frame)) {
+          rx_frame[rx_len++] = incoming_byte;
+        } else {
+          overflow = true;
+        }
+        continue;
+      }
+
+      if (overflow) {
+        resyncs++;
+      } else if (rx_len > 0) {
+        handle_frame(rx_frame, rx_len);
       }
+      rx_len = 0;
+      overflow = false;
     }
   }
 }
@@ -1,4 +1,3 @@
-
 #ifndef PROTO_COMMS_H
 #define PROTO_COMMS_H
 
@@ -6,11 +5,18 @@
 #include <pb_decode.h>
 #include "robot_messages.pb.h"
 
+// Link framing: COBS(payload + CRC16-CCITT big-endian) followed by 0x00.
+// Must stay byte-compatible with serial_link.py on the Pi.
 namespace proto_comms {
   extern uint8_t buffer[128];
   extern uint32_t last_send;
   extern const uint32_t send_interval;
 
+  // Link health counters
+  extern uint16_t crc_failures;
+  extern uint16_t resyncs;
+  extern uint16_t decode_failures;
+
   void init();
   void send_robot_status();
   void receive_command();
@@ -26,19 +26,21 @@ typedef struct _SensorData_GPS {
 } SensorData_GPS;
 
 typedef struct _SensorData {
-    uint32_t sequence;
-    float timestamp;
+    uint32_t sequence; /* Increments by one per sample; gaps mean loss */
     bool has_imu;
     SensorData_IMU imu;
     bool has_gps;
-    SensorData_GPS gps;
+    SensorData_GPS gps; /* Unset when no fix is recent enough */
+    float gps_age_ms; /* Distance from the sample time to the nearest GPS fix used */
+    float latency_ms; /* IMU sample time to publish on the robot */
+    uint64_t timestamp_ns; /* Sample time, UTC epoch nanoseconds */
 } SensorData;
 
 typedef struct _RobotStatus {
-    uint32_t sequence;
+    uint32_t sequence; /* Increments by one per status; gaps mean loss */
     float steering;
     float throttle;
-    float timestamp;
+    uint32_t uptime_ms; /* Arduino millis() when the status was built */
 } RobotStatus;
 
 typedef struct _Command {
@@ -52,12 +54,12 @@ extern "C" {
 #endif
 
 /* Initializer values for message structs */
-#define SensorData_init_default                  {0, 0, false, SensorData_IMU_init_default, false, SensorData_GPS_init_default}
+#define SensorData_init_default                  {0, false, SensorData_IMU_init_default, false, SensorData_GPS_init_default, 0, 0, 0}
 #define SensorData_IMU_init_default              {0, 0, 0, 0, 0, 0}
 #define SensorData_GPS_init_default              {0, 0, 0}
 #define RobotStatus_init_default                 {0, 0, 0, 0}
 #define Command_init_default                     {0, 0}
-#define SensorData_init_zero                     {0, 0, false, SensorData_IMU_init_zero, false, SensorData_GPS_init_zero}
+#define SensorData_init_zero                     {0, false, SensorData_IMU_init_zero, false, SensorData_GPS_init_zero, 0, 0, 0}
 #define SensorData_IMU_init_zero                 {0, 0, 0, 0, 0, 0}
 #define SensorData_GPS_init_zero                 {0, 0, 0}
 #define RobotStatus_init_zero                    {0, 0, 0, 0}
@@ -74,22 +76,26 @@ extern "C" {
 #define SensorData_GPS_lon_tag                   2
 #define SensorData_GPS_alt_tag                   3
 #define SensorData_sequence_tag                  1
-#define SensorData_timestamp_tag                 2
 #define SensorData_imu_tag                       3
 #define SensorData_gps_tag                       4
+#define SensorData_gps_age_ms_tag                5
+#define SensorData_latency_ms_tag                6
+#define SensorData_timestamp_ns_tag              7
 #define RobotStatus_sequence_tag                 1
 #define RobotStatus_steering_tag                 2
 #define RobotStatus_throttle_tag                 3
-#define RobotStatus_timestamp_tag                4
+#define RobotStatus_uptime_ms_tag                5
 #define Command_steering_tag                     1
 #define Command_throttle_tag                     2
 
 /* Struct field encoding specification for nanopb */
 #define SensorData_FIELDLIST(X, a) \
 X(a, STATIC,   SINGULAR, UINT32,   sequence,          1) \
-X(a, STATIC,   SINGULAR, FLOAT,    timestamp,         2) \
 X(a, STATIC,   OPTIONAL, MESSAGE,  imu,               3) \
-X(a, STATIC,   OPTIONAL, MESSAGE,  gps,               4)
+X(a, STATIC,   OPTIONAL, MESSAGE,  gps,               4) \
+X(a, STATIC,   SINGULAR, FLOAT,    gps_age_ms,        5) \
+X(a, STATIC,   SINGULAR, FLOAT,    latency_ms,        6) \
+X(a, STATIC,   SINGULAR, UINT64,   timestamp_ns,      7)
 #define SensorData_CALLBACK NULL
 #define SensorData_DEFAULT NULL
 #define SensorData_imu_MSGTYPE SensorData_IMU
@@ -116,7 +122,7 @@ X(a, STATIC,   SINGULAR, FLOAT,    alt,               3)
 X(a, STATIC,   SINGULAR, UINT32,   sequence,          1) \
 X(a, STATIC,   SINGULAR, FLOAT,    steering,          2) \
 X(a, STATIC,   SINGULAR, FLOAT,    throttle,          3) \
-X(a, STATIC,   SINGULAR, FLOAT,    timestamp,         4)
+X(a, STATIC,   SINGULAR, UINT32,   uptime_ms,         5)
 #define RobotStatus_CALLBACK NULL
 #define RobotStatus_DEFAULT NULL
 
@@ -142,10 +148,10 @@ extern const pb_msgdesc_t Command_msg;
 /* Maximum encoded size of messages (where known) */
 #define Command_size                             10
 #define ROBOT_MESSAGES_PB_H_MAX_SIZE             SensorData_size
-#define RobotStatus_size                         21
+#define RobotStatus_size                         22
 #define SensorData_GPS_size                      15
 #define SensorData_IMU_size                      30
-#define SensorData_size                          60
+#define SensorData_size                          76
 
 #ifdef __cplusplus
 } /* extern "C" */
@@ -0,0 +1,282 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+import robot_messages_pb2
+
+# Overflow policies for a subscriber's ring
+DROP_OLDEST = "drop-oldest"            # Bounded FIFO; the oldest pending message is evicted
+KEEP_LATEST = "keep-latest-per-type"   # At most one pending message per type; newer replaces older
+
+MSG_SENSOR = "sensor"
+MSG_STATUS = "status"
+
+# Telemetry envelope field numbers (see robot_messages.proto)
+_ENVELOPE_SEQUENCE_KEY = b'\x08'      # field 1, varint
+_ENVELOPE_MONOTONIC_KEY = b'\x10'     # field 2, varint
+_ENVELOPE_PAYLOAD_KEYS = {
+    MSG_SENSOR: b'\x1a',              # field 3, length-delimited
+    MSG_STATUS: b'\x22',              # field 4, length-delimited
+}
+_ENVELOPE_TRACED = b'\x28\x01'        # field 5, varint true
+
+MAX_BATCH_BYTES = 1200  # Keeps one coalesced SCTP message inside a single DTLS/UDP packet
+IDLE_WAKEUP = 0.5       # Seconds an idle sender sleeps before re-checking the channel state
+MAX_PENDING_TRACES = 64  # Traced sends awaiting the client's TraceReport, per peer
+
+
+def _wake(waiter, delivered=True):
+    if not waiter.done():
+        waiter.set_result(delivered)
+
+
+def encode_varint(value):
+    out = bytearray()
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def pack_delimited(payloads, max_batch_bytes=MAX_BATCH_BYTES):
+    """
+    Coalesces serialized protobufs into varint length-delimited batches of
+    at most max_batch_bytes each. A single payload larger than the budget
+    is still sent, alone in its own batch.
+    """
+    batch = bytearray()
+    for payload in payloads:
+        prefix = encode_varint(len(payload))
+        if batch and len(batch) + len(prefix) + len(payload) > max_batch_bytes:
+            yield bytes(batch)
+            batch = bytearray()
+        batch += prefix
+        batch += payload
+    if batch:
+        yield bytes(batch)
+
+
+def wrap_envelope(msg_type, payload, sequence, monotonic_us, traced=False):
+    """
+    Builds a serialized Telemetry envelope around an already-serialized
+    payload. Writing the wire format directly decodes exactly like filling
+    the oneof and calling SerializeToString(), without re-parsing the payload.
+    """
+    return b''.join((
+        _ENVELOPE_SEQUENCE_KEY, encode_varint(sequence),
+        _ENVELOPE_MONOTONIC_KEY, encode_varint(monotonic_us),
+        _ENVELOPE_PAYLOAD_KEYS[msg_type], encode_varint(len(payload)), payload,
+        _ENVELOPE_TRACED if traced else b'',
+    ))
+
+
+class TelemetrySubscriber:
+    """
+    A per-consumer bounded ring fed by a TelemetryHub. Publishers run on
+    reader threads and consumers on the event loop, so every access goes
+    through a lock. Evicted or superseded messages are counted in `dropped`.
+    """
+
+    def __init__(self, hub, maxlen, policy):
+        if policy not in (DROP_OLDEST, KEEP_LATEST):
+            raise ValueError(f"Unknown telemetry overflow policy: {policy}")
+        self.hub = hub
+        self.maxlen = maxlen
+        self.policy = policy
+        self._lock = threading.Lock()
+        self._pending = deque() if policy == DROP_OLDEST else OrderedDict()
+        self.received = 0
+        self.dropped = 0
+        self.dropped_by_type = {}
+        self._waiter = None
+
+    def _count_drop(self, msg_type):
+        self.dropped += 1
+        self.dropped_by_type[msg_type] = self.dropped_by_type.get(msg_type, 0) + 1
+
+    def offer(self, msg_type, payload, trace_seq=None):
+        """Called by the hub from the publishing thread."""
+        with self._lock:
+            self.received += 1
+            pending = self._pending
+            if self.policy == DROP_OLDEST:
+                if len(pending) >= self.maxlen:
+                    evicted_type = pending.popleft()[0]
+                    self._count_drop(evicted_type)
+                pending.append((msg_type, payload, trace_seq))
+            else:
+                if msg_type in pending:
+                    self._count_drop(msg_type)
+                    del pending[msg_type]
+                elif len(pending) >= self.maxlen:
+                    evicted_type, _ = pending.popitem(last=False)
+                    self._count_drop(evicted_type)
+                pending[msg_type] = (payload, trace_seq)
+            waiter, self._waiter = self._waiter, None
+        if waiter is not None:
+            waiter.get_loop().call_soon_threadsafe(_wake, waiter)
+
+    def pop(self):
+        """
+        Returns the oldest pending (msg_type, payload, trace_seq), or None when
+        empty. trace_seq is the envelope sequence if the message is traced.
+        """
+        with self._lock:
+            if not self._pending:
+                return None
+            if self.policy == DROP_OLDEST:
+                return self._pending.popleft()
+            msg_type, (payload, trace_seq) = self._pending.popitem(last=False)
+            return msg_type, payload, trace_seq
+
+    def drain(self):
+        """Removes and returns every pending (msg_type, payload, trace_seq) in order."""
+        with self._lock:
+            if self.policy == DROP_OLDEST:
+                items = list(self._pending)
+            else:
+                items = [(msg_type, payload, trace_seq)
+                         for msg_type, (payload, trace_seq) in self._pending.items()]
+            self._pending.clear()
+        return items
+
+    async def wait(self, timeout=None):
+        """
+        Sleeps until a message is pending. Returns False if the timeout
+        expired first, or if a newer wait() took over: there is one waiter
+        at a time, so a sender replaced by another one is not left hanging.
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._pending:
+                return True
+            previous, waiter = self._waiter, loop.create_future()
+            self._waiter = waiter
+        if previous is not None:
+            _wake(previous, delivered=False)
+        try:
+            return await asyncio.wait_for(waiter, timeout)
+        except asyncio.TimeoutError:
+            return False
+
+    def __len__(self):
+        return len(self._pending)
+
+    def close(self):
+        self.hub.unsubscribe(self)
+
+
+class TelemetryHub:
+    """
+    Publish/subscribe fan-out for serial telemetry. Device handlers publish
+    each message once and every data channel gets its own bounded ring, so
+    one slow viewer cannot starve another or steal its messages.
+    """
+
+    def __init__(self, maxlen=100, policy=DROP_OLDEST, tracer=None):
+        self.maxlen = maxlen
+        self.policy = policy
+        self.tracer = tracer
+        self._lock = threading.Lock()
+        self._subscribers = ()
+        self.published = 0
+
+    def subscribe(self, maxlen=None, policy=None):
+        sub = TelemetrySubscriber(self, maxlen or self.maxlen, policy or self.policy)
+        with self._lock:
+            self._subscribers = self._subscribers + (sub,)
+        logging.info(f"Telemetry subscriber added ({len(self._subscribers)} active, policy={sub.policy}).")
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            if sub not in self._subscribers:
+                return
+            self._subscribers = tuple(s for s in self._subscribers if s is not sub)
+        logging.info(f"Telemetry subscriber removed ({len(self._subscribers)} active, dropped={sub.dropped}).")
+
+    @property
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+    def publish(self, msg_type, payload, read_ns=None, parse_ns=None):
+        """
+        Wraps one serialized message in a Telemetry envelope and delivers it
+        to every subscriber. Safe from any thread. read_ns/parse_ns are the
+        monotonic times the source bytes arrived and were decoded, used when
+        the message is sampled for latency tracing.
+        """
+        with self._lock:
+            self.published += 1
+            sequence = self.published & 0xFFFFFFFF
+        enqueue_ns = time.monotonic_ns()
+        traced = self.tracer is not None and self.tracer.should_trace(sequence)
+        if traced:
+            self.tracer.record_origin(sequence, read_ns, parse_ns, enqueue_ns)
+        envelope = wrap_envelope(msg_type, payload, sequence, enqueue_ns // 1000, traced)
+        trace_seq = sequence if traced else None
+        for sub in self._subscribers:
+            sub.offer(msg_type, envelope, trace_seq)
+
+
+class TelemetrySender:
+    """
+    Drains a subscriber into a data channel. Every wakeup sends everything
+    pending, coalesced into length-delimited batches; when idle it sleeps on
+    the subscriber's wakeup instead of polling on a timer.
+    """
+
+    def __init__(self, subscriber, data_channel, max_batch_bytes=MAX_BATCH_BYTES):
+        self.subscriber = subscriber
+        self.data_channel = data_channel
+        self.max_batch_bytes = max_batch_bytes
+        self.messages_sent = 0
+        self.batches_sent = 0
+        self.bytes_sent = 0
+        self._traced = OrderedDict()  # trace_seq -> (dequeue_ns, send_ns)
+
+    async def run(self, is_active):
+        """Sends until is_active() turns false or the channel errors."""
+        while is_active():
+            if self.data_channel.readyState != "open":
+                logging.warning(f"Data channel state: {self.data_channel.readyState}")
+                return
+            if not await self.subscriber.wait(timeout=IDLE_WAKEUP):
+                continue
+            items = self.subscriber.drain()
+            dequeue_ns = time.monotonic_ns()
+            try:
+                for batch in pack_delimited((payload for _, payload, _ in items), self.max_batch_bytes):
+                    self.data_channel.send(batch)
+                    self.batches_sent += 1
+                    self.bytes_sent += len(batch)
+            except Exception as e:
+                logging.warning(f"Data channel send error: {e}")
+                return
+            self.messages_sent += len(items)
+            # Batches leave within microseconds of each other; one send stamp covers the drain.
+            send_ns = time.monotonic_ns()
+            for _, _, trace_seq in items:
+                if trace_seq is not None:
+                    self._traced[trace_seq] = (dequeue_ns, send_ns)
+            while len(self._traced) > MAX_PENDING_TRACES:
+                self._traced.popitem(last=False)
+
+    def handle_trace_report(self, report):
+        """Closes a trace with the client's receive time (already on the server clock)."""
+        stamps = self._traced.pop(report.sequence, None)
+        tracer = self.subscriber.hub.tracer
+        if stamps is None or tracer is None:
+            return
+        tracer.complete(report.sequence, stamps[0], stamps[1], report.receive_us * 1000)
+
+    def reply_clock_sync(self, request, received_us):
+        """Answers a ClockSync ping so the client can estimate its offset to our monotonic clock."""
+        envelope = robot_messages_pb2.Telemetry()
+        envelope.clock_sync.client_send_us = request.client_send_us
+        envelope.clock_sync.server_receive_us = received_us
+        envelope.clock_sync.server_send_us = time.monotonic_ns() // 1000
+        payload = envelope.SerializeToString()
+        self.data_channel.send(encode_varint(len(payload)) + payload)
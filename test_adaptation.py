@@ -0,0 +1,140 @@
+"""Tests for adaptation.AdaptationController and the getStats() feedback loop."""
+import asyncio
+import datetime
+import pytest
+from adaptation import (AdaptationController, QUALITY_LADDER, DEGRADE_REPORTS, UPGRADE_REPORTS, DEGRADE_HOLD,
+                        UPGRADE_HOLD, poll_feedback)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_controller(start_index=0):
+    clock = Clock()
+    changes = []
+    controller = AdaptationController(QUALITY_LADDER, start_index=start_index, on_change=changes.append, clock=clock)
+    return controller, clock, changes
+
+
+def report(controller, clock, loss=None, remb=None, seconds=1.0):
+    clock.now += seconds
+    return controller.observe(loss=loss, remb=remb)
+
+
+def test_degrades_after_consecutive_lossy_reports():
+    controller, clock, changes = make_controller()
+    for _ in range(DEGRADE_REPORTS + 2):
+        report(controller, clock, loss=0.5)
+        if changes:
+            break
+    assert changes == [QUALITY_LADDER[1]]
+    assert controller.degrades == 1
+
+
+def test_brief_loss_spike_is_ignored():
+    controller, clock, changes = make_controller()
+    report(controller, clock, loss=0.2)
+    for _ in range(5):
+        report(controller, clock, loss=0.0)
+    assert changes == []
+
+
+def test_hold_limits_how_fast_it_steps_down():
+    controller, clock, changes = make_controller()
+    for _ in range(20):
+        report(controller, clock, loss=0.5, seconds=DEGRADE_HOLD / 4)
+    # Every step down needs DEGRADE_REPORTS bad reports and DEGRADE_HOLD seconds.
+    assert 1 <= len(changes) <= 20 / 4
+    times = [d["time"] for d in controller.decisions]
+    assert all(b - a >= DEGRADE_HOLD for a, b in zip(times, times[1:]))
+
+
+def test_loss_between_thresholds_changes_nothing():
+    controller, clock, changes = make_controller(start_index=2)
+    for _ in range(50):
+        report(controller, clock, loss=0.05)
+    assert changes == []
+
+
+def test_upgrades_only_after_clean_reports_and_hold():
+    controller, clock, changes = make_controller(start_index=2)
+    for _ in range(UPGRADE_REPORTS - 1):
+        report(controller, clock, loss=0.0, seconds=UPGRADE_HOLD)
+    assert changes == []
+    report(controller, clock, loss=0.0, seconds=UPGRADE_HOLD)
+    assert changes == [QUALITY_LADDER[1]]
+
+    # Right after a change, clean reports alone do not step up again.
+    for _ in range(UPGRADE_REPORTS):
+        report(controller, clock, loss=0.0, seconds=UPGRADE_HOLD / (2 * UPGRADE_REPORTS))
+    assert changes == [QUALITY_LADDER[1]]
+
+
+def test_remb_below_bitrate_jumps_to_a_step_it_can_carry():
+    controller, clock, changes = make_controller()
+    remb = QUALITY_LADDER[3].bitrate + 1
+    for _ in range(DEGRADE_REPORTS):
+        report(controller, clock, loss=0.0, remb=remb)
+    assert changes == [QUALITY_LADDER[3]]
+
+
+def test_remb_without_headroom_blocks_upgrade():
+    controller, clock, changes = make_controller(start_index=2)
+    remb = QUALITY_LADDER[1].bitrate  # Enough for the step above, but not with headroom
+    for _ in range(UPGRADE_REPORTS * 3):
+        report(controller, clock, loss=0.0, remb=remb, seconds=UPGRADE_HOLD)
+    assert changes == []
+
+
+def test_recovers_after_a_lossy_fade():
+    controller, clock, changes = make_controller()
+    for _ in range(10):
+        report(controller, clock, loss=0.3, remb=350_000)
+    low = controller.index
+    assert low > 0
+    for _ in range(200):
+        report(controller, clock, loss=0.0, remb=5_000_000)
+    assert controller.index == 0
+    assert controller.upgrades == low
+
+
+class StatsSender:
+    """Answers getStats() with a scripted report per poll, as an RTCRtpSender would."""
+
+    def __init__(self, reports):
+        self.reports = list(reports)
+
+    async def getStats(self):
+        return self.reports.pop(0)
+
+
+class RecordingController:
+    def __init__(self):
+        self.observed = []
+
+    def observe(self, loss=None, remb=None):
+        self.observed.append((loss, remb))
+
+
+def test_poll_feedback_observes_each_receiver_report_once():
+    stats = pytest.importorskip("aiortc.stats")
+
+    def report(second, fraction_lost):
+        entry = stats.RTCRemoteInboundRtpStreamStats(
+            timestamp=datetime.datetime(2024, 1, 1, 0, 0, second), type="remote-inbound-rtp",
+            id="remote-inbound-rtp_1", ssrc=1, kind="video", transportId="transport_1", packetsReceived=100,
+            packetsLost=0, jitter=0, roundTripTime=0.05, fractionLost=fraction_lost)
+        result = stats.RTCStatsReport()
+        result.add(entry)
+        return result
+
+    # Nothing before the first receiver report; the same report seen twice counts once.
+    sender = StatsSender([stats.RTCStatsReport(), report(1, 128), report(1, 128), report(2, 64), report(3, 0)])
+    controller = RecordingController()
+    asyncio.run(poll_feedback(sender, controller, lambda: sender.reports, interval=0))
+    assert controller.observed == [(0.5, None), (0.25, None), (0.0, None)]
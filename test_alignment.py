@@ -0,0 +1,73 @@
+"""Tests for alignment.SampleHistory."""
+import pytest
+from alignment import SampleHistory
+
+MS = 1_000_000
+
+
+def history(*samples):
+    h = SampleHistory()
+    for t_ns, lat in samples:
+        h.append(t_ns, {"lat": lat, "fix": t_ns})
+    return h
+
+
+def test_interpolates_between_samples():
+    h = history((100 * MS, 10.0), (200 * MS, 20.0))
+    sample, age = h.at(125 * MS, ("lat",), 500 * MS)
+    assert sample["lat"] == pytest.approx(12.5)
+    assert sample["fix"] == 100 * MS  # Fields not named are taken from the earlier sample
+    assert age == 25 * MS
+
+
+def test_uses_the_nearest_sample_outside_the_history():
+    h = history((100 * MS, 10.0), (200 * MS, 20.0))
+    assert h.at(250 * MS, ("lat",), 500 * MS) == ({"lat": 20.0, "fix": 200 * MS}, 50 * MS)
+    assert h.at(60 * MS, ("lat",), 500 * MS) == ({"lat": 10.0, "fix": 100 * MS}, 40 * MS)
+
+
+def test_stale_samples_are_not_used():
+    h = history((100 * MS, 10.0), (2000 * MS, 20.0))
+    assert h.at(3000 * MS, ("lat",), 500 * MS) == (None, None)
+    # Between two samples, both too far away.
+    assert h.at(1000 * MS, ("lat",), 500 * MS) == (None, None)
+    assert SampleHistory().at(0, ("lat",), 500 * MS) == (None, None)
+
+
+def test_out_of_order_samples_are_dropped():
+    h = history((200 * MS, 20.0), (100 * MS, 10.0))
+    assert len(h) == 1
+    assert h.latest() == (200 * MS, {"lat": 20.0, "fix": 200 * MS})
+    assert SampleHistory().latest() == (None, None)
+
+
+def test_history_is_bounded():
+    h = SampleHistory(maxlen=4)
+    for i in range(10):
+        h.append(i * MS, {"lat": float(i)})
+    assert len(h) == 4
+    assert h.at(0, ("lat",), 100 * MS)[0]["lat"] == 6.0
+
+
+def test_live_samples_are_extrapolated_from_the_last_two_fixes():
+    # Live, the IMU sample is newer than every fix: the next one is still on its way.
+    h = history((100 * MS, 10.0), (200 * MS, 20.0))
+    sample, age, extrapolated = h.estimate(250 * MS, ("lat",), 500 * MS)
+    assert extrapolated
+    assert sample["lat"] == pytest.approx(25.0)
+    assert sample["fix"] == 200 * MS  # Fields not named are taken from the newest fix
+    assert age == 50 * MS
+    # Once the next fix arrives the same time is interpolated instead.
+    h.append(300 * MS, {"lat": 40.0, "fix": 300 * MS})
+    sample, age, extrapolated = h.estimate(250 * MS, ("lat",), 500 * MS)
+    assert not extrapolated and sample["lat"] == pytest.approx(30.0)
+
+
+def test_estimate_falls_back_to_the_nearest_fix():
+    h = history((100 * MS, 10.0))
+    assert h.estimate(150 * MS, ("lat",), 500 * MS) == ({"lat": 10.0, "fix": 100 * MS}, 50 * MS, False)
+    # Fixes too far apart to give a usable velocity.
+    h = history((100 * MS, 10.0), (2000 * MS, 20.0))
+    assert h.estimate(2100 * MS, ("lat",), 500 * MS) == ({"lat": 20.0, "fix": 2000 * MS}, 100 * MS, False)
+    assert h.estimate(3000 * MS, ("lat",), 500 * MS) == (None, None, False)
+    assert SampleHistory().estimate(0, ("lat",), 500 * MS) == (None, None, False)
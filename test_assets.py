@@ -0,0 +1,112 @@
+"""Tests for assets.AssetCache: versioned URLs, validators and encoding negotiation."""
+import gzip
+import os
+import time
+import pytest
+
+pytest.importorskip("aiohttp")
+
+from aiohttp.test_utils import make_mocked_request
+import assets
+from assets import AssetCache, IMMUTABLE_MAX_AGE, _accepted_encodings
+
+SCRIPT = '// client\nfetch("/public/data.proto");\n' + "console.log('padding');\n" * 40
+PAGE = '<script src="/app.js"></script>\n'
+
+
+def request(path, **headers):
+    return make_mocked_request("GET", path, headers=headers)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    (tmp_path / "data.proto").write_text("syntax = \"proto3\";\n")
+    (tmp_path / "app.js").write_text(SCRIPT)
+    (tmp_path / "index.html").write_text(PAGE)
+    cache = AssetCache(str(tmp_path))
+    cache.add("data.proto", "/public/data.proto", "text/plain")
+    cache.add("app.js", "/app.js", "application/javascript", depends=["data.proto"])
+    cache.add("index.html", "/", "text/html", depends=["app.js"])
+    return cache
+
+
+def test_accepted_encodings():
+    assert _accepted_encodings("gzip, deflate, br") == {"gzip", "deflate", "br"}
+    assert _accepted_encodings("br;q=0, GZIP;q=0.5") == {"gzip"}
+    assert _accepted_encodings("gzip;q=oops, identity") == {"identity"}
+    assert _accepted_encodings("") == set()
+
+
+def test_dependencies_are_linked_by_version(cache):
+    page = cache.get("index.html").bodies["identity"].decode()
+    assert f'"/app.js?v={cache.get("app.js").version}"' in page
+    script = cache.get("app.js").bodies["identity"].decode()
+    assert cache.url("data.proto") in script
+
+
+def test_gzip_is_served_when_accepted(cache):
+    response = cache.response(request("/app.js", **{"Accept-Encoding": "gzip, deflate"}), "app.js")
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.headers["Vary"] == "Accept-Encoding"
+    assert gzip.decompress(response.body) == cache.get("app.js").bodies["identity"]
+    assert response.headers["ETag"].endswith('-gzip"')
+
+    plain = cache.response(request("/app.js"), "app.js")
+    assert "Content-Encoding" not in plain.headers
+    assert plain.headers["ETag"] == f'"{cache.get("app.js").version}"'
+
+
+def test_small_files_are_not_compressed(cache):
+    assert list(cache.get("data.proto").bodies) == ["identity"]
+
+
+def test_brotli_preferred_when_available(tmp_path):
+    brotli = pytest.importorskip("brotli")
+    (tmp_path / "app.js").write_text(SCRIPT)
+    cache = AssetCache(str(tmp_path))
+    cache.add("app.js", "/app.js", "application/javascript")
+    response = cache.response(request("/app.js", **{"Accept-Encoding": "gzip, br"}), "app.js")
+    assert response.headers["Content-Encoding"] == "br"
+    assert brotli.decompress(response.body) == SCRIPT.encode()
+
+
+def test_etag_revalidation(cache):
+    first = cache.response(request("/app.js", **{"Accept-Encoding": "gzip"}), "app.js")
+    etag = first.headers["ETag"]
+    assert cache.response(request("/app.js", **{"If-None-Match": etag}), "app.js").status == 304
+    assert cache.response(request("/app.js", **{"If-None-Match": "W/" + etag}), "app.js").status == 304
+    assert cache.response(request("/app.js", **{"If-None-Match": '"stale", *'}), "app.js").status == 304
+    changed = cache.response(request("/app.js", **{"If-None-Match": '"0123456789abcdef"'}), "app.js")
+    assert changed.status == 200
+
+
+def test_last_modified_revalidation(cache):
+    last_modified = cache.response(request("/app.js"), "app.js").headers["Last-Modified"]
+    assert cache.response(request("/app.js", **{"If-Modified-Since": last_modified}), "app.js").status == 304
+    old = "Thu, 01 Jan 1970 00:00:00 GMT"
+    assert cache.response(request("/app.js", **{"If-Modified-Since": old}), "app.js").status == 200
+    assert cache.response(request("/app.js", **{"If-Modified-Since": "garbage"}), "app.js").status == 200
+
+
+def test_versioned_urls_are_immutable(cache):
+    current = cache.response(request(cache.url("app.js")), "app.js")
+    assert current.headers["Cache-Control"] == f"public, max-age={IMMUTABLE_MAX_AGE}, immutable"
+    for path in ("/app.js", "/app.js?v=0123456789abcdef"):
+        assert cache.response(request(path), "app.js").headers["Cache-Control"] == "no-cache"
+
+
+def test_edits_reload_the_file_and_what_links_to_it(cache, tmp_path, monkeypatch):
+    monkeypatch.setattr(assets, "MTIME_CHECK_INTERVAL", 0.0)
+    page_version = cache.get("index.html").version
+    script_version = cache.get("app.js").version
+    assert cache.get("app.js") is cache.get("app.js")  # Unchanged files are not reloaded
+
+    proto = tmp_path / "data.proto"
+    proto.write_text("syntax = \"proto3\";\nmessage Added {}\n")
+    later = time.time() + 10
+    os.utime(proto, (later, later))
+
+    assert cache.get("app.js").version != script_version
+    assert cache.get("index.html").version != page_version
+    assert cache.url("data.proto") in cache.get("app.js").bodies["identity"].decode()
+    assert cache.get("index.html").mtime == pytest.approx(later)
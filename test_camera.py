@@ -0,0 +1,39 @@
+"""Tests for camera: frame pooling and the shared capture source."""
+import asyncio
+import pytest
+
+pytest.importorskip("cv2")
+pytest.importorskip("aiortc")
+
+from camera import PiCameraSource, FrameMailbox, FramePool, FRAME_POOL_SIZE
+
+
+def test_attaching_to_a_warm_source_recycles_the_cached_frame(monkeypatch):
+    source = PiCameraSource()
+    monkeypatch.setattr(source, "start", lambda: None)  # No camera here; frames are published by hand
+    source.keep_warm = True
+    source.pool = FramePool((6, 4))
+    for _ in range(FRAME_POOL_SIZE * 3):
+        pooled = source.pool.acquire()
+        source._publish(pooled)
+        track = source.subscribe()
+        item, dropped = asyncio.run(track._mailbox.get(timeout=0))
+        assert item is pooled and dropped == 0
+        item.release()
+        source.unsubscribe(track)
+    assert source.pool.allocations == FRAME_POOL_SIZE
+
+
+def test_a_newer_get_takes_over_the_mailbox():
+    mailbox = FrameMailbox()
+
+    async def run():
+        first = asyncio.ensure_future(mailbox.get(timeout=5))
+        await asyncio.sleep(0)
+        second = asyncio.ensure_future(mailbox.get(timeout=5))
+        # The earlier consumer gives way at once instead of hanging.
+        assert await asyncio.wait_for(first, 1) == (None, 0)
+        mailbox.put("frame")
+        return await asyncio.wait_for(second, 1)
+
+    assert asyncio.run(run()) == ("frame", 0)
@@ -0,0 +1,81 @@
+"""Tests for nmea.NmeaReader."""
+from datetime import datetime, timezone
+import pytest
+from nmea import NmeaReader, MAX_LINE, KNOTS_TO_MPS, KMH_TO_MPS
+
+
+def sentence(body):
+    """Wraps "GPGGA,..." as "$GPGGA,...*hh\\r\\n" with a valid checksum."""
+    checksum = 0
+    for byte in body.encode():
+        checksum ^= byte
+    return f"${body}*{checksum:02X}\r\n".encode()
+
+
+GGA = sentence("GPGGA,123519.00,4807.038,N,01131.000,E,1,08,0.9,545.4,M,46.9,M,,")
+RMC = sentence("GNRMC,123519.00,A,4807.038,S,01131.000,W,022.4,084.4,230324,003.1,W")
+VTG = sentence("GPVTG,054.7,T,034.4,M,005.5,N,010.2,K,A")
+
+
+def test_gga_fix():
+    reader = NmeaReader()
+    (update,) = reader.feed(GGA)
+    assert update["type"] == "GGA"
+    assert update["lat"] == pytest.approx(48 + 7.038 / 60)
+    assert update["lon"] == pytest.approx(11 + 31.0 / 60)
+    assert update["alt"] == pytest.approx(545.4)
+    assert (update["fix_quality"], update["num_sats"], update["hdop"]) == (1, 8, 0.9)
+    assert "received_ns" in update
+
+
+def test_rmc_sets_the_date_for_later_gga_timestamps():
+    reader = NmeaReader()
+    (update,) = reader.feed(RMC)
+    assert update["lat"] == pytest.approx(-(48 + 7.038 / 60))
+    assert update["lon"] == pytest.approx(-(11 + 31.0 / 60))
+    assert update["speed"] == pytest.approx(22.4 * KNOTS_TO_MPS)
+    assert update["course"] == pytest.approx(84.4)
+    (fix,) = reader.feed(GGA)
+    expected = datetime(2024, 3, 23, 12, 35, 19, tzinfo=timezone.utc).timestamp()
+    assert fix["timestamp"] == pytest.approx(expected)
+
+
+def test_vtg_speed_in_metres_per_second():
+    (update,) = NmeaReader().feed(VTG)
+    assert update == {"type": "VTG", "course": 54.7, "speed": pytest.approx(10.2 * KMH_TO_MPS),
+                      "received_ns": update["received_ns"]}
+
+
+def test_no_fix_and_void_rmc_produce_nothing():
+    reader = NmeaReader()
+    no_fix = sentence("GPGGA,123519.00,,,,,0,00,99.9,,M,,M,,")
+    void = sentence("GPRMC,123519.00,V,,,,,,,230324,,")
+    assert reader.feed(no_fix + void) == []
+    assert reader.parsed == 0 and reader.checksum_errors == 0
+
+
+def test_bad_checksum_and_unwanted_sentences_are_dropped():
+    reader = NmeaReader()
+    corrupt = GGA.replace(b"4807", b"4808")
+    unwanted = sentence("GPGSV,3,1,11,03,03,111,00,04,15,270,00,06,01,010,00,13,06,292,00")
+    assert reader.feed(corrupt + unwanted + VTG)[0]["type"] == "VTG"
+    assert reader.checksum_errors == 1
+    assert reader.sentences == 3 and reader.parsed == 1
+
+
+def test_sentences_split_across_chunks():
+    reader = NmeaReader()
+    stream = GGA + VTG + RMC
+    updates = []
+    for i in range(0, len(stream), 7):
+        updates += reader.feed(stream[i:i + 7])
+    assert [u["type"] for u in updates] == ["GGA", "VTG", "RMC"]
+
+
+def test_long_noise_is_discarded_up_to_the_next_sentence():
+    reader = NmeaReader()
+    assert reader.feed(b"x" * (MAX_LINE * 2)) == []
+    assert len(reader._buffer) <= MAX_LINE
+    # Noise without a line break is trimmed to the last "$", which may start a sentence.
+    assert reader.feed(b"x" * MAX_LINE + GGA[:20]) == []
+    assert [u["type"] for u in reader.feed(GGA[20:] + VTG)] == ["GGA", "VTG"]
@@ -0,0 +1,121 @@
+"""Tests for serial_link: CRC16, COBS, FrameDecoder resync and the superseding writer."""
+import random
+import threading
+import time
+import pytest
+from serial_link import (crc16, cobs_encode, cobs_decode, encode_frame, FrameDecoder, SerialWriter, MAX_PAYLOAD)
+
+
+def test_crc16_matches_ccitt_false():
+    # Standard check value for CRC-16/CCITT-FALSE (poly 0x1021, init 0xFFFF).
+    assert crc16(b"123456789") == 0x29B1
+    assert crc16(b"") == 0xFFFF
+
+
+def test_cobs_round_trips_and_has_no_zero_bytes():
+    rng = random.Random(1)
+    cases = [b"", b"\x00", b"\x00\x00", b"\x11\x00\x22", bytes(range(1, 255)), bytes(range(1, 256)) * 2,
+             bytes(600)] + [bytes(rng.randrange(4) and rng.randrange(256) for _ in range(rng.randrange(300)))
+                            for _ in range(200)]
+    for data in cases:
+        encoded = cobs_encode(data)
+        assert 0 not in encoded
+        assert cobs_decode(encoded) == data
+
+
+def test_cobs_known_vectors():
+    assert cobs_encode(b"\x00") == b"\x01\x01"
+    assert cobs_encode(b"\x11\x22\x00\x33") == b"\x03\x11\x22\x02\x33"
+    assert cobs_encode(bytes(range(1, 255))) == b"\xff" + bytes(range(1, 255)) + b"\x01"
+
+
+def test_cobs_decode_rejects_malformed_blocks():
+    with pytest.raises(ValueError):
+        cobs_decode(b"\x05\x11")  # Code runs past the end
+    with pytest.raises(ValueError):
+        cobs_decode(b"\x02\x11\x00")  # A zero code byte
+
+
+def test_decoder_splits_frames_across_chunks():
+    payloads = [b"status", b"\x00\x01\x00", bytes(range(MAX_PAYLOAD))]
+    stream = b"".join(encode_frame(p) for p in payloads)
+    decoder = FrameDecoder()
+    received = []
+    for i in range(len(stream)):
+        received += decoder.feed(stream[i:i + 1])
+    assert received == payloads
+    assert decoder.frames == 3 and decoder.crc_errors == 0 and decoder.resyncs == 0
+
+
+def test_decoder_counts_crc_errors_and_keeps_going():
+    frame = bytearray(encode_frame(b"hello"))
+    frame[2] ^= 0x01  # Corrupt a payload byte without creating a 0x00
+    decoder = FrameDecoder()
+    assert decoder.feed(bytes(frame) + encode_frame(b"world")) == [b"world"]
+    assert decoder.crc_errors == 1
+
+
+def test_decoder_resyncs_within_one_frame_after_garbage():
+    decoder = FrameDecoder()
+    # Starting mid-frame: the tail of a frame, then a clean one.
+    assert decoder.feed(encode_frame(b"lost")[3:] + encode_frame(b"ok")) == [b"ok"]
+    # A run with no delimiter longer than any frame is dropped up to the next 0x00.
+    noise = bytes([0x42]) * (decoder.max_frame * 3)
+    assert decoder.feed(noise + b"\x00" + encode_frame(b"after")) == [b"after"]
+    assert decoder.resyncs >= 1
+    assert decoder.bytes_discarded >= len(noise)
+
+
+def test_decoder_survives_random_corruption():
+    rng = random.Random(7)
+    payloads = [bytes(rng.randrange(256) for _ in range(rng.randrange(1, MAX_PAYLOAD))) for _ in range(300)]
+    stream = bytearray(b"".join(encode_frame(p) for p in payloads))
+    for _ in range(40):
+        stream[rng.randrange(len(stream))] = rng.randrange(256)
+    decoder = FrameDecoder()
+    received = []
+    position = 0
+    while position < len(stream):
+        size = rng.randrange(1, 64)
+        received += decoder.feed(bytes(stream[position:position + size]))
+        position += size
+    # Every frame that comes out is one that went in; each hit costs at most a couple of frames.
+    assert set(received) <= set(payloads)
+    assert len(received) >= len(payloads) - 2 * 40
+
+
+class BlockingPort:
+    """A port whose writes block until the test releases them."""
+
+    def __init__(self):
+        self.written = []
+        self.writing = threading.Event()
+        self.release = threading.Event()
+
+    def write(self, frame):
+        self.writing.set()
+        self.release.wait(5)
+        self.written.append(frame)
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+
+
+def test_writer_supersedes_unwritten_frames():
+    port = BlockingPort()
+    writer = SerialWriter(port, name="test")
+    writer.submit(b"\x01")
+    assert port.writing.wait(5)
+    # The writer thread is stuck in write(); later frames replace each other in the pending slot.
+    for i in range(2, 21):
+        writer.submit(bytes([i]))
+    port.release.set()
+    wait_for(lambda: writer.writes == 2)
+    writer.stop()
+    assert port.written == [b"\x01", bytes([20])]
+    assert writer.superseded == 18
+    assert writer.latency.count == 2
@@ -0,0 +1,86 @@
+"""Tests for signaling: candidate parsing and the shared RTCP hook."""
+import asyncio
+import pytest
+
+pytest.importorskip("aiortc")
+
+from aiortc import RTCPeerConnection
+from aiortc.rtp import RtcpPsfbPacket, RtcpRrPacket
+from signaling import add_rtcp_listener, parse_candidate
+
+
+class FakeSender:
+    def __init__(self):
+        self.handled = []
+
+    async def _handle_rtcp_packet(self, packet):
+        self.handled.append(packet)
+
+
+def test_parse_candidate():
+    candidate = parse_candidate({"candidate": "candidate:1 1 udp 2122260223 192.168.1.5 54321 typ host",
+                                 "sdpMid": "0", "sdpMLineIndex": 0})
+    assert (candidate.ip, candidate.port, candidate.type) == ("192.168.1.5", 54321, "host")
+    assert (candidate.sdpMid, candidate.sdpMLineIndex) == ("0", 0)
+    assert parse_candidate({"candidate": "", "sdpMid": "0"}) is None
+    assert parse_candidate({}) is None
+
+
+def test_rtcp_listeners_share_one_wrapper():
+    sender = FakeSender()
+    first, second = [], []
+    assert add_rtcp_listener(sender, first.append)
+    wrapper = sender._handle_rtcp_packet
+    assert add_rtcp_listener(sender, second.append)
+    assert sender._handle_rtcp_packet is wrapper
+    packet = RtcpRrPacket(ssrc=1)
+    asyncio.run(sender._handle_rtcp_packet(packet))
+    assert first == second == sender.handled == [packet]
+
+
+def test_rtcp_listener_without_the_aiortc_hook():
+    assert add_rtcp_listener(object(), print) is False
+
+
+def test_keyframe_requests_reach_the_passthrough_track():
+    h264 = pytest.importorskip("h264")
+
+    class Track:
+        requests = 0
+
+        def request_keyframe(self):
+            self.requests += 1
+
+    sender, track = FakeSender(), Track()
+    h264.forward_keyframe_requests(sender, track)
+    packets = [RtcpPsfbPacket(fmt=fmt, ssrc=1, media_ssrc=2) for fmt in (h264.PSFB_PLI, h264.PSFB_FIR, 15)]
+    for packet in packets:
+        asyncio.run(sender._handle_rtcp_packet(packet))
+    assert track.requests == 2
+    assert sender.handled == packets
+
+
+def test_cold_peers_skip_the_stun_server(monkeypatch):
+    import signaling
+    configurations = []
+
+    def peer_connection(configuration=None):
+        configurations.append(configuration)
+        return RTCPeerConnection(configuration)
+
+    monkeypatch.setattr(signaling, "RTCPeerConnection", peer_connection)
+
+    async def run():
+        prewarmer = signaling.PeerPrewarmer("test")
+        cold = prewarmer.take()  # Nothing has been warmed yet
+        warm = prewarmer.take()
+        await cold.gathered()
+        assert (prewarmer.taken_cold, prewarmer.taken_warm) == (1, 1)
+        for peer in (cold, warm):
+            await peer.pc.close()
+        await prewarmer.stop()
+
+    asyncio.run(run())
+    # The cold peer has no STUN server; the spares keep aiortc's default.
+    assert configurations[0].iceServers == []
+    assert configurations[1:] == [None, None]
@@ -0,0 +1,190 @@
+"""Tests for telemetry: envelope wire format, batching and subscriber overflow policies."""
+import asyncio
+import pytest
+
+pytest.importorskip("google.protobuf")
+
+import robot_messages_pb2
+from telemetry import (TelemetryHub, TelemetrySender, DROP_OLDEST, KEEP_LATEST, MSG_SENSOR, MSG_STATUS,
+                       MAX_BATCH_BYTES, encode_varint, pack_delimited, wrap_envelope)
+
+
+def decode_varint(data, pos):
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+def split_delimited(batch):
+    payloads = []
+    pos = 0
+    while pos < len(batch):
+        size, pos = decode_varint(batch, pos)
+        payloads.append(batch[pos:pos + size])
+        pos += size
+    return payloads
+
+
+def pending(sub):
+    items = []
+    item = sub.pop()
+    while item is not None:
+        items.append(item)
+        item = sub.pop()
+    return items
+
+
+def carries(item, payload):
+    # Pending messages are Telemetry envelopes wrapping the published payload.
+    return payload in item[1]
+
+
+def test_encode_varint():
+    assert encode_varint(0) == b"\x00"
+    assert encode_varint(127) == b"\x7f"
+    assert encode_varint(300) == b"\xac\x02"
+    for value in (1, 128, 16383, 16384, 2 ** 32 - 1, 2 ** 63):
+        assert decode_varint(encode_varint(value), 0) == (value, len(encode_varint(value)))
+
+
+@pytest.mark.parametrize("traced", [False, True])
+def test_wrap_envelope_matches_protobuf_serialization(traced):
+    status = robot_messages_pb2.RobotStatus(sequence=7, steering=0.25, throttle=-0.5)
+    sensor = robot_messages_pb2.SensorData(sequence=9)
+    sensor.imu.accel_x = 1.5
+    for msg_type, message, field in ((MSG_STATUS, status, "status"), (MSG_SENSOR, sensor, "sensor")):
+        expected = robot_messages_pb2.Telemetry(sequence=2 ** 32 - 1, monotonic_us=2 ** 45, traced=traced)
+        getattr(expected, field).CopyFrom(message)
+        wrapped = wrap_envelope(msg_type, message.SerializeToString(), 2 ** 32 - 1, 2 ** 45, traced)
+        assert wrapped == expected.SerializeToString()
+        assert robot_messages_pb2.Telemetry.FromString(wrapped) == expected
+
+
+def test_hub_numbers_envelopes_in_publish_order():
+    hub = TelemetryHub(maxlen=10)
+    sub = hub.subscribe()
+    for _ in range(3):
+        hub.publish(MSG_STATUS, b"")
+    envelopes = [robot_messages_pb2.Telemetry.FromString(item[1]) for item in pending(sub)]
+    assert [envelope.sequence for envelope in envelopes] == [1, 2, 3]
+    assert envelopes[0].monotonic_us <= envelopes[2].monotonic_us
+
+
+def test_pack_delimited_respects_the_batch_budget():
+    payloads = [bytes([i]) * (i * 37 % 300 + 1) for i in range(100)]
+    batches = list(pack_delimited(payloads))
+    assert all(len(batch) <= MAX_BATCH_BYTES for batch in batches)
+    assert [p for batch in batches for p in split_delimited(batch)] == payloads
+    # Batches are filled: the next payload would not have fit into the previous batch.
+    consumed = 0
+    for batch in batches[:-1]:
+        consumed += len(split_delimited(batch))
+        following = payloads[consumed]
+        assert len(batch) + len(encode_varint(len(following))) + len(following) > MAX_BATCH_BYTES
+
+
+def test_pack_delimited_sends_an_oversized_payload_alone():
+    big = b"x" * (MAX_BATCH_BYTES * 2)
+    batches = list(pack_delimited([b"a", big, b"b"]))
+    assert [split_delimited(batch) for batch in batches] == [[b"a"], [big], [b"b"]]
+    assert list(pack_delimited([])) == []
+
+
+def test_drop_oldest_evicts_from_the_front():
+    hub = TelemetryHub(maxlen=3, policy=DROP_OLDEST)
+    sub = hub.subscribe()
+    for i in range(5):
+        hub.publish(MSG_SENSOR if i % 2 else MSG_STATUS, b"message %d" % i)
+    items = pending(sub)
+    assert len(items) == 3
+    assert all(carries(item, b"message %d" % i) for item, i in zip(items, (2, 3, 4)))
+    assert sub.dropped == 2 and sub.dropped_by_type == {MSG_STATUS: 1, MSG_SENSOR: 1}
+    assert sub.received == 5 and len(sub) == 0
+
+
+def test_keep_latest_keeps_one_message_per_type():
+    hub = TelemetryHub(maxlen=10, policy=KEEP_LATEST)
+    sub = hub.subscribe()
+    for i in range(4):
+        hub.publish(MSG_STATUS, b"status %d" % i)
+    hub.publish(MSG_SENSOR, b"sensor")
+    hub.publish(MSG_STATUS, b"status 99")
+    items = pending(sub)
+    # A replaced message moves behind the others: pending messages leave oldest first.
+    assert [item[0] for item in items] == [MSG_SENSOR, MSG_STATUS]
+    assert carries(items[1], b"status 99")
+    assert sub.dropped_by_type == {MSG_STATUS: 4}
+
+
+def test_keep_latest_bounded_by_maxlen():
+    hub = TelemetryHub(maxlen=1, policy=KEEP_LATEST)
+    sub = hub.subscribe()
+    hub.publish(MSG_STATUS, b"status")
+    hub.publish(MSG_SENSOR, b"sensor")
+    assert [item[0] for item in pending(sub)] == [MSG_SENSOR]
+    assert sub.dropped_by_type == {MSG_STATUS: 1}
+
+
+def test_subscribers_do_not_share_messages():
+    hub = TelemetryHub(maxlen=2)
+    fast, slow = hub.subscribe(), hub.subscribe(maxlen=1)
+    hub.publish(MSG_STATUS, b"first")
+    hub.publish(MSG_STATUS, b"second")
+    assert len(pending(fast)) == 2 and fast.dropped == 0
+    assert len(pending(slow)) == 1 and slow.dropped == 1
+    slow.close()
+    assert hub.subscriber_count == 1
+    with pytest.raises(ValueError):
+        hub.subscribe(policy="newest")
+
+
+def test_a_newer_wait_takes_over_the_subscriber():
+    hub = TelemetryHub()
+    sub = hub.subscribe()
+
+    async def run():
+        first = asyncio.ensure_future(sub.wait(timeout=5))
+        await asyncio.sleep(0)
+        second = asyncio.ensure_future(sub.wait(timeout=5))
+        # The replaced sender's wait() returns instead of hanging.
+        assert await asyncio.wait_for(first, 1) is False
+        hub.publish(MSG_STATUS, b"status")
+        return await asyncio.wait_for(second, 1)
+
+    assert asyncio.run(run()) is True
+
+
+class FakeChannel:
+    readyState = "open"
+
+    def __init__(self):
+        self.sent = []
+
+    def send(self, data):
+        self.sent.append(data)
+
+
+def test_sender_coalesces_pending_messages_into_batches():
+    hub = TelemetryHub(maxlen=100)
+    channel = FakeChannel()
+    sender = TelemetrySender(hub.subscribe(), channel)
+    payloads = [b"sensor %02d " % i + bytes(50) for i in range(20)]
+
+    async def run():
+        task = asyncio.ensure_future(sender.run(lambda: sender.messages_sent < 20))
+        await asyncio.sleep(0)
+        for payload in payloads:
+            hub.publish(MSG_SENSOR, payload)
+        await asyncio.wait_for(task, 1)
+
+    asyncio.run(run())
+    messages = [p for batch in channel.sent for p in split_delimited(batch)]
+    assert len(messages) == 20 and sender.messages_sent == 20
+    assert all(payload in message for payload, message in zip(payloads, messages))
+    assert all(len(batch) <= MAX_BATCH_BYTES for batch in channel.sent)
+    assert sender.batches_sent == len(channel.sent) < 20
@@ -0,0 +1,86 @@
+"""Tests for witmotion frame parsing."""
+import struct
+import pytest
+from witmotion import (WitMotionParser, parse_data, FRAME_HEADER, FRAME_LEN, ACCELERATION, ANGULAR_VELOCITY, ANGLE,
+                       SCALES)
+
+
+def frame(data_type, x, y, z, extra=0):
+    body = struct.pack("<BB4h", FRAME_HEADER, data_type, x, y, z, extra)
+    return body + bytes([sum(body) & 0xff])
+
+
+def test_parse_data_scales_readings():
+    name, values = parse_data(frame(ACCELERATION, 2048, -2048, 32767))
+    assert name == "Acceleration"
+    assert values["accel_x"] == pytest.approx(1.0)
+    assert values["accel_y"] == pytest.approx(-1.0)
+    assert values["accel_z"] == pytest.approx(32767 * SCALES[ACCELERATION])
+
+
+def test_parse_data_rejects_bad_frames():
+    good = frame(ANGLE, 1, 2, 3)
+    assert parse_data(good[:-1] + bytes([good[-1] ^ 1])) is None
+    assert parse_data(good[:-1]) is None
+    assert parse_data(frame(0x59, 1, 2, 3)) is None  # Quaternion: not a type we scale
+
+
+def test_parser_yields_every_frame_across_reads():
+    frames = [frame(ACCELERATION, 100, 200, 300), frame(ANGULAR_VELOCITY, -5, 0, 5), frame(ANGLE, 0, 16384, -16384)]
+    stream = b"".join(frames) * 3
+    parser = WitMotionParser(capacity=64)
+    parsed = []
+    for i in range(0, len(stream), 5):
+        parser.feed(stream[i:i + 5])
+        parsed += list(parser.frames())
+    assert [p[0] for p in parsed] == [ACCELERATION, ANGULAR_VELOCITY, ANGLE] * 3
+    assert parsed[2][2] == pytest.approx(90.0)
+    assert parser.frames_parsed == 9
+    assert parser.checksum_errors == 0 and parser.bytes_skipped == 0
+
+
+def test_parser_resyncs_after_a_corrupted_byte():
+    first, second = frame(ACCELERATION, 1, 2, 3), frame(ANGULAR_VELOCITY, 4, 5, 6)
+    corrupted = bytearray(first)
+    corrupted[4] ^= 0xFF
+    parser = WitMotionParser()
+    parser.feed(b"\x00\x55\x13" + bytes(corrupted) + second)
+    parsed = list(parser.frames())
+    # The corrupted frame is lost; the next one is found again.
+    assert [p[0] for p in parsed] == [ANGULAR_VELOCITY]
+    assert parser.checksum_errors >= 1
+    assert parser.bytes_skipped == 3 + FRAME_LEN
+
+
+def test_partial_frame_waits_for_the_rest():
+    data = frame(ANGLE, 10, 20, 30)
+    parser = WitMotionParser()
+    parser.feed(data[:6])
+    assert list(parser.frames()) == []
+    parser.feed(data[6:])
+    assert [p[0] for p in parser.frames()] == [ANGLE]
+
+
+class FakePort:
+    def __init__(self, data):
+        self.data = bytearray(data)
+
+    @property
+    def in_waiting(self):
+        return len(self.data)
+
+    def readinto(self, buffer):
+        n = min(len(buffer), len(self.data))
+        buffer[:n] = self.data[:n]
+        del self.data[:n]
+        return n
+
+
+def test_read_from_reads_into_the_buffer():
+    port = FakePort(frame(ACCELERATION, 1, 1, 1) * 4)
+    parser = WitMotionParser(capacity=FRAME_LEN * 2)
+    parsed = []
+    while port.in_waiting:
+        assert parser.read_from(port) > 0
+        parsed += list(parser.frames())
+    assert len(parsed) == 4
@@ -0,0 +1,99 @@
+import threading
+from collections import OrderedDict
+
+# Stages a traced telemetry message passes through, in order. Every time is
+# a server monotonic timestamp in ns; client_receive is converted to the
+# server clock by the client using the ClockSync offset.
+STAGES = ("read", "parse", "enqueue", "dequeue", "send", "client_receive")
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5, float("inf"))
+
+
+class LatencyHistogram:
+    """Cumulative-bucket histogram in the Prometheus style."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds):
+        self.count += 1
+        self.sum += seconds
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                self.counts[i] += 1
+                break
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th quantile (coarse, but cheap)."""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        running = 0
+        for bound, count in zip(self.buckets, self.counts):
+            running += count
+            if running >= target:
+                return bound
+        return self.buckets[-1]
+
+
+class LatencyTracer:
+    """
+    Samples one telemetry message in every `sample_every` and records when it
+    reached each stage. The robot-side stages are remembered here by
+    envelope sequence; the peer's sender adds dequeue/send, and the browser's
+    TraceReport closes the trace. Each consecutive pair of stages feeds a
+    histogram, plus one for the whole read -> client_receive path.
+    """
+
+    def __init__(self, sample_every=10, max_pending=256):
+        self.sample_every = sample_every
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        self._origins = OrderedDict()
+        self.histograms = OrderedDict(
+            (f"{a}_to_{b}", LatencyHistogram()) for a, b in zip(STAGES, STAGES[1:])
+        )
+        self.histograms["end_to_end"] = LatencyHistogram()
+        self.completed = 0
+
+    def should_trace(self, sequence):
+        return self.sample_every > 0 and sequence % self.sample_every == 0
+
+    def record_origin(self, sequence, read_ns, parse_ns, enqueue_ns):
+        with self._lock:
+            self._origins[sequence] = (read_ns, parse_ns, enqueue_ns)
+            while len(self._origins) > self.max_pending:
+                self._origins.popitem(last=False)
+
+    def complete(self, sequence, dequeue_ns, send_ns, client_receive_ns):
+        """Closes one trace; unknown or expired sequences are ignored."""
+        with self._lock:
+            origin = self._origins.get(sequence)
+            if origin is None:
+                return
+            stamps = dict(zip(STAGES, origin + (dequeue_ns, send_ns, client_receive_ns)))
+            previous = None
+            for stage in STAGES:
+                t = stamps[stage]
+                if t is None:
+                    continue  # e.g. dummy publishers have no read/parse stamps
+                if previous is not None:
+                    name = f"{previous[0]}_to_{stage}"
+                    if name in self.histograms:
+                        self.histograms[name].observe(max(t - previous[1], 0) / 1e9)
+                previous = (stage, t)
+            first = next(stamps[s] for s in STAGES if stamps[s] is not None)
+            self.histograms["end_to_end"].observe(max(client_receive_ns - first, 0) / 1e9)
+            self.completed += 1
+
+    def summary(self):
+        """One line of p50/p95 per stage transition, in milliseconds."""
+        with self._lock:
+            parts = [f"{name} p50={h.quantile(0.5) * 1000:g}ms p95={h.quantile(0.95) * 1000:g}ms"
+                     for name, h in self.histograms.items() if h.count]
+        return f"Latency traces={self.completed}: " + (", ".join(parts) or "no samples")
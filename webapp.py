@@ -0,0 +1,230 @@
+"""
+The aiohttp application both streaming servers run.
+
+serversender.py (real serial devices) and final_streamer.py (dummy
+publishers) differ only in where telemetry comes from and where drive
+commands go. Everything else lives here, once: the shared camera capture,
+the telemetry hub, peer pre-warming, viewer sessions, the signaling, asset,
+metrics and log level endpoints, and startup/shutdown.
+
+An entry point builds a RobotServer, gives it a device manager and runs
+its app. The device manager owns the telemetry publishers and needs:
+start() (blocking, run off the event loop), stop(), send_command(cmd) and
+collect(), which yields metric families.
+"""
+import asyncio
+import json
+import logging
+import os
+from aiohttp import web
+from camera import PiCameraSource
+from h264 import H264CameraSource
+from adaptation import AdaptationController, QUALITY_LADDER, step_index
+from telemetry import TelemetryHub, TelemetrySender, DROP_OLDEST
+from tracing import LatencyTracer
+from assets import AssetCache
+from signaling import PeerPrewarmer, SetupTimer, SetupStats
+from session import Session, SessionManager
+from logutil import stop_logging, flush_aggregated_logs, set_level, get_level
+from metrics import (MetricsRegistry, EventLoopLagMonitor, CONTENT_TYPE, camera_metrics, video_track_metrics,
+                     telemetry_sender_metrics, adaptation_metrics, tracer_metrics, setup_metrics, session_metrics)
+
+ROOT = os.path.dirname(__file__)
+HOST = "0.0.0.0"
+PORT = 8080
+# "raw": aiortc encodes NV12 frames in software. "h264": the camera pipeline
+# encodes in hardware and packets are passed through untouched.
+VIDEO_MODE = os.environ.get("ROBOT_VIDEO_MODE", "raw")
+# Keep the capture open between viewers so a connect never waits for the
+# camera to open and pass its health check.
+PREWARM_CAMERA = os.environ.get("ROBOT_PREWARM_CAMERA", "1") == "1"
+# Served from memory, precompressed; see assets.AssetCache. Edits on disk are
+# picked up unless ROBOT_RELOAD_ASSETS=0.
+RELOAD_ASSETS = os.environ.get("ROBOT_RELOAD_ASSETS", "1") == "1"
+PUBLIC_ASSETS = {"robot_messages.proto"}  # Fetched by client_direct.js under /public
+WS_HEARTBEAT = 10.0  # Seconds between signaling WebSocket pings
+TELEMETRY_QUEUE_SIZE = 100  # Per-peer ring length
+TELEMETRY_POLICY = DROP_OLDEST
+TELEMETRY_BATCH_BYTES = 1200  # Budget for one coalesced data-channel message
+TRACE_SAMPLE_EVERY = 10  # Trace one telemetry message in N end to end (0 disables)
+
+
+class RobotServer:
+    """
+    One process's camera, telemetry and viewer sessions, and the routes
+    that serve them. Call set_devices() before app().
+    """
+
+    def __init__(self, telemetry_queue_size=TELEMETRY_QUEUE_SIZE):
+        self.camera_source = H264CameraSource() if VIDEO_MODE == "h264" else PiCameraSource()
+        self.peer_prewarmer = PeerPrewarmer("protobuf", ordered=False, maxRetransmits=0)
+        self.setup_stats = SetupStats()
+        self.latency_tracer = LatencyTracer(sample_every=TRACE_SAMPLE_EVERY)
+        self.telemetry_hub = TelemetryHub(maxlen=telemetry_queue_size, policy=TELEMETRY_POLICY,
+                                          tracer=self.latency_tracer)
+        self.sessions = SessionManager(self.new_session, self.peer_prewarmer, self.setup_stats)
+        self.devices = None
+        self.loop_lag_monitor = EventLoopLagMonitor()
+        self.metrics_registry = MetricsRegistry()
+        self.metrics_registry.register(lambda: camera_metrics(self.camera_source))
+        self.metrics_registry.register(lambda: tracer_metrics(self.latency_tracer))
+        self.metrics_registry.register(self.loop_lag_monitor.collect)
+        self.metrics_registry.register(lambda: setup_metrics(self.setup_stats, self.peer_prewarmer))
+        self.metrics_registry.register(lambda: session_metrics(self.sessions))
+        self.metrics_registry.register(self._peer_metrics)
+        self.assets = AssetCache(ROOT, check_mtime=RELOAD_ASSETS)
+        self.assets.add("robot_messages.proto", "/public/robot_messages.proto", "text/plain")
+        self.assets.add("client_direct.js", "/client_direct.js", "application/javascript",
+                        depends=["robot_messages.proto"])
+        self.assets.add("index_html.html", "/", "text/html", depends=["client_direct.js"])
+
+    def set_devices(self, devices):
+        """Attaches the device manager that publishes telemetry and takes drive commands."""
+        self.devices = devices
+        self.metrics_registry.register(devices.collect)
+
+    def _peer_metrics(self):
+        for session in self.sessions:
+            yield from video_track_metrics(session.video_track, session.id)
+            yield from telemetry_sender_metrics(session.telemetry_sender, session.id)
+            yield from adaptation_metrics(session.adaptation, session.id)
+
+    def new_session(self, session_id):
+        """Session factory for the SessionManager: this viewer's track, telemetry and adaptation."""
+        source = self.camera_source
+        video_track = source.subscribe()
+        sender = TelemetrySender(self.telemetry_hub.subscribe(), None, max_batch_bytes=TELEMETRY_BATCH_BYTES)
+        ladder = QUALITY_LADDER[step_index(QUALITY_LADDER, source.width, source.height, source.fps):]
+        return Session(session_id, video_track, sender, AdaptationController(ladder),
+                       on_command=self.devices.send_command, video_mode=VIDEO_MODE)
+
+    async def index(self, request):
+        return self.assets.response(request, "index_html.html")
+
+    async def javascript(self, request):
+        return self.assets.response(request, "client_direct.js")
+
+    async def public(self, request):
+        """Only the files the page fetches at runtime; nothing else under ROOT is served."""
+        name = request.match_info["name"]
+        if name not in PUBLIC_ASSETS:
+            raise web.HTTPNotFound()
+        return self.assets.response(request, name)
+
+    async def offer(self, request):
+        """
+        One-shot signaling. Include the "pc_id" of an earlier answer to resume
+        that session on a new connection; /ws does the same over one socket.
+        """
+        timer = SetupTimer()
+        params = await request.json()
+        _, answer = await self.sessions.offer(params, timer)
+        return web.Response(content_type="application/json", text=json.dumps(answer))
+
+    async def candidate(self, request):
+        """
+        Trickle ICE over plain HTTP, for clients that signal with POST /offer
+        instead of /ws (client_direct.js sends candidates over the WebSocket).
+        Body is the browser's RTCIceCandidate JSON plus the pc_id from /offer;
+        an empty candidate marks the end of gathering.
+        """
+        params = await request.json()
+        session = self.sessions.get(params.get("pc_id"))
+        if session is None:
+            raise web.HTTPNotFound(text="Unknown pc_id")
+        try:
+            await session.add_candidate(params)
+        except (ValueError, IndexError) as e:
+            raise web.HTTPBadRequest(text=f"Bad candidate: {e}")
+        return web.Response(status=204)
+
+    async def websocket(self, request):
+        """
+        Persistent signaling for one viewer. Client messages are JSON objects:
+        {"type": "offer", "sdp", "pc_id"?}, {"type": "candidate", ...RTCIceCandidate}
+        and {"type": "bye"}. The answer comes back as {"type": "answer", "sdp",
+        "pc_id"} with all of our candidates in it. The session outlives the
+        socket; an offer on a new socket with the same pc_id resumes it (an ICE
+        restart moves it to a new connection).
+        """
+        ws = web.WebSocketResponse(heartbeat=WS_HEARTBEAT)
+        await ws.prepare(request)
+        session = None
+        async for msg in ws:
+            if msg.type != web.WSMsgType.TEXT:
+                continue
+            try:
+                params = json.loads(msg.data)
+                kind = params.get("type")
+                if kind == "offer":
+                    timer = SetupTimer()
+                    session, answer = await self.sessions.offer(dict(params, type="offer"), timer)
+                    await ws.send_json(answer)
+                elif kind == "candidate":
+                    if session is not None:
+                        await session.add_candidate(params)
+                elif kind == "bye":
+                    if session is not None:
+                        await session.close()
+                        session = None
+                    await ws.close()
+                else:
+                    raise ValueError(f"unknown message type {kind!r}")
+            except Exception as e:
+                logging.warning(f"Signaling error: {e}")
+                await ws.send_json({"type": "error", "error": str(e)})
+        return ws
+
+    async def metrics(self, request):
+        return web.Response(body=self.metrics_registry.render().encode(), headers={"Content-Type": CONTENT_TYPE})
+
+    async def loglevel(self, request):
+        """GET returns the current root log level; POST ?level=DEBUG changes it."""
+        if request.method == "POST":
+            try:
+                set_level(request.query.get("level", ""))
+            except ValueError as e:
+                raise web.HTTPBadRequest(text=str(e))
+            logging.warning("Log level changed to %s", get_level())
+        return web.Response(text=get_level() + "\n")
+
+    async def on_startup(self, app):
+        self.loop_lag_monitor.start()
+        self.peer_prewarmer.start()
+        loop = asyncio.get_running_loop()
+        # Devices and the camera open in parallel, before anyone connects.
+        opening = [loop.run_in_executor(None, self.devices.start)]
+        if PREWARM_CAMERA:
+            opening.append(loop.run_in_executor(None, self.camera_source.warm))
+        await asyncio.gather(*opening)
+
+    async def on_shutdown(self, app):
+        logging.info("Server is shutting down...")
+        await self.loop_lag_monitor.stop()
+        await self.peer_prewarmer.stop()
+        await self.sessions.close()
+        self.camera_source.stop()
+        self.devices.stop()
+        flush_aggregated_logs()  # The last partial window of every hot-path summary
+        logging.info("All connections closed.")
+
+    async def on_cleanup(self, app):
+        stop_logging()
+
+    def app(self):
+        app = web.Application()
+        app.on_startup.append(self.on_startup)
+        app.on_shutdown.append(self.on_shutdown)
+        app.on_cleanup.append(self.on_cleanup)
+        app.router.add_get("/", self.index)
+        app.router.add_get("/client_direct.js", self.javascript)
+        app.router.add_post("/offer", self.offer)
+        app.router.add_post("/candidate", self.candidate)
+        app.router.add_get("/ws", self.websocket)
+        app.router.add_get("/metrics", self.metrics)
+        app.router.add_route("*", "/loglevel", self.loglevel)
+        app.router.add_get("/public/{name}", self.public)
+        return app
+
+    def run(self, host=HOST, port=PORT):
+        web.run_app(self.app(), host=host, port=port)
@@ -0,0 +1,124 @@
+import struct
+
+FRAME_HEADER = 0x55
+FRAME_LEN = 11
+
+ACCELERATION = 0x51
+ANGULAR_VELOCITY = 0x52
+ANGLE = 0x53
+
+# Full-scale value of each data type; raw int16 readings map to +/- scale
+SCALES = {
+    ACCELERATION: 16 / 32768.0,        # g
+    ANGULAR_VELOCITY: 2000 / 32768.0,  # deg/s
+    ANGLE: 180 / 32768.0,              # deg
+}
+TYPE_NAMES = {
+    ACCELERATION: "Acceleration",
+    ANGULAR_VELOCITY: "Angular Velocity",
+    ANGLE: "Angle",
+}
+VALUE_KEYS = {
+    ACCELERATION: ("accel_x", "accel_y", "accel_z"),
+    ANGULAR_VELOCITY: ("gyro_x", "gyro_y", "gyro_z"),
+    ANGLE: ("roll", "pitch", "yaw"),
+}
+
+# header, type, four int16 readings (the fourth is temperature/version), checksum
+_FRAME = struct.Struct("<BB4hB")
+
+
+def parse_data(frame):
+    """Parses a 11-byte data frame from the WitMotion sensor."""
+    if len(frame) != FRAME_LEN or frame[0] != FRAME_HEADER:
+        return None
+    if sum(frame[0:10]) & 0xff != frame[10]:
+        return None # Checksum failed
+    _, data_type, x, y, z, _, _ = _FRAME.unpack_from(frame)
+    scale = SCALES.get(data_type)
+    if scale is None:
+        return None
+    return TYPE_NAMES[data_type], dict(zip(VALUE_KEYS[data_type], (x * scale, y * scale, z * scale)))
+
+
+class WitMotionParser:
+    """
+    Streaming WitMotion frame parser over a preallocated buffer.
+
+    Bytes are read straight into a fixed bytearray and frames() walks it once,
+    yielding every complete frame in place. A header whose checksum fails is
+    treated as a false sync and the scan advances by a single byte, so one
+    corrupted byte costs at most one frame.
+    """
+
+    def __init__(self, capacity=4096):
+        self._buf = bytearray(capacity)
+        self._view = memoryview(self._buf)
+        self._start = 0
+        self._end = 0
+        self.bytes_received = 0
+        self.frames_parsed = 0
+        self.checksum_errors = 0
+        self.bytes_skipped = 0
+
+    def _compact(self):
+        remaining = self._end - self._start
+        if self._start and remaining:
+            self._buf[0:remaining] = self._view[self._start:self._end]
+        self._start = 0
+        self._end = remaining
+
+    def _reserve(self, wanted):
+        if self._end + wanted > len(self._buf):
+            self._compact()
+        return min(wanted, len(self._buf) - self._end)
+
+    def feed(self, data):
+        """Appends already-read bytes to the buffer."""
+        n = self._reserve(len(data))
+        self._view[self._end:self._end + n] = data[:n]
+        self._end += n
+        self.bytes_received += len(data)
+        self.bytes_skipped += len(data) - n
+
+    def read_from(self, ser):
+        """Reads whatever the port has (blocking for at least one byte) into the buffer."""
+        n = self._reserve(ser.in_waiting or 1)
+        got = ser.readinto(self._view[self._end:self._end + n]) or 0
+        self._end += got
+        self.bytes_received += got
+        return got
+
+    def frames(self):
+        """Yields (data_type, x, y, z) with scaled values for every complete, valid frame."""
+        buf = self._buf
+        view = self._view
+        pos = self._start
+        end = self._end
+        unpack_from = _FRAME.unpack_from
+        while True:
+            header = buf.find(FRAME_HEADER, pos, end)
+            if header < 0:
+                self.bytes_skipped += end - pos
+                pos = end
+                break
+            self.bytes_skipped += header - pos
+            pos = header
+            if end - pos < FRAME_LEN:
+                break
+            if sum(view[pos:pos + 10]) & 0xff != buf[pos + 10]:
+                self.checksum_errors += 1
+                self.bytes_skipped += 1
+                pos += 1
+                continue
+            _, data_type, x, y, z, _, _ = unpack_from(buf, pos)
+            pos += FRAME_LEN
+            scale = SCALES.get(data_type)
+            if scale is None:
+                continue
+            self.frames_parsed += 1
+            self._start = pos
+            yield data_type, x * scale, y * scale, z * scale
+        self._start = pos
+        if self._start == self._end:
+            self._start = self._end = 0